@@ -0,0 +1,77 @@
+import os
+
+###################################################################################################
+
+## Where the case server lives. Every module that talks to RIT builds its urls from this, so one
+## process can be pointed at another case server (or the mock) with RIT_URL set before it starts.
+BASE_URL = os.environ.get("RIT_URL", "http://localhost:9999/v1")
+
+TICKER = "ALGO"
+
+class ApiException(Exception):
+    pass
+
+def get_tick(session, data):
+    resp = session.get(f"{BASE_URL}/case")
+    if resp.ok:
+        resp = resp.json()
+        data['tick'] = resp['tick']
+        data['status'] = resp['status']
+        return data
+    return ApiException("Auth Error. Check API Key")
+
+def get_security_info(session, data):
+    resp = session.get(f"{BASE_URL}/securities?ticker={TICKER}")
+    if resp.ok:
+        resp = resp.json()[0]
+        data['position'] = resp['position']
+        data['position_vwap'] = resp['vwap']
+        data['last'] = resp['last']
+        data['mid'] = round((resp['bid'] + resp['ask']) / 2, 2)
+        data['bid'] = resp['bid']
+        data['ask'] = resp['ask']
+        data['realized_profit'] = resp['realized']
+        data['unrealized_profit'] = resp['unrealized']
+        return data
+    return ApiException("Auth Error. Check API Key")
+
+def get_open_orders(session):
+    resp = session.get(f"{BASE_URL}/orders?status=OPEN")
+    if resp.ok: return resp.json()
+    return ApiException("Auth Error. Check API Key")
+
+def get_transacted_orders(session):
+    resp = session.get(f"{BASE_URL}/orders?status=TRANSACTED")
+    if resp.ok: return resp.json()
+    return ApiException("Auth Error. Check API Key")
+
+def get_order_details(session, _id):
+    resp = session.get(f"{BASE_URL}/orders/{_id}")
+    if resp.ok: return resp.json()
+    return ApiException("Auth Error. Check API Key")
+
+## Open order count for strategies that hold off requoting while quotes are still resting
+def get_open_order_count(session, data):
+    orders = get_open_orders(session)
+    if isinstance(orders, ApiException):
+        return orders
+    data['n_open_orders'] = len(orders)
+    return data
+
+## The open orders themselves, for strategies that keep quotes resting across requotes
+def get_resting_orders(session, data):
+    orders = get_open_orders(session)
+    if isinstance(orders, ApiException):
+        return orders
+    data['open_orders'] = orders
+    data['n_open_orders'] = len(orders)
+    return data
+
+def build_order(_type, quantity, price, action):
+    return {
+        'ticker': TICKER,
+        'type': _type,
+        'quantity': quantity,
+        'price': price,
+        'action': action,
+    }
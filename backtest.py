@@ -0,0 +1,223 @@
+from order_reconciler import OrderReconciler
+from liquidation import LiquidationScheduler
+from volatility_estimators import ReturnIndex
+from matching import Account, CrossingMatcher, MATCHERS, SIGN, MKT_COM
+from policies import POLICIES
+from tape import Tape, sessions
+import numpy as np
+import sys, os
+
+###################################################################################################
+
+## python backtest.py <version> [<session> ...], e.g. `python backtest.py v4 10001 10002`, runs the
+## version over every session in data/ when none are given. RIT_MATCHER=queue fills with the
+## price-time priority book instead of on prints through our price, see matching.py.
+
+## Same case timeline as the runtime
+START_TICK = 10
+END_TICK = 290
+LAST_TICK = 299
+STOP_LOSS_TICKS = 3
+HEDGE_TICKS = 3
+
+## Signals as of every tick, from every bar up to and including that tick like the live SignalCache
+## (full window vol and trend, trailing `lookback` bars for the rolling trend). Ticks before the
+## first bar are NaN.
+def signals(tape, lookback):
+    index = ReturnIndex(capacity = tape.last_tick + 1).extend(tape.close[tape.first_tick:])
+    end = np.arange(index.n_prices)
+    with np.errstate(divide = 'ignore', invalid = 'ignore'):
+        values = {'vol': index.c2c_vol(end = end)}
+        values['gtrend'], values['gtrend_confidence'] = index.z_score(end = end)
+        values['trend'], values['trend_confidence'] = index.z_score(lookback, end)
+
+    pad = np.full(tape.first_tick, np.nan)
+    values = {key: np.concatenate([pad, value]) for key, value in values.items()}
+    values['time_factor'] = time_factor(tape)
+    return values
+
+## TimeAndSales' time factor as of every tick, from every print up to and including that tick
+def time_factor(tape):
+    ticks = tape.last_tick + 1
+    count = np.bincount(tape.tas_tick, minlength = ticks)
+    volume = np.bincount(tape.tas_tick, tape.tas_quantity, minlength = ticks)
+    with np.errstate(divide = 'ignore', invalid = 'ignore'):
+        terms = np.where(count > 0, (volume / count / (volume + 1)) ** 2, 0)
+    n_ticks = np.cumsum(count > 0)
+    return np.cumsum(terms) / np.maximum(n_ticks, 1)
+
+###################################################################################################
+
+## One pass of a policy over one recorded session, tick by tick like the runtime sees it: fills
+## against the tick's prints first, then one snapshot, then the policy's decision. The spread and
+## trend skew are priced for the whole session up front, what is left per tick is the inventory skew
+## and the book keeping that depends on the position path.
+##
+## The runtime's quotes go through the same reconciler diff, the end of case and stop-loss unwinds
+## through the same schedulers, and fills come from a matcher shared with the mock server, so a
+## backtest and a replay against mock_server.py agree on what fills. Whatever is still held at the
+## close is flattened at the last quote before the PnL is reported, see `flatten`.
+class Backtest:
+
+    def __init__(self, policy, tape, matcher = None):
+        self.policy = policy
+        self.tape = tape
+        self.matcher = matcher or CrossingMatcher(tape)
+        self.account = Account()
+        self.reconciler = OrderReconciler(max_age = policy.OLD_ORDER_CALIBRATION)
+        self.liquidation = LiquidationScheduler(policy.MAX_VOLUME)
+        self.unwind = LiquidationScheduler(policy.MAX_VOLUME)
+        self.next_id = 1
+        self.n_orders = 0
+        self.final_position = 0
+
+        ticks = tape.last_tick + 1
+        self.position = np.zeros(ticks)
+        self.pnl = np.zeros(ticks)
+        self.commission = np.zeros(ticks)
+
+    def book(self, fills):
+        for order, quantity, price, commission in fills:
+            self.account.trade(SIGN[order['action']] * quantity, price, commission)
+
+    def submit(self, order, tick):
+        order = {**order, 'order_id': self.next_id, 'tick': tick, 'quantity_filled': 0, 'vwap': None, 'status': "OPEN"}
+        self.next_id += 1
+        self.n_orders += 1
+        self.book(self.matcher.submit(order, tick))
+
+    def target(self, orders, tick):
+        cancels, submits = self.reconciler.diff(orders, list(self.matcher.open.values()), tick)
+        for order_id in cancels:
+            self.matcher.cancel(order_id)
+        for order in submits:
+            self.submit(order, tick)
+
+    def snapshot(self, tick, vol_spread):
+        account = self.account
+        bid, ask = self.matcher.quote(tick)
+        last = self.tape.close[tick]
+        signals = self.signals
+        return {
+            'tick': tick,
+            'position': account.position,
+            'position_vwap': account.vwap,
+            'last': last,
+            'bid': bid,
+            'mid': last,
+            'ask': ask,
+            'realized_profit': account.realized,
+            'unrealized_profit': account.unrealized(last),
+            'n_open_orders': len(self.matcher.open),
+            'open_orders': list(self.matcher.open.values()),
+            'gtrend': signals['gtrend'][tick],
+            'trend': signals['trend'][tick],
+            'gtrend_confidence': signals['gtrend_confidence'][tick],
+            'trend_confidence': signals['trend_confidence'][tick],
+            'vol': signals['vol'][tick],
+            'time_factor': signals['time_factor'][tick],
+            'vol_spread': vol_spread,
+            'current_bid': self.current_bid,
+            'current_ask': self.current_ask,
+            'pnl': 0,
+            'pnl_threshold': 0
+        }
+
+    def run(self):
+
+        policy, tape = self.policy, self.tape
+        self.signals = signals(tape, policy.ROLLING_TREND_LOOKBACK)
+
+        ## Everything about the quote that does not depend on the position, for every tick at once
+        session = {'mid': tape.close, **self.signals}
+        bids, asks = policy.spread(session)
+        vol_spread = session['vol_spread']
+        self.current_bid, self.current_ask = 0, 0
+        stop_loss_active = False
+
+        for tick in range(START_TICK, tape.last_tick + 1):
+
+            self.book(self.matcher.advance(tick))
+            data = self.snapshot(tick, vol_spread[tick])
+
+            if tick > END_TICK:
+                self.liquidation.start(tick, LAST_TICK)
+                self.target(self.liquidation.orders(data), tick)
+
+            elif policy.requote(data) or policy.expired(data):
+                bid, ask = policy.quote(data, (bids[tick], asks[tick]))
+                data['current_bid'] = self.current_bid = bid
+                data['current_ask'] = self.current_ask = ask
+                self.target(policy.orders(data, bid, ask), tick)
+                stop_loss_active = True
+
+            if tick > END_TICK:
+                self.unwind.stop()
+            else:
+                if stop_loss_active and policy.breached(data):
+                    self.unwind.start(tick, tick + STOP_LOSS_TICKS - 1, isMarket = True)
+                    stop_loss_active = False
+                if policy.held(data):
+                    self.unwind.start(tick, tick + HEDGE_TICKS - 1, isMarket = True)
+            if self.unwind.active:
+                for order in self.unwind.orders(data):
+                    self.submit(order, tick)
+
+            account = self.account
+            self.position[tick] = account.position
+            self.pnl[tick] = account.realized + account.unrealized(tape.close[tick])
+            self.commission[tick] = account.commission
+
+        self.flatten()
+        return self
+
+    ## Inventory left at the close is closed out at the last quote, across the spread and at the
+    ## market commission, so it never counts at the last price
+    def flatten(self):
+        tick = self.tape.last_tick
+        account = self.account
+        self.final_position = account.position
+        if account.position != 0:
+            bid, ask = self.matcher.quote(tick)
+            account.trade(-account.position, bid if account.position > 0 else ask, MKT_COM)
+        self.pnl[tick] = account.realized
+        self.commission[tick] = account.commission
+
+    def drawdown(self):
+        return np.max(np.maximum.accumulate(self.pnl) - self.pnl)
+
+    def summary(self):
+        return {
+            'session': self.tape.session,
+            'pnl': self.pnl[-1],
+            'realized': self.account.realized,
+            'commission': self.account.commission,
+            'drawdown': self.drawdown(),
+            'max_position': np.max(np.abs(self.position)),
+            'final_position': self.final_position,
+            'volume': self.account.volume,
+            'orders': self.n_orders
+        }
+
+def backtest(name, tape, matcher = None):
+    return Backtest(POLICIES[name](), tape, matcher).run()
+
+###################################################################################################
+
+def main():
+
+    name = sys.argv[1] if len(sys.argv) > 1 else "skeleton"
+    tapes = [Tape.load(session) for session in (sys.argv[2:] or sessions())]
+    matcher = MATCHERS[os.environ.get("RIT_MATCHER", "cross")]
+
+    print(f"{'session':>8} {'pnl':>11} {'realized':>11} {'commission':>11} {'drawdown':>11} {'max pos':>8} {'final':>6} {'volume':>8} {'orders':>7}")
+    total = 0
+    for tape in tapes:
+        s = backtest(name, tape, matcher(tape)).summary()
+        total += s['pnl']
+        print(f"{s['session']:>8} {s['pnl']:>11.2f} {s['realized']:>11.2f} {s['commission']:>11.2f} {s['drawdown']:>11.2f} {s['max_position']:>8.0f} {s['final_position']:>6} {s['volume']:>8.0f} {s['orders']:>7}")
+    print(f"{'total':>8} {total:>11.2f}")
+
+if __name__ == '__main__':
+
+    main()
@@ -0,0 +1,89 @@
+from order_book import OrderBook
+from timeit import Timer
+import pandas as pd
+import numpy as np
+
+###################################################################################################
+
+DEPTHS = [10, 20, 40, 100, 200, 500, 1_000]
+MID = 20
+SEED = 0
+
+## The pandas aggregation every strategy used before OrderBook, kept as the reference
+OBKEYS = ['price', 'quantity', 'quantity_filled']
+def aggregate_order_book(items, ascending):
+    df = pd.DataFrame(
+        [
+            {
+                key: bid[key]
+                for key in OBKEYS
+            }
+            for bid in items
+            if bid['status'] == "OPEN"
+        ],
+        columns = OBKEYS
+    )
+    df['quantity'] = df.quantity - df.quantity_filled
+    df = df[df.quantity != 0].drop('quantity_filled', axis=1)
+    df = df.groupby('price').sum().sort_index(ascending = ascending).reset_index()
+    vwap = (df.price * (df.quantity / df.quantity.sum())).sum()
+    return df, vwap
+
+def pandas_book(book):
+    bid_ladder, bid_vwap = aggregate_order_book(book['bids'], False)
+    ask_ladder, ask_vwap = aggregate_order_book(book['asks'], False)
+    bid_volume = bid_ladder.quantity.sum()
+    ask_volume = ask_ladder.quantity.sum()
+    imbalance = (bid_volume - ask_volume) / (bid_volume + ask_volume)
+    return bid_ladder.price.values[0], ask_ladder.price.values[-1], bid_vwap, ask_vwap, imbalance
+
+def numpy_book(engine, book):
+    engine.update(book)
+    return engine.best_bid, engine.best_ask, engine.bid_vwap, engine.ask_vwap, engine.imbalance()
+
+## Several orders per level and some partial fills / closed orders, like the live /securities/book
+def make_side(rng, depth, action):
+    sign = -1 if action == "BUY" else 1
+    levels = MID + sign * (0.01 + np.floor(np.arange(depth) / 3) / 100)
+    quantity = rng.integers(1, 50, depth) * 100
+    filled = np.where(rng.random(depth) < 0.2, rng.integers(0, 10, depth) * 10, 0)
+    status = np.where(rng.random(depth) < 0.05, "TRANSACTED", "OPEN")
+    return [
+        {
+            'order_id': i,
+            'action': action,
+            'price': round(float(levels[i]), 2),
+            'quantity': int(quantity[i]),
+            'quantity_filled': int(filled[i]),
+            'status': str(status[i])
+        }
+        for i in range(depth)
+    ]
+
+def make_book(rng, depth):
+    return {'bids': make_side(rng, depth, "BUY"), 'asks': make_side(rng, depth, "SELL")}
+
+def best_time(fn, number):
+    return min(Timer(fn).repeat(repeat = 5, number = number)) / number
+
+###################################################################################################
+
+def main():
+
+    rng = np.random.default_rng(SEED)
+    engine = OrderBook()
+
+    print(f"{'depth':>6} {'pandas (us)':>12} {'numpy (us)':>12} {'speedup':>8}")
+    for depth in DEPTHS:
+
+        book = make_book(rng, depth)
+        assert np.allclose(pandas_book(book), numpy_book(engine, book))
+
+        number = max(10, 10_000 // depth)
+        pandas_time = best_time(lambda: pandas_book(book), number)
+        numpy_time = best_time(lambda: numpy_book(engine, book), number)
+        print(f"{depth:>6} {pandas_time * 1e6:>12.1f} {numpy_time * 1e6:>12.1f} {pandas_time / numpy_time:>7.1f}x")
+
+if __name__ == '__main__':
+
+    main()
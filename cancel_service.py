@@ -0,0 +1,89 @@
+from concurrent.futures import Future, wait
+from rate_limiter import CANCEL
+from api import BASE_URL
+
+###################################################################################################
+
+## Query for the cancel command selecting one side of our book inside a price band. RIT signs the
+## volume of resting orders, positive for bids and negative for asks.
+def band_query(action, low = None, high = None):
+    terms = ["Volume > 0" if action == "BUY" else "Volume < 0"]
+    if low is not None:
+        terms.append(f"Price >= {low}")
+    if high is not None:
+        terms.append(f"Price <= {high}")
+    return " AND ".join(terms)
+
+## Collects every cancel decided during a loop pass and sends them as one /v1/commands/cancel call
+## with an `ids=` list, plus one call per `query=`. The server answers with the ids it actually
+## cancelled, which is what callers should trust: after `confirm`, `cancelled` holds those ids,
+## `failed` the ids whose request did not go through and `missed` the ones that were no longer open
+## (filled or already cancelled). Listeners get called with the confirmed ids after every `confirm`.
+class CancelService:
+
+    def __init__(self, limiter = None):
+        self.limiter = limiter
+        self.ids = []
+        self.queries = []
+        self.requests = []
+        self.cancelled = set()
+        self.failed = set()
+        self.missed = set()
+        self.ok = True
+        self.listeners = []
+
+    def subscribe(self, listener):
+        self.listeners.append(listener)
+
+    def cancel(self, order_id):
+        self.ids.append(order_id)
+
+    def cancel_query(self, query):
+        self.queries.append(query)
+
+    def send(self, session, params, priority):
+        url = f"{BASE_URL}/commands/cancel"
+        if self.limiter is not None:
+            return self.limiter.submit("POST", url, params = params, priority = priority)
+        future = Future()
+        future.set_result(session.post(url, params = params))
+        return future
+
+    ## Sends what was collected without waiting, returns the futures
+    def submit(self, session, priority = CANCEL):
+
+        ids, self.ids = self.ids, []
+        queries, self.queries = self.queries, []
+
+        if len(ids) != 0:
+            future = self.send(session, {'ids': ",".join(map(str, ids))}, priority)
+            self.requests.append((future, ids))
+        for query in queries:
+            future = self.send(session, {'query': query}, priority)
+            self.requests.append((future, []))
+
+        return [future for future, ids in self.requests]
+
+    ## Waits for everything submitted and checks it against `cancelled_order_ids`
+    def confirm(self):
+
+        requests, self.requests = self.requests, []
+        wait([future for future, ids in requests])
+
+        self.cancelled, self.failed, self.missed = set(), set(), set()
+        self.ok = True
+        for future, ids in requests:
+            if future.cancelled() or future.exception() is not None or not future.result().ok:
+                self.failed.update(ids)
+                self.ok = False
+                continue
+            confirmed = set(future.result().json()['cancelled_order_ids'])
+            self.cancelled.update(confirmed)
+            self.missed.update(set(ids) - confirmed)
+        for listener in self.listeners:
+            listener(self.cancelled)
+        return self.cancelled
+
+    def flush(self, session, priority = CANCEL):
+        self.submit(session, priority)
+        return self.confirm()
@@ -1,3 +1,4 @@
+from tick_clock import TickClock
 from config import API_KEY
 from pathlib import Path
 from time import sleep
@@ -81,17 +82,15 @@ def get_full_time_and_sales(session):
 
 def main():
 
-	best_bid, best_ask, tick = 0, 0, 0
+	clock = TickClock()
+	clock.subscribe(print)
 
 	with requests.Session() as session:
 		session.headers.update(API_KEY)
 
+		## Sleeps until just before each tick boundary instead of spinning on /v1/case
 		while data['tick'] != 299:
-			
-			get_tick(session, data)
-			if data['tick'] != tick:
-				print(data['tick'])
-				tick = data['tick']
+			data['tick'] = clock.wait(session)
 
 		get_full_time_and_sales(session)
 		get_full_price_history(session)
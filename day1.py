@@ -1,4 +1,8 @@
 from volatility_estimators import *
+from order_book import OrderBook
+from tick_clock import TickClock
+from rate_limiter import RateLimiter, CANCEL
+from time_and_sales import TimeAndSales
 from config import API_KEY
 from pathlib import Path
 from time import sleep
@@ -29,12 +33,10 @@ data = {
     'ask_vwap': 0,
     'vol': 0,
     'vol_spread': 0,
-    'bid_ladder': pd.DataFrame(),
     'best_bid': 0,
     'best_ask': 0,
     'best_spread': 0,
     'mid': 0,
-    'ask_ladder': pd.DataFrame(),
     'ohlc': pd.DataFrame(),
     'bid_price': 0,
     'ask_price': 0,
@@ -58,6 +60,8 @@ def get_tick(session, data):
         return data
     return ApiException("Auth Error. Check API Key")
 
+clock = TickClock()
+
 def get_security_info(session, data):
     resp = session.get("http://localhost:9999/v1/securities?ticker=ALGO")
     if resp.ok:
@@ -66,35 +70,16 @@ def get_security_info(session, data):
         return data
     return ApiException("Auth Error. Check API Key")
 
-OBKEYS = ['price', 'quantity', 'quantity_filled']
-def aggregate_order_book(items, ascending):
-    df = pd.DataFrame(
-        [
-            {
-                key: bid[key]
-                for key in OBKEYS
-            }
-            for bid in items
-            if bid['status'] == "OPEN"
-        ],
-        columns = OBKEYS
-    )
-    df['quantity'] = df.quantity - df.quantity_filled
-    df = df[df.quantity != 0].drop('quantity_filled', axis=1)
-    df = df.groupby('price').sum().sort_index(ascending = ascending).reset_index()
-    vwap = (df.price * (df.quantity / df.quantity.sum())).sum()
-    return df, vwap
-
+book = OrderBook()
 def get_order_book(session, data):
     resp = session.get(f"http://localhost:9999/v1/securities/book?ticker=ALGO&limit={BOOK_LIMIT}")
     if resp.ok:
-        resp = resp.json()
-        data['bid_ladder'], data['bid_vwap'] = aggregate_order_book(resp['bids'], False)
-        data['ask_ladder'], data['ask_vwap'] = aggregate_order_book(resp['asks'], False)
-        if data['bid_ladder'].shape[0] == 0 or data['ask_ladder'].shape[0] == 0:
+        book.update(resp.json())
+        data['bid_vwap'], data['ask_vwap'] = book.bid_vwap, book.ask_vwap
+        if book.empty:
             return data
-        data['best_bid'] = data['bid_ladder'].price.values[0]
-        data['best_ask'] = data['ask_ladder'].price.values[-1]
+        data['best_bid'] = book.best_bid
+        data['best_ask'] = book.best_ask
         data['mid'] = round((data['best_bid'] + data['best_ask']) / 2, 3)
         data['best_spread'] = round(data['best_ask'] - data['best_bid'], 2)
         return data
@@ -110,14 +95,11 @@ def get_price_history(session, data):
         return data
     return ApiException("Auth Error. Check API Key")
 
-TASCOLS = ['id', 'period', 'tick', 'price', 'quantity']
+time_and_sales = TimeAndSales()
 def get_time_and_sales(session, data):
-    resp = session.get(f"http://localhost:9999/v1/securities/tas?ticker=ALGO")
-    if resp.ok:
-        df = pd.DataFrame(resp.json(), columns = TASCOLS).sort_values('tick', ascending = True)
-        df = df.groupby('tick').agg({'quantity': ['mean', 'sum']}).reset_index()
-        df.columns = ['tick', 'avg_trade_volume', 'total_volume']
-        data['tas'] = df
+    if time_and_sales.update(session, data['tick']):
+        data['time_factor'] = time_and_sales.time_factor
+        return data
     return ApiException("Auth Error. Check API Key")
 
 def get_open_orders(session):
@@ -135,7 +117,9 @@ def get_order_details(session, _id):
     if resp.ok: return resp.json()
     return ApiException("Auth Error. Check API Key")
 
-## Subject to rate limits
+limiter = RateLimiter(API_KEY)
+
+## Subject to rate limits. Paced by the shared limiter, which retries on 429
 def send_order(session, data, _type, quantity, action, price = 0):
     params = {
         'ticker': 'ALGO',
@@ -145,16 +129,13 @@ def send_order(session, data, _type, quantity, action, price = 0):
         'action': action,
     }
     if _type == "MARKET": body['dry_run'] = 0
-    resp = session.post("http://localhost:9999/v1/orders", params = params)
-    if resp.status_code == 429:
-        sleep(resp.json()['wait'] / 1_000)
-        resp = session.post("http://localhost:9999/v1/orders", params = params)
+    resp = limiter.call("POST", "http://localhost:9999/v1/orders", params = params)
     if resp.ok:
         return resp.json()['order_id']
     return ApiException("Auth Error. Check API Key")
 
-def cancel_all_orders(session):
-    resp = session.post(f"http://localhost:9999/v1/commands/cancel?all=1")
+def cancel_all_orders(session, priority = CANCEL):
+    resp = limiter.call("POST", f"http://localhost:9999/v1/commands/cancel?all=1", priority = priority)
     if resp.ok:
         print("Cacelled All Orders")
     return ApiException("Auth Error. Check API Key")
@@ -172,10 +153,7 @@ def bookkeeping(orders):
     ]
 
 def vol_spreading(data, estimator, calibration):
-    ohlc = data['ohlc']
-    tassagg = data['tas']
-    data['time_factor'] = ((tassagg['avg_trade_volume'] / (tassagg['total_volume'] + 1)) ** 2).values.mean()
-    data['vol'] = estimator(ohlc, time_step=1)
+    data['vol'] = estimator(data['ohlc'], time_step=1)
     data['vol_spread'] = round(calibration * data['time_factor'] * data['vol'] * data['mid'], 2)
 
 def inventory_skewing(data):
@@ -211,6 +189,7 @@ def main():
             ## Dont trade for 5 seconds
             get_tick(session, data)
             if data['tick'] < 5:
+                clock.wait(session)
                 continue
 
             transacted_orders = get_transacted_orders(session)
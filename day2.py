@@ -1,4 +1,11 @@
 from volatility_estimators import *
+from order_book import OrderBook
+from tick_clock import TickClock
+from rate_limiter import RateLimiter, RISK, CANCEL, QUOTE
+from order_gateway import OrderGateway
+from time_and_sales import TimeAndSales
+from order_reconciler import OrderReconciler
+from order_ledger import OrderLedger
 from logger import DIR, logger
 from config import API_KEY
 from time import sleep
@@ -38,8 +45,6 @@ data = {
     'ask': 0,
 
     ## Order Book Info
-    'bid_ladder': pd.DataFrame(),
-    'ask_ladder': pd.DataFrame(),
     'bid_vwap': 0,
     'ask_vwap': 0,
     'LOB_imbalance': 0,
@@ -48,9 +53,6 @@ data = {
     ## Price History
     'ohlc': pd.DataFrame(),
 
-    ## Time & Sales
-    'tas': pd.DataFrame(),
-    
     ## Calculated Metrics
     'gtrend': 0,
     'trend': 0,
@@ -81,6 +83,8 @@ def get_tick(session, data):
         return data
     return ApiException("Auth Error. Check API Key")
 
+clock = TickClock()
+
 def get_security_info(session, data):
     resp = session.get("http://localhost:9999/v1/securities?ticker=ALGO")
     if resp.ok:
@@ -94,41 +98,17 @@ def get_security_info(session, data):
         return data
     return ApiException("Auth Error. Check API Key")
 
-OBKEYS = ['price', 'quantity', 'quantity_filled']
-def aggregate_order_book(items, ascending):
-    df = pd.DataFrame(
-        [
-            {
-                key: bid[key]
-                for key in OBKEYS
-            }
-            for bid in items
-            if bid['status'] == "OPEN"
-        ],
-        columns = OBKEYS
-    )
-    df['quantity'] = df.quantity - df.quantity_filled
-    df = df[df.quantity != 0].drop('quantity_filled', axis=1)
-    df = df.groupby('price').sum().sort_index(ascending = ascending).reset_index()
-    vwap = (df.price * (df.quantity / df.quantity.sum())).sum()
-    return df, vwap
-
+book = OrderBook()
 def get_order_book(session, data):
     resp = session.get(f"http://localhost:9999/v1/securities/book?ticker=ALGO&limit={BOOK_LIMIT}")
     if resp.ok:
-        resp = resp.json()
-        data['bid_ladder'], data['bid_vwap'] = aggregate_order_book(resp['bids'], False)
-        data['ask_ladder'], data['ask_vwap'] = aggregate_order_book(resp['asks'], False)
-        if data['bid_ladder'].shape[0] == 0 or data['ask_ladder'].shape[0] == 0:
+        book.update(resp.json())
+        data['bid_vwap'], data['ask_vwap'] = book.bid_vwap, book.ask_vwap
+        if book.empty:
             return data
-                
-        bid_volume = data['bid_ladder'].quantity.sum()
-        ask_volume = data['ask_ladder'].quantity.sum()
-        data['LOB_imbalance'] = (bid_volume - ask_volume) / (bid_volume + ask_volume)
 
-        bid_vwap_spread = data['mid'] - data['bid_vwap']
-        ask_vwap_spread = data['ask_vwap'] - data['mid']
-        data['LOB_mass_imbalance'] =  (ask_vwap_spread - bid_vwap_spread) / (bid_vwap_spread + ask_vwap_spread)
+        data['LOB_imbalance'] = book.imbalance()
+        data['LOB_mass_imbalance'] = book.mass_imbalance(data['mid'])
 
         return data
 
@@ -150,14 +130,11 @@ def get_price_history(session, data):
         return data
     return ApiException("Auth Error. Check API Key")
 
-TASCOLS = ['id', 'period', 'tick', 'price', 'quantity']
+time_and_sales = TimeAndSales()
 def get_time_and_sales(session, data):
-    resp = session.get(f"http://localhost:9999/v1/securities/tas?ticker=ALGO")
-    if resp.ok:
-        df = pd.DataFrame(resp.json(), columns = TASCOLS).sort_values('tick', ascending = True)
-        df = df.groupby('tick').agg({'quantity': ['mean', 'sum']}).reset_index()
-        df.columns = ['tick', 'avg_trade_volume', 'total_volume']
-        data['tas'] = df
+    if time_and_sales.update(session, data['tick']):
+        data['time_factor'] = time_and_sales.time_factor
+        return data
     return ApiException("Auth Error. Check API Key")
 
 def get_open_orders(session):
@@ -250,27 +227,39 @@ def get_liquidating_orders(data):
     orders.append(build_order("LIMIT", r, price, action))
     return [order for order in orders if order['quantity'] != 0]
 
-## Subject to rate limits
-def send_order(session, order):
-    if order['type'] == "MARKET": body['dry_run'] = 0
-    resp = session.post("http://localhost:9999/v1/orders", params = order)
-    if resp.status_code == 429:
-        sleep(resp.json()['wait'] / 1_000)
-        resp = session.post("http://localhost:9999/v1/orders", params = order)
+limiter = RateLimiter(API_KEY)
+gateway = OrderGateway(API_KEY, limiter)
+ledger = OrderLedger()
+
+## Subject to rate limits. Queued on the shared limiter, which paces it and retries it on 429
+def queue_order(session, order, priority = QUOTE, ttl = None):
+    if order['type'] == "MARKET": order['dry_run'] = 0
+    future = limiter.submit("POST", "http://localhost:9999/v1/orders", params = order, priority = priority, ttl = ttl)
+    ledger.track(order, future, data['tick'])
+    return future
+
+def send_order(session, order, priority = QUOTE):
+    resp = queue_order(session, order, priority).result()
     if resp.ok:
         return resp.json()['order_id']
     return ApiException("Auth Error. Check API Key")
 
-def cancel_all_orders(session):
-    resp = session.post(f"http://localhost:9999/v1/commands/cancel?all=1")
+def cancel_all_orders(session, priority = CANCEL):
+    resp = limiter.call("POST", f"http://localhost:9999/v1/commands/cancel?all=1", priority = priority)
     if resp.ok:
         print("Cacelled All Orders")
     return ApiException("Auth Error. Check API Key")
 
+## Liquidation slices skip the limiter's queue, they still go in the ledger
+def submit_order(session, order, priority = RISK, ttl = None):
+    future = gateway.submit(session, order, priority, ttl)
+    ledger.track(order, future, data['tick'])
+    return future
+
+reconciler = OrderReconciler(limiter)
+reconciler.cancels.subscribe(ledger.cancelled)
+
 def vol_spreading(data, calibration):
-    ohlc = data['ohlc']
-    tas = data['tas']
-    data['time_factor'] = ((tas['avg_trade_volume'] / (tas['total_volume'] + 1)) ** 2).values.mean()
     data['vol_spread'] = round(calibration * data['vol'] * data['mid'], 2)
 
     # data['vol_spread'] = round(calibration * data['time_factor'] * data['vol'] * data['mid'], 2)
@@ -314,6 +303,7 @@ def main():
 
             data['n_transacted_orders'] = 0
             data['tick'] = 0
+            ledger.reset()
             init = True
 
             while data['tick'] != 299:
@@ -321,15 +311,13 @@ def main():
                 ## Dont trade for first 5 ticks
                 get_tick(session, data)
                 if data['tick'] < START_TICK:
+                    clock.wait(session)
                     continue
 
                 ## Liquidate everything with 10 ticks remaining
                 if data['tick'] > END_TICK:
                     get_order_book(session, data)
-                    cancel_all_orders(session)
-                    orders = get_liquidating_orders(data)
-                    for order in orders:
-                        send_order(session, order)
+                    reconciler.reconcile(session, get_liquidating_orders(data), submit_order, RISK)
 
                 get_security_info(session, data)
                 get_order_book(session, data)
@@ -338,12 +326,11 @@ def main():
 
                 # log(data)
 
-                transacted_orders = get_transacted_orders(session)
+                ## Fills come from the ledger instead of pulling the whole TRANSACTED list
+                ledger.update(session, data, time_and_sales.low, time_and_sales.high)
                 n = data['n_transacted_orders']
                 
-                if len(transacted_orders) != n or init:
-                    
-                    cancel_all_orders(session)
+                if ledger.n_transacted != n or init:
                     
                     vol_spreading(data, VOL_CALIBRATION)
                     bid, ask = inventory_skewing(data)
@@ -352,7 +339,7 @@ def main():
                     
                     print("------------")
                     print("Tick", data['tick'])
-                    print("N-transaction", len(transacted_orders))
+                    print("N-transaction", ledger.n_transacted)
                     print(f"({bid}, {data['mid']}, {ask})")
                     print("Position", data['position'])
                     print("VWAP", data['position_vwap'])
@@ -361,12 +348,10 @@ def main():
                     print("Vol-Spread", data['vol_spread'])
 
                     buy_orders, sell_orders = get_orders(data, bid, ask)
-                    for order in buy_orders:
-                        send_order(session, order)
-                    for order in sell_orders:
-                        send_order(session, order)
+                    reconciler.reconcile(session, buy_orders + sell_orders, queue_order, QUOTE, clock.period)
+                    print("Kept", reconciler.n_kept, "Cancelled", reconciler.n_cancelled, "Submitted", reconciler.n_submitted)
                     
-                    data['n_transacted_orders'] = len(transacted_orders)
+                    data['n_transacted_orders'] = ledger.n_transacted
                     init = False
 
 if __name__ == '__main__':
@@ -0,0 +1,218 @@
+from collections import deque
+from time import sleep
+import threading
+import requests
+
+###################################################################################################
+
+QUEUE_SIZE = 64
+POLL_INTERVAL = 0.1
+
+## Intent kinds. A TARGET is the full set of orders we want resting, so only the newest one matters
+## and an older one still waiting is dropped. SEND is a batch that goes out as is (stop-loss and
+## hedge slices) and those are never dropped.
+TARGET = "TARGET"
+SEND = "SEND"
+
+## Single slot holding the newest value. Publishing never blocks and overwrites whatever was not
+## read yet, readers wait for a version newer than the last one they saw.
+class LatestValue:
+
+    def __init__(self):
+        self.cond = threading.Condition()
+        self.value = None
+        self.version = 0
+        self.closed = False
+
+    def publish(self, value):
+        with self.cond:
+            self.value = value
+            self.version += 1
+            self.cond.notify_all()
+
+    ## (version, value), or (version, None) on timeout or once closed
+    def wait(self, version = 0, timeout = None):
+        with self.cond:
+            self.cond.wait_for(lambda: self.version > version or self.closed, timeout)
+            if self.version > version:
+                return self.version, self.value
+            return version, None
+
+    def close(self):
+        with self.cond:
+            self.closed = True
+            self.cond.notify_all()
+
+## Strategy to gateway hand-off. TARGET intents share one latest value wins slot, SEND intents go
+## through a bounded FIFO that blocks the strategy when the gateway falls `size` batches behind.
+## SEND intents are handed out first, and the ones already queued are still handed out after close.
+## Consumers call `done` once they are through with an intent, so `idle` only holds once everything
+## handed out has been dealt with.
+class IntentQueue:
+
+    def __init__(self, size = QUEUE_SIZE):
+        self.size = size
+        self.cond = threading.Condition()
+        self.sends = deque()
+        self.target = None
+        self.closed = False
+        self.in_flight = 0
+        self.n_dropped = 0
+
+    def put(self, intent, timeout = None):
+        with self.cond:
+            if intent[0] == TARGET:
+                if self.target is not None:
+                    self.n_dropped += 1
+                self.target = intent
+            else:
+                self.cond.wait_for(lambda: len(self.sends) < self.size or self.closed, timeout)
+                if self.closed or len(self.sends) >= self.size:
+                    return False
+                self.sends.append(intent)
+            self.cond.notify_all()
+            return True
+
+    ## None on timeout, or once closed and out of SEND intents
+    def get(self, timeout = None):
+        with self.cond:
+            self.cond.wait_for(lambda: self.sends or self.target is not None or self.closed, timeout)
+            if self.sends:
+                intent = self.sends.popleft()
+            elif self.target is not None and not self.closed:
+                intent, self.target = self.target, None
+            else:
+                return None
+            self.in_flight += 1
+            self.cond.notify_all()
+            return intent
+
+    def done(self):
+        with self.cond:
+            self.in_flight -= 1
+            self.cond.notify_all()
+
+    def close(self):
+        with self.cond:
+            self.closed = True
+            self.cond.notify_all()
+
+    @property
+    def drained(self):
+        with self.cond:
+            return self.closed and len(self.sends) == 0
+
+    @property
+    def idle(self):
+        with self.cond:
+            return len(self.sends) == 0 and self.target is None and self.in_flight == 0
+
+## Three thread runtime for one strategy, so a slow request never holds up a decision.
+##
+##   feed(session) -> snapshot or None        market data thread, publishes to `snapshots`
+##   strategy(snapshot)                        strategy thread, only ever sees the newest snapshot
+##                                             and emits intents with `target` / `send`
+##   execute(session, intent)                  gateway thread, one intent at a time
+##
+## The feed and gateway threads each keep their own session. An exception in any of them stops
+## the engine and is raised again from `run`.
+class Engine:
+
+    def __init__(self, headers, feed, strategy, execute, queue_size = QUEUE_SIZE):
+        self.headers = headers
+        self.feed = feed
+        self.strategy = strategy
+        self.execute = execute
+        self.snapshots = LatestValue()
+        self.intents = IntentQueue(queue_size)
+        self.threads = []
+        self.running = False
+        self.error = None
+
+    ###############################################################################################
+    ## Intents
+
+    def target(self, orders, priority = None):
+        return self.intents.put((TARGET, orders, priority))
+
+    def send(self, orders, priority = None):
+        if len(orders) == 0:
+            return True
+        return self.intents.put((SEND, orders, priority))
+
+    ###############################################################################################
+    ## Threads
+
+    def get_session(self):
+        session = requests.Session()
+        session.headers.update(self.headers)
+        return session
+
+    def guard(self, loop):
+        try:
+            loop()
+        except Exception as e:
+            self.error = e
+            self.stop()
+
+    def run_feed(self):
+        with self.get_session() as session:
+            while self.running:
+                snapshot = self.feed(session)
+                if snapshot is not None:
+                    self.snapshots.publish(snapshot)
+
+    def run_strategy(self):
+        version = 0
+        while self.running:
+            version, snapshot = self.snapshots.wait(version, POLL_INTERVAL)
+            if snapshot is not None and self.running:
+                self.strategy(snapshot)
+
+    def run_gateway(self):
+        with self.get_session() as session:
+            while not self.intents.drained:
+                intent = self.intents.get(POLL_INTERVAL)
+                if intent is not None:
+                    try:
+                        self.execute(session, intent)
+                    except requests.RequestException as e:
+                        print("Gateway", intent[0], "failed", e)
+                    finally:
+                        self.intents.done()
+
+    ## Nothing queued for the gateway and nothing being executed
+    @property
+    def idle(self):
+        return self.intents.idle
+
+    def start(self):
+        self.running = True
+        self.threads = [
+            threading.Thread(target = self.guard, args = (loop,), name = name, daemon = True)
+            for name, loop in [("feed", self.run_feed), ("strategy", self.run_strategy), ("gateway", self.run_gateway)]
+        ]
+        for thread in self.threads:
+            thread.start()
+
+    ## Already queued SEND intents still go out, a pending TARGET does not
+    def stop(self):
+        self.running = False
+        self.snapshots.close()
+        self.intents.close()
+
+    def join(self):
+        for thread in self.threads:
+            if thread is not threading.current_thread():
+                thread.join()
+
+    ## Blocks until `until()` is true or a thread failed. The main thread only polls, so it stays
+    ## free for signal handlers.
+    def run(self, until = None):
+        self.start()
+        while self.running and not (until is not None and until()):
+            sleep(POLL_INTERVAL)
+        self.stop()
+        self.join()
+        if self.error is not None:
+            raise self.error
@@ -0,0 +1,100 @@
+###################################################################################################
+
+## Time sliced unwind of the position. Once started, every tick up to `end_tick` gets one slice of
+## ceil(|position| / ticks left), capped at `max_volume` and, when a depth is given, at what the
+## book shows at the touch. Limit slices rest at the touch like get_liquidating_orders did and what
+## is left of the tick's slice is asked for on every pass of the tick, so a reconciler keeps it
+## instead of resending it. A slice that did not fill by the next tick is priced through the spread
+## at the other touch for that tick instead. Market slices are only handed out once per tick. The
+## last `market_ticks` ticks go to market for the whole position, in `max_volume` orders, and
+## whatever is still open after `end_tick` keeps going out that way every tick, so the unwind only
+## stops once the position is flat. `complete` says whether it got there, `shortfall` is what was
+## left as of the last tick.
+class LiquidationScheduler:
+
+    def __init__(self, max_volume, market_ticks = 1, ticker = "ALGO"):
+        self.max_volume = max_volume
+        self.market_ticks = market_ticks
+        self.ticker = ticker
+        self.active = False
+        self.isMarket = False
+        self.start_tick = None
+        self.end_tick = None
+        self.last_tick = None
+        self.sliced = 0
+        self.position = 0
+        self.slice_position = 0
+        self.quantity = 0
+        self.cross = False
+
+    ## Does nothing while an unwind is already running
+    def start(self, tick, end_tick, isMarket = False):
+        if self.active:
+            return
+        self.active = True
+        self.isMarket = isMarket
+        self.start_tick = tick
+        self.end_tick = end_tick
+        self.last_tick = None
+        self.sliced = 0
+        self.quantity = 0
+        self.cross = False
+
+    def stop(self):
+        self.active = False
+
+    def ticks_left(self, tick):
+        return max(self.end_tick - tick + 1, 1)
+
+    @property
+    def complete(self):
+        return self.position == 0
+
+    @property
+    def shortfall(self):
+        return abs(self.position)
+
+    def slice(self, position, tick, depth = None):
+        quantity = -(-abs(position) // self.ticks_left(tick))
+        quantity = min(quantity, self.max_volume)
+        if depth is not None:
+            quantity = min(quantity, max(int(depth), 1))
+        return int(quantity)
+
+    def orders(self, data, depth = None):
+
+        pos = data['position']
+        tick = data['tick']
+        if not self.active:
+            return []
+        self.position = pos
+        if pos == 0:
+            self.stop()
+            return []
+
+        isMarket = self.isMarket or self.ticks_left(tick) <= self.market_ticks
+        if isMarket and tick == self.last_tick:
+            return []
+
+        if tick != self.last_tick:
+            ## Less came off the position since the last tick than its slice asked for
+            self.cross = self.last_tick is not None and abs(self.slice_position) - abs(pos) < self.quantity
+            self.slice_position = pos
+            self.quantity = self.slice(pos, tick, depth)
+            self.sliced += 1
+        self.last_tick = tick
+
+        ## The last slices take whatever is left, whatever the size
+        if self.ticks_left(tick) <= self.market_ticks:
+            quantities = [self.max_volume] * int(abs(pos) // self.max_volume) + [int(abs(pos) % self.max_volume)]
+        else:
+            quantities = [self.quantity - max(abs(self.slice_position) - abs(pos), 0)]
+
+        passive, aggressive = (data['bid'], data['ask']) if pos < 0 else (data['ask'], data['bid'])
+        return [{
+            'ticker': self.ticker,
+            'type': "MARKET" if isMarket else "LIMIT",
+            'quantity': quantity,
+            'price': aggressive if self.cross else passive,
+            'action': "BUY" if pos < 0 else "SELL",
+        } for quantity in quantities if quantity != 0]
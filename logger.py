@@ -8,7 +8,10 @@ logger.setLevel(logging.DEBUG)
 
 DIR = Path(os.path.dirname(os.path.realpath(__file__)))
 
-log_file = Path(f'{datetime.now().isoformat()[:-10]}_log.log'.replace(":", "_").replace("-", "_"))
+## Workers running side by side start in the same minute, so each gets a prefix (e.g. the port)
+LOG_PREFIX = os.environ.get("RIT_LOG_PREFIX", "")
+
+log_file = Path(f'{LOG_PREFIX}{datetime.now().isoformat()[:-10]}_log.log'.replace(":", "_").replace("-", "_"))
 log_file = Path(DIR / "logs" / log_file)
 fh = logging.FileHandler(log_file)
 
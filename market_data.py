@@ -0,0 +1,75 @@
+from concurrent.futures import ThreadPoolExecutor
+from rate_limiter import ScheduledSession, CANCEL, MARKET_DATA
+import threading
+import requests
+import asyncio
+
+###################################################################################################
+
+## Concurrent market data fan-out. Every fetcher is one of the usual `(session, data)` API
+## functions. They are independent GETs, so each pass runs them all at once on the event loop, each
+## one on a worker that owns a keep-alive session, and the pass costs roughly the slowest call
+## instead of the sum of all of them.
+##
+## Given the order scheduler, a pass is held back until the risk and cancel requests queued on it
+## are out, and every GET of the pass then waits for its MARKET_DATA turn behind any quotes still
+## queued, so market data never competes with order traffic for the server.
+class MarketData:
+
+    def __init__(self, headers, fetchers, pool_size = None, scheduler = None):
+        self.headers = headers
+        self.fetchers = fetchers
+        self.scheduler = scheduler
+        self.executor = ThreadPoolExecutor(max_workers = pool_size or len(fetchers))
+        self.loop = asyncio.new_event_loop()
+        self.local = threading.local()
+        self.sessions = []
+        self.lock = threading.Lock()
+
+    def get_session(self):
+        session = getattr(self.local, 'session', None)
+        if session is None:
+            session = requests.Session()
+            session.headers.update(self.headers)
+            with self.lock:
+                self.sessions.append(session)
+            if self.scheduler is not None:
+                session = ScheduledSession(session, self.scheduler, MARKET_DATA)
+            self.local.session = session
+        return session
+
+    ## The fetcher gets a copy of its own and only what it wrote comes back
+    def fetch(self, fetcher, data):
+        own = dict(data)
+        fetcher(self.get_session(), own)
+        return {key: value for key, value in own.items() if key not in data or value is not data[key]}
+
+    async def gather(self, data):
+        return await asyncio.gather(*[
+            self.loop.run_in_executor(self.executor, self.fetch, fetcher, data)
+            for fetcher in self.fetchers
+        ])
+
+    ## Every fetcher reads the state as of the start of the pass and writes to its own copy, so none
+    ## of them sees a field another one is writing (history and TAS read the tick get_tick sets).
+    ## Their writes are merged in fetcher order once they are all back, so the caller only ever
+    ## sees a snapshot where every field comes from the same pass.
+    def snapshot(self, data):
+        if self.scheduler is not None:
+            self.scheduler.drain(CANCEL)
+        snapshot = dict(data)
+        for result in self.loop.run_until_complete(self.gather(data)):
+            snapshot.update(result)
+        return snapshot
+
+    def close(self):
+        self.executor.shutdown(wait = True)
+        for session in self.sessions:
+            session.close()
+        self.loop.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
@@ -0,0 +1,330 @@
+import numpy as np
+
+###################################################################################################
+
+HALF_SPREAD = 0.01
+BOOK_DEPTH = 40
+LEVEL_SIZE = 20_000
+MKT_COM = 0.01
+LMT_COM = 0.005
+
+SIGN = {"BUY": 1, "SELL": -1}
+
+## Position, average cost and PnL the way the case account keeps them. `realized` is net of the
+## commission, which is also totalled on its own.
+class Account:
+
+    def __init__(self):
+        self.position = 0
+        self.vwap = 0
+        self.realized = 0
+        self.commission = 0
+        self.volume = 0
+
+    def trade(self, delta, price, commission = 0):
+        pos = self.position
+        if pos == 0 or (pos > 0) == (delta > 0):
+            self.vwap = (self.vwap * abs(pos) + price * abs(delta)) / (abs(pos) + abs(delta))
+        else:
+            closed = min(abs(pos), abs(delta))
+            self.realized += closed * (price - self.vwap) * (1 if pos > 0 else -1)
+            if abs(delta) > abs(pos):
+                self.vwap = price
+        self.position = pos + delta
+        if self.position == 0:
+            self.vwap = 0
+        self.volume += abs(delta)
+        self.realized -= commission * abs(delta)
+        self.commission += commission * abs(delta)
+
+    def unrealized(self, last):
+        return (last - self.vwap) * self.position
+
+## Books a fill on an order dict shaped like the API's
+def fill(order, quantity, price):
+    filled = order['quantity_filled']
+    order['vwap'] = ((order['vwap'] or 0) * filled + price * quantity) / (filled + quantity)
+    order['quantity_filled'] = filled + quantity
+    if order['quantity_filled'] >= order['quantity']:
+        order['status'] = "TRANSACTED"
+
+###################################################################################################
+
+## Fill model shared by the mock server and the backtester. The quote follows the tape's closes (one
+## cent either side), market orders and marketable limits fill at the quote, resting limits fill
+## against the prints of each tick that trade through them, best price then oldest first, and in
+## full once the quote moves through them. A print is shared out across the orders it trades
+## through, so it never fills more than its own quantity.
+##
+## Matchers own our resting orders in `open` and hand back fills as (order, quantity, price,
+## commission) with the order already updated. The caller books them on its account.
+class CrossingMatcher:
+
+    def __init__(self, tape):
+        self.tape = tape
+        self.open = {}
+        self.bids = np.round(tape.close - HALF_SPREAD, 2).tolist()
+        self.asks = np.round(tape.close + HALF_SPREAD, 2).tolist()
+
+    def quote(self, tick):
+        return self.bids[tick], self.asks[tick]
+
+    ## The market's side of /securities/book, as (price, size) best first. `sign` is 1 for bids.
+    def depth(self, tick, sign):
+        best = self.bids[tick] if sign > 0 else self.asks[tick]
+        return [(round(best - sign * i * 0.01, 2), LEVEL_SIZE) for i in range(BOOK_DEPTH)]
+
+    def submit(self, order, tick):
+        bid, ask = self.quote(tick)
+        touch = ask if order['action'] == "BUY" else bid
+        if order['type'] == "MARKET" or SIGN[order['action']] * (order['price'] - touch) >= 0:
+            quantity = order['quantity'] - order['quantity_filled']
+            fill(order, quantity, touch)
+            return [(order, quantity, touch, MKT_COM)]
+        self.open[order['order_id']] = order
+        return []
+
+    def cancel(self, order_id):
+        return self.open.pop(order_id, None)
+
+    def advance(self, tick):
+        ids, prices, quantities = self.tape.prints(tick)
+        left = quantities.copy()
+        bid, ask = self.quote(tick)
+
+        fills = []
+        resting = sorted(self.open.values(), key = lambda order: (-SIGN[order['action']] * order['price'], order['order_id']))
+        for order in resting:
+            sign = SIGN[order['action']]
+
+            ## Takes what is left of the prints through its price, in print order
+            remaining = order['quantity'] - order['quantity_filled']
+            through = np.where(sign * (order['price'] - prices) > 0, left, 0)
+            if through.any():
+                taken = np.minimum(through, np.maximum(remaining - (np.cumsum(through) - through), 0))
+                quantity = int(taken.sum())
+                left -= taken
+                fill(order, quantity, order['price'])
+                fills.append((order, quantity, order['price'], LMT_COM))
+
+            remaining = order['quantity'] - order['quantity_filled']
+            if remaining > 0 and ((sign > 0 and ask <= order['price']) or (sign < 0 and bid >= order['price'])):
+                fill(order, remaining, order['price'])
+                fills.append((order, remaining, order['price'], LMT_COM))
+
+            if order['status'] == "TRANSACTED":
+                del self.open[order['order_id']]
+        return fills
+
+###################################################################################################
+
+## Price-time priority book. The market's side is BOOK_DEPTH levels of LEVEL_SIZE either side of the
+## tape's quote, the shape /securities/book shows live, kept as one array of sizes per side indexed
+## by price in cents. Levels that come into the window are seeded, levels that leave it are cleared
+## and levels that stay keep whatever size is left on them, so a level that got traded into stays
+## thin until the quote moves away from it and back.
+##
+## Our orders queue at their level behind the market size that was there when they arrived (and
+## ahead of whatever is seeded later). Each tick's prints are replayed as aggressive orders: a print
+## above the last mid is a buyer lifting asks, below it a seller hitting bids, at it the side of the
+## print before. An aggressor takes the levels from the best down to the print price, each in time
+## order, until its quantity runs out, so a resting order only fills once the size ahead of it has
+## traded. Market orders and marketable limits walk the other side's levels the same way. After the
+## prints the market moves to the tick's quote and anything the quote moved through fills in full.
+##
+## Same interface as CrossingMatcher, so it drops into the backtester and the mock server as is.
+class QueueMatcher(CrossingMatcher):
+
+    MARGIN = 500
+
+    def __init__(self, tape, depth = BOOK_DEPTH, level_size = LEVEL_SIZE):
+        super().__init__(tape)
+        self.book_depth = depth
+        self.level_size = level_size
+
+        self.bid_cents = np.round(np.array(self.bids) * 100).astype(np.int64).tolist()
+        self.ask_cents = np.round(np.array(self.asks) * 100).astype(np.int64).tolist()
+        self.base = min(self.bid_cents) - depth - self.MARGIN
+        n = max(self.ask_cents) + depth + self.MARGIN - self.base
+        self.size = {1: np.zeros(n, dtype = np.int64), -1: np.zeros(n, dtype = np.int64)}
+        self.best = {1: None, -1: None}
+
+        ## Our orders per side and price in cents, in time order, and the market size ahead of each
+        self.levels = {1: {}, -1: {}}
+        self.where = {}
+        self.ahead = {}
+
+        ## Aggressor side of every print, 1 for buyers
+        tas_tick = tape.tas_tick
+        prices = tape.tas_price
+        mid = tape.close[np.maximum(tas_tick - 1, 0)]
+        side = np.sign(prices - mid)
+        side = np.where(side == 0, np.sign(np.diff(prices, prepend = prices[:1])), side)
+        last = np.maximum.accumulate(np.where(side != 0, np.arange(side.shape[0]), 0))
+        side = side[last] if side.shape[0] else side
+        self.aggressor = np.where(side == 0, 1, side).astype(np.int64)
+        self.print_cents = np.round(prices * 100).astype(np.int64)
+
+        self.reprice(0)
+
+    def window(self, sign, best):
+        if sign > 0:
+            return best - self.book_depth + 1 - self.base, best + 1 - self.base
+        return best - self.base, best + self.book_depth - self.base
+
+    def market(self, sign, cents):
+        i = cents - self.base
+        if 0 <= i < self.size[sign].shape[0]:
+            return int(self.size[sign][i])
+        return 0
+
+    ## Moves the market's levels to the quote of `tick`
+    def reprice(self, tick):
+        for sign, best in ((1, self.bid_cents[tick]), (-1, self.ask_cents[tick])):
+            if best == self.best[sign]:
+                continue
+            size = self.size[sign]
+            start, stop = self.window(sign, best)
+            if self.best[sign] is None:
+                size[start:stop] = self.level_size
+            else:
+                old_start, old_stop = self.window(sign, self.best[sign])
+                low, high = max(start, old_start), min(stop, old_stop)
+                kept = size[low:high].copy()
+                size[old_start:old_stop] = 0
+                size[start:stop] = self.level_size
+                if low < high:
+                    size[low:high] = kept
+            self.best[sign] = best
+
+        for order_id, (sign, cents) in self.where.items():
+            self.ahead[order_id] = min(self.ahead[order_id], self.market(sign, cents))
+
+    ## Takes up to `quantity` off one level, in time order. Returns our fills and what is left.
+    def consume(self, sign, cents, quantity, commission):
+        fills = []
+        orders = self.levels[sign].get(cents, [])
+        market = self.market(sign, cents)
+        used = 0
+        for order in orders:
+            take = min(max(self.ahead[order['order_id']] - used, 0), quantity)
+            used += take
+            quantity -= take
+            if quantity <= 0:
+                break
+            remaining = order['quantity'] - order['quantity_filled']
+            take = min(remaining, quantity)
+            quantity -= take
+            fill(order, take, order['price'])
+            fills.append((order, take, order['price'], commission))
+        if quantity > 0:
+            take = min(market - used, quantity)
+            used += take
+            quantity -= take
+
+        if used:
+            self.size[sign][cents - self.base] -= used
+            for order in orders:
+                self.ahead[order['order_id']] = max(self.ahead[order['order_id']] - used, 0)
+        for order in [order for order in orders if order['status'] == "TRANSACTED"]:
+            self.remove(order['order_id'])
+        return fills, quantity
+
+    ## Aggressive flow against the resting side `sign`, best price first down to `limit` cents
+    def walk(self, sign, quantity, limit):
+        best = self.best[sign]
+        ours = list(self.levels[sign])
+        top = max([best] + ours) if sign > 0 else min([best] + ours)
+
+        fills = []
+        cents = top
+        while quantity > 0 and sign * (cents - limit) >= 0:
+            level, quantity = self.consume(sign, cents, quantity, LMT_COM)
+            fills += level
+            cents -= sign
+        return fills
+
+    def add(self, order):
+        sign = SIGN[order['action']]
+        cents = int(round(order['price'] * 100))
+        self.open[order['order_id']] = order
+        self.levels[sign].setdefault(cents, []).append(order)
+        self.where[order['order_id']] = (sign, cents)
+        self.ahead[order['order_id']] = self.market(sign, cents)
+
+    def remove(self, order_id):
+        order = self.open.pop(order_id, None)
+        if order is None:
+            return None
+        sign, cents = self.where.pop(order_id)
+        del self.ahead[order_id]
+        level = self.levels[sign][cents]
+        level.remove(order)
+        if not level:
+            del self.levels[sign][cents]
+        return order
+
+    def depth(self, tick, sign):
+        start, stop = self.window(sign, self.best[sign])
+        cents = np.arange(start, stop) + self.base
+        size = self.size[sign][start:stop]
+        if sign > 0:
+            cents, size = cents[::-1], size[::-1]
+        return [(c / 100, s) for c, s in zip(cents.tolist(), size.tolist()) if s > 0]
+
+    ## Walks the other side of the book up to the limit price, whatever is left rests
+    def submit(self, order, tick):
+        sign = SIGN[order['action']]
+        market = order['type'] == "MARKET"
+        limit = None if market else int(round(order['price'] * 100))
+
+        fills = []
+        remaining = order['quantity'] - order['quantity_filled']
+        cents = self.best[-sign]
+        last = cents
+        while remaining > 0 and cents is not None and (market or sign * (limit - cents) >= 0):
+            take = min(self.market(-sign, cents), remaining)
+            if take > 0:
+                self.size[-sign][cents - self.base] -= take
+                remaining -= take
+                last = cents
+                fill(order, take, cents / 100)
+                fills.append((order, take, cents / 100, MKT_COM))
+            cents += sign
+            if market and abs(cents - self.best[-sign]) >= self.book_depth:
+                break
+
+        ## Anything a market order could not find in the book goes at the last level it reached
+        if remaining > 0 and market:
+            fill(order, remaining, last / 100)
+            fills.append((order, remaining, last / 100, MKT_COM))
+        elif remaining > 0:
+            self.add(order)
+        return fills
+
+    def cancel(self, order_id):
+        return self.remove(order_id)
+
+    def advance(self, tick):
+        ids, prices, quantities = self.tape.prints(tick)
+        start = self.tape.tas_end[tick - 1] if tick > 0 else 0
+
+        fills = []
+        for i in range(ids.shape[0]):
+            aggressor = self.aggressor[start + i]
+            fills += self.walk(-aggressor, int(quantities[i]), self.print_cents[start + i])
+
+        self.reprice(tick)
+
+        ## Resting orders the quote moved through
+        bid, ask = self.bid_cents[tick], self.ask_cents[tick]
+        for order_id, (sign, cents) in list(self.where.items()):
+            if (sign > 0 and cents >= ask) or (sign < 0 and cents <= bid):
+                order = self.open[order_id]
+                remaining = order['quantity'] - order['quantity_filled']
+                fill(order, remaining, order['price'])
+                fills.append((order, remaining, order['price'], LMT_COM))
+                self.remove(order_id)
+        return fills
+
+MATCHERS = {'cross': CrossingMatcher, 'queue': QueueMatcher}
@@ -0,0 +1,420 @@
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import urlsplit, parse_qs
+from time import monotonic
+from matching import Account, MATCHERS, SIGN, LEVEL_SIZE
+from tape import Tape
+import threading
+import json
+import sys
+
+###################################################################################################
+
+## python mock_server.py [<session> [<port> [<speed> [<matcher>]]]], e.g. `python mock_server.py
+## 10002 9999` replays data/ohlc_10002.csv and data/tas_10002.csv on localhost:9999 in real time. A
+## speed of N runs the clock N times faster. Under `virtual` a client that POSTs /v1/step moves it
+## on itself (runtime.py and skeleton.py with RIT_STEP=1, see Runtime's step mode). For any other
+## client every /v1/case poll after the first moves it on a tick, so a single loop like v4.py runs
+## unmodified as fast as it polls. The matcher is `cross` (fills on prints through our price, the
+## default) or `queue` (price-time priority behind the book's size), see matching.py.
+
+TICKER = "ALGO"
+TRADER_ID = "mock"
+TICK_PERIOD = 1
+
+class WallClock:
+
+    def __init__(self, period = TICK_PERIOD):
+        self.period = period
+        self.start = monotonic()
+
+    def tick(self):
+        return int((monotonic() - self.start) / self.period)
+
+    def step(self):
+        raise ApiError(400, "NOT_STEPPED", "The case runs on the wall clock")
+
+    def poll(self):
+        pass
+
+## Deterministic replay clock. The case only moves on a tick when the client says it is done with
+## the current one, however many requests that took and however long, so it runs as fast as the
+## client can consume it, and a client that decides the same way sees the same case every run.
+class VirtualClock:
+
+    def __init__(self):
+        self.ticks = 0
+        self.stepped = False
+        self.polled = False
+
+    def tick(self):
+        return self.ticks
+
+    def step(self):
+        self.stepped = True
+        self.ticks += 1
+
+    ## Clients that never step move it with their /v1/case polls instead. The first poll reports
+    ## tick 0 and every later one moves on a tick first, so whatever the client sent between two
+    ## polls (requests are handled one at a time) has been answered by the time its tick ends.
+    def poll(self):
+        if self.stepped:
+            return
+        if self.polled:
+            self.ticks += 1
+        self.polled = True
+
+class ApiError(Exception):
+
+    def __init__(self, status, code, message, **extra):
+        super().__init__(message)
+        self.status = status
+        self.body = {'code': code, 'message': message, **extra}
+
+## Tokens per second on order entry, answered with a 429 and the `wait` in ms like RIT does
+class OrderRate:
+
+    def __init__(self, rate):
+        self.rate = rate
+        self.tokens = rate
+        self.last = monotonic()
+
+    def take(self):
+        now = monotonic()
+        self.tokens = min(self.rate, self.tokens + (now - self.last) * self.rate)
+        self.last = now
+        if self.tokens < 1:
+            wait = (1 - self.tokens) / self.rate
+            raise ApiError(429, "TOO_MANY_REQUESTS", "Order rate exceeded", wait = round(wait * 1_000))
+        self.tokens -= 1
+
+###################################################################################################
+
+## Cancel command queries, e.g. "Volume > 0 AND Price >= 10.5". Volume is the open quantity signed
+## positive for bids and negative for asks, like the live server.
+OPERATORS = {
+    '>': lambda a, b: a > b,
+    '>=': lambda a, b: a >= b,
+    '<': lambda a, b: a < b,
+    '<=': lambda a, b: a <= b,
+    '=': lambda a, b: a == b,
+    '<>': lambda a, b: a != b,
+}
+
+def parse_query(query):
+    terms = []
+    for term in query.split(" AND "):
+        try:
+            field, op, value = term.split()
+            value = float(value)
+        except ValueError:
+            raise ApiError(400, "INVALID_QUERY", f"Cannot parse '{term}'")
+        if field not in ("Volume", "Price") or op not in OPERATORS:
+            raise ApiError(400, "INVALID_QUERY", f"Cannot parse '{term}'")
+        terms.append((field, OPERATORS[op], value))
+    return terms
+
+def matches(order, terms):
+    values = {
+        'Volume': SIGN[order['action']] * (order['quantity'] - order['quantity_filled']),
+        'Price': order['price'],
+    }
+    return all(op(values[field], value) for field, op, value in terms)
+
+###################################################################################################
+
+## The case, our book and our account. What fills is up to the matcher (matching.py), which also
+## holds our resting orders. Ticks are caught up on every request, so matching costs nothing while
+## nobody is asking.
+class Exchange:
+
+    def __init__(self, tape, clock = None, order_rate = None, matcher = None):
+        self.tape = tape
+        self.clock = clock or WallClock()
+        self.rate = OrderRate(order_rate) if order_rate else None
+        self.matcher = matcher or MATCHERS['cross'](tape)
+        self.account = Account()
+        self.lock = threading.Lock()
+        self.tick = 0
+        self.orders = {}
+        self.open = self.matcher.open
+        self.next_id = 1
+
+    ###############################################################################################
+    ## Case
+
+    def sync(self):
+        tick = min(self.clock.tick(), self.tape.last_tick)
+        while self.tick < tick:
+            self.tick += 1
+            self.match(self.tick)
+
+    def quote(self):
+        return self.matcher.quote(self.tick)
+
+    def book(self, fills):
+        for order, quantity, price, commission in fills:
+            self.account.trade(SIGN[order['action']] * quantity, price, commission)
+
+    def match(self, tick):
+        self.book(self.matcher.advance(tick))
+
+    ###############################################################################################
+    ## Endpoints
+
+    def case(self):
+        return {
+            'name': f"ALGO replay {self.tape.session}",
+            'period': 1,
+            'tick': self.tick,
+            'ticks_per_period': self.tape.last_tick + 1,
+            'total_periods': 1,
+            'status': "ACTIVE" if self.clock.tick() <= self.tape.last_tick else "STOPPED",
+            'is_enforce_trading_limits': False
+        }
+
+    def get_securities(self, params):
+        bid, ask = self.quote()
+        last = self.tape.close[self.tick]
+        account = self.account
+        return [{
+            'ticker': TICKER,
+            'type': "STOCK",
+            'position': account.position,
+            'vwap': round(account.vwap, 4),
+            'nlv': account.position * last,
+            'last': last,
+            'bid': bid,
+            'bid_size': LEVEL_SIZE,
+            'ask': ask,
+            'ask_size': LEVEL_SIZE,
+            'volume': account.volume,
+            'unrealized': round(account.unrealized(last), 2),
+            'realized': round(account.realized, 2),
+        }]
+
+    def level(self, action, price, size):
+        return {
+            'order_id': None,
+            'period': 1,
+            'tick': self.tick,
+            'trader_id': "market",
+            'ticker': TICKER,
+            'type': "LIMIT",
+            'quantity': size,
+            'action': action,
+            'price': price,
+            'quantity_filled': 0,
+            'vwap': None,
+            'status': "OPEN"
+        }
+
+    def get_book(self, params):
+        limit = int(params.get('limit', 20))
+        bids = [self.level("BUY", price, size) for price, size in self.matcher.depth(self.tick, 1)]
+        asks = [self.level("SELL", price, size) for price, size in self.matcher.depth(self.tick, -1)]
+        for order in self.open.values():
+            (bids if order['action'] == "BUY" else asks).append(order)
+        bids.sort(key = lambda order: -order['price'])
+        asks.sort(key = lambda order: order['price'])
+        return {'bids': bids[:limit], 'asks': asks[:limit]}
+
+    def get_history(self, params):
+        first = self.tape.first_tick
+        if self.tick < first:
+            return []
+        limit = int(params.get('limit', self.tick - first + 1))
+        start = max(first, self.tick - limit + 1)
+        return [
+            {'tick': int(row[0]), 'open': row[1], 'high': row[2], 'low': row[3], 'close': row[4]}
+            for row in self.tape.bars[start:self.tick + 1][::-1].tolist()
+        ]
+
+    def get_tas(self, params):
+        tape = self.tape
+        end = tape.tas_end[self.tick]
+        start = int(params.get('after', 0))
+        if 'limit' in params:
+            start = max(start, end - int(params['limit']))
+        return [
+            {'id': int(tape.tas_id[i]), 'period': 1, 'tick': int(tape.tas_tick[i]), 'price': tape.tas_price[i], 'quantity': tape.tas_quantity[i]}
+            for i in range(end - 1, min(start, end) - 1, -1)
+        ]
+
+    def get_case(self, params):
+        self.clock.poll()
+        self.sync()
+        return self.case()
+
+    ## Not in the RIT API, moves a virtual clock on one tick
+    def post_step(self, params):
+        self.clock.step()
+        self.sync()
+        return self.case()
+
+    def get_orders(self, params):
+        status = params.get('status', "OPEN")
+        return [order for order in self.orders.values() if order['status'] == status]
+
+    def get_order(self, order_id):
+        if order_id not in self.orders:
+            raise ApiError(404, "NOT_FOUND", f"Order {order_id} not found")
+        return self.orders[order_id]
+
+    def post_order(self, params):
+
+        try:
+            _type = params['type']
+            action = params['action']
+            quantity = int(float(params['quantity']))
+            price = float(params.get('price', 0) or 0)
+        except (KeyError, ValueError):
+            raise ApiError(400, "INVALID_ORDER", "ticker, type, quantity and action are required")
+        if params.get('ticker') != TICKER or _type not in ("LIMIT", "MARKET") or action not in SIGN or quantity <= 0:
+            raise ApiError(400, "INVALID_ORDER", "Invalid order")
+        if self.rate is not None:
+            self.rate.take()
+
+        order = {
+            'order_id': self.next_id,
+            'period': 1,
+            'tick': self.tick,
+            'trader_id': TRADER_ID,
+            'ticker': TICKER,
+            'type': _type,
+            'quantity': quantity,
+            'action': action,
+            'price': price if _type == "LIMIT" else None,
+            'quantity_filled': 0,
+            'vwap': None,
+            'status': "OPEN"
+        }
+        self.next_id += 1
+        self.orders[order['order_id']] = order
+        self.book(self.matcher.submit(order, self.tick))
+        return order
+
+    def cancel(self, order_id):
+        order = self.matcher.cancel(order_id)
+        if order is None:
+            return False
+        order['status'] = "CANCELLED"
+        return True
+
+    def delete_order(self, order_id):
+        if not self.cancel(order_id):
+            raise ApiError(404, "NOT_FOUND", f"Order {order_id} is not open")
+        return {'success': True}
+
+    def post_cancel(self, params):
+        if 'all' in params or 'ticker' in params:
+            ids = list(self.open)
+        elif 'ids' in params:
+            ids = [int(order_id) for order_id in params['ids'].split(",") if order_id]
+        elif 'query' in params:
+            terms = parse_query(params['query'])
+            ids = [order_id for order_id, order in self.open.items() if matches(order, terms)]
+        else:
+            raise ApiError(400, "INVALID_CANCEL", "One of all, ticker, ids or query is required")
+        return {'cancelled_order_ids': [order_id for order_id in ids if self.cancel(order_id)]}
+
+    def handle(self, method, path, params):
+        routes = {
+            ("GET", "/v1/case"): self.get_case,
+            ("GET", "/v1/securities"): self.get_securities,
+            ("GET", "/v1/securities/book"): self.get_book,
+            ("GET", "/v1/securities/history"): self.get_history,
+            ("GET", "/v1/securities/tas"): self.get_tas,
+            ("GET", "/v1/orders"): self.get_orders,
+            ("POST", "/v1/orders"): self.post_order,
+            ("POST", "/v1/commands/cancel"): self.post_cancel,
+            ("POST", "/v1/step"): self.post_step,
+        }
+        with self.lock:
+            self.sync()
+            try:
+                if (method, path) in routes:
+                    return 200, routes[method, path](params)
+                if path.startswith("/v1/orders/"):
+                    try:
+                        order_id = int(path[len("/v1/orders/"):])
+                    except ValueError:
+                        raise ApiError(404, "NOT_FOUND", f"{method} {path}")
+                    if method == "GET":
+                        return 200, self.get_order(order_id)
+                    if method == "DELETE":
+                        return 200, self.delete_order(order_id)
+                raise ApiError(404, "NOT_FOUND", f"{method} {path}")
+            except ApiError as e:
+                return e.status, e.body
+            ## Anything else unparseable in the parameters, e.g. limit=x or ids=abc
+            except (ValueError, KeyError) as e:
+                return 400, {'code': "INVALID_REQUEST", 'message': f"{method} {path}: {e}"}
+
+###################################################################################################
+
+class Handler(BaseHTTPRequestHandler):
+
+    protocol_version = "HTTP/1.1"
+    disable_nagle_algorithm = True
+
+    def log_message(self, format, *args):
+        pass
+
+    def route(self, method):
+        length = int(self.headers.get('Content-Length') or 0)
+        if length:
+            self.rfile.read(length)
+
+        url = urlsplit(self.path)
+        params = {key: values[-1] for key, values in parse_qs(url.query).items()}
+        status, body = self.server.exchange.handle(method, url.path, params)
+
+        payload = json.dumps(body).encode()
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(payload)))
+        if status == 429:
+            self.send_header("Retry-After", str(body['wait'] / 1_000))
+        self.end_headers()
+        self.wfile.write(payload)
+
+    def do_GET(self):
+        self.route("GET")
+
+    def do_POST(self):
+        self.route("POST")
+
+    def do_DELETE(self):
+        self.route("DELETE")
+
+## One thread per connection, so keep-alive sessions each get their own and the exchange lock is
+## the only thing they share
+class MockServer(ThreadingHTTPServer):
+
+    daemon_threads = True
+    request_queue_size = 128
+
+    def __init__(self, address, exchange):
+        super().__init__(address, Handler)
+        self.exchange = exchange
+
+def main():
+
+    session = sys.argv[1] if len(sys.argv) > 1 else "10002"
+    port = int(sys.argv[2]) if len(sys.argv) > 2 else 9999
+    speed = sys.argv[3] if len(sys.argv) > 3 else "1"
+    matcher = sys.argv[4] if len(sys.argv) > 4 else "cross"
+
+    tape = Tape.load(session)
+    clock = VirtualClock() if speed == "virtual" else WallClock(TICK_PERIOD / float(speed))
+    server = MockServer(("localhost", port), Exchange(tape, clock, matcher = MATCHERS[matcher](tape)))
+    print(f"Replaying {session} on localhost:{port} at speed {speed} with the {matcher} matcher")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    server.server_close()
+
+if __name__ == '__main__':
+
+    main()
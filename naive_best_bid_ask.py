@@ -1,3 +1,6 @@
+from order_book import BookTracker
+from rate_limiter import RateLimiter
+from cancel_service import CancelService
 from config import API_KEY
 from pathlib import Path
 from time import sleep
@@ -28,12 +31,10 @@ data = {
 	'bid_vwap': 0,
 	'ask_vwap': 0,
 	'vol': 0,
-	'bid_ladder': pd.DataFrame(),
 	'best_bid': 0,
 	'best_ask': 0,
 	'best_spread': 0,
 	'mid': 0,
-	'ask_ladder': pd.DataFrame(),
 	'ohlc': pd.DataFrame(),
 	"orders": [],
 	"bid_order_id": None,
@@ -65,38 +66,21 @@ def get_security_info(session, data):
 		return data
 	return ApiException("Auth Error. Check API Key")
 
-OBKEYS = ['price', 'quantity', 'quantity_filled']
-def aggregate_order_book(items, ascending):
-	df = pd.DataFrame(
-		[
-			{
-				key: bid[key]
-				for key in OBKEYS
-			}
-			for bid in items
-			if bid['status'] == "OPEN"
-		],
-		columns = OBKEYS
-	)
-	df['quantity'] = df.quantity - df.quantity_filled
-	df = df[df.quantity != 0].drop('quantity_filled', axis=1)
-	df = df.groupby('price').sum().sort_index(ascending = ascending).reset_index()
-	vwap = (df.price * (df.quantity / df.quantity.sum())).sum()
-	return df, vwap
-
+book = BookTracker()
 def get_order_book(session, data):
 	resp = session.get(f"http://localhost:9999/v1/securities/book?ticker=ALGO&limit={BOOK_LIMIT}")
 	if resp.ok:
-		resp = resp.json()
-		data['bid_ladder'], data['bid_vwap'] = aggregate_order_book(resp['bids'], False)
-		data['ask_ladder'], data['ask_vwap'] = aggregate_order_book(resp['asks'], False)
-		if data['bid_ladder'].shape[0] == 0 or data['ask_ladder'].shape[0] == 0:
+		book.update(resp.json())
+		data['bid_vwap'], data['ask_vwap'] = book.bid_vwap, book.ask_vwap
+		if book.empty:
 			return data
-		data['best_bid'] = data['bid_ladder'].price.values[0]
-		data['best_ask'] = data['ask_ladder'].price.values[-1]
+		data['best_bid'] = book.best_bid
+		data['best_ask'] = book.best_ask
 		data['mid'] = round((data['best_bid'] + data['best_ask']) / 2, 3)
 		data['best_spread'] = round(data['best_ask'] - data['best_bid'], 2)
 		return data
+	## Nothing new seen, so nothing to requote on
+	book.top_changed = False
 	return ApiException("Auth Error. Check API Key")
 
 HISTCOLS = ['tick', 'open', 'high', 'low', 'close']
@@ -128,7 +112,9 @@ def get_full_time_and_sales(session):
 		dfa.to_csv(DIR / "data/tasagg.csv", index=False)
 	return ApiException("Auth Error. Check API Key")
 
-## Subject to rate limits
+limiter = RateLimiter(API_KEY)
+
+## Subject to rate limits. Paced by the shared limiter, which retries on 429 (`wait` is in ms)
 def send_order(session, data, _type, quantity, action, price = 0):
 	params = {
 		'ticker': 'ALGO',
@@ -138,24 +124,25 @@ def send_order(session, data, _type, quantity, action, price = 0):
 		'action': action,
 	}
 	if _type == "MARKET": body['dry_run'] = 0
-	resp = session.post("http://localhost:9999/v1/orders", params = params)
-	if resp.status_code == 429:
-		sleep(resp.json()['wait'])
-		resp = session.post("http://localhost:9999/v1/orders", params = params)
+	resp = limiter.call("POST", "http://localhost:9999/v1/orders", params = params)
 	if resp.ok:
 		data['orders'].append(resp.json()['order_id'])
 	return ApiException("Auth Error. Check API Key")
 
+cancels = CancelService(limiter)
+
+## Ids the server did not cancel are no longer open, only a failed request leaves orders to retry
 def cancel_all_orders(session, data):
 	if len(data['orders']) == 0: return
-	resp = session.post(f"http://localhost:9999/v1/commands/cancel?ids={','.join(map(str, data['orders']))}")
-	if resp.ok:
-		cancelled_orders = resp.json()['cancelled_order_ids']
-		data['orders'] = [
-			oid
-			for oid in data['orders']
-			if oid not in data['orders']
-		]
+	for oid in data['orders']:
+		cancels.cancel(oid)
+	cancels.flush(session)
+	data['orders'] = [
+		oid
+		for oid in data['orders']
+		if oid in cancels.failed
+	]
+	if cancels.ok:
 		return data
 	return ApiException("Auth Error. Check API Key")
 
@@ -163,8 +150,6 @@ def cancel_all_orders(session, data):
 
 def main():
 
-	best_bid, best_ask = 0, 0
-
 	with requests.Session() as session:
 		session.headers.update(API_KEY)
 
@@ -176,13 +161,12 @@ def main():
 			get_order_book(session, data)
 			# get_price_history(session, data)
 
-			if data['best_bid'] != best_bid or data['best_ask'] != best_ask:
+			## Only requote when the level diff moved the top of the book
+			if book.top_changed and not book.empty:
 
 				cancel_all_orders(session, data)
 				send_order(session, data, "LIMIT", MAX_VOLUME, "BUY", data['best_bid'])
 				send_order(session, data, "LIMIT", MAX_VOLUME, "SELL", data['best_ask'])
-				best_bid = data['best_bid']
-				best_ask = data['best_ask']
 
 			# if data['tick'] != tick:
 
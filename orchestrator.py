@@ -0,0 +1,199 @@
+from datetime import datetime
+from pathlib import Path
+from queue import Empty
+from time import monotonic, sleep
+import multiprocessing as mp
+import signal
+import sys, os
+
+###################################################################################################
+
+## python orchestrator.py <version> <port> [<port> ...], ports can be ranges, e.g.
+##
+##     python orchestrator.py v4 10001-10004 10008
+##
+## Per worker API keys come from API_KEYS = {port: headers} in config.py, any port not in there
+## uses API_KEY.
+
+DIR = Path(os.path.dirname(os.path.realpath(__file__)))
+
+REFRESH = 1
+MAX_RESTARTS = 3
+JOIN_TIMEOUT = 10
+
+shutdown = False
+
+def signal_handler(signum, frame):
+    global shutdown
+    signal.signal(signal.SIGINT, signal.SIG_DFL)
+    shutdown = True
+
+def parse_ports(args):
+    ports = []
+    for arg in args:
+        if "-" in arg:
+            low, high = arg.split("-")
+            ports.extend(range(int(low), int(high) + 1))
+        else:
+            ports.append(int(arg))
+    return ports
+
+def get_keys(ports):
+    import config
+    keys = getattr(config, 'API_KEYS', {})
+    return {port: keys.get(port, config.API_KEY) for port in ports}
+
+def get_cores():
+    if hasattr(os, "sched_getaffinity"):
+        return sorted(os.sched_getaffinity(0))
+    return list(range(os.cpu_count() or 1))
+
+###################################################################################################
+
+## Runs in its own process. The environment is set before the runtime is imported, so every module
+## in the worker builds its urls and its log file for this port. The strategy's prints and any
+## traceback go to a per port file, the supervisor gets (port, tick, position, realized,
+## unrealized) once per tick.
+def worker(port, name, headers, core, reports):
+
+    os.environ["RIT_URL"] = f"http://localhost:{port}/v1"
+    os.environ["RIT_LOG_PREFIX"] = f"{port}_"
+    if core is not None and hasattr(os, "sched_setaffinity"):
+        os.sched_setaffinity(0, {core})
+    sys.stdout = sys.stderr = open(DIR / "logs" / f"{port}_stdout.log", "a", buffering = 1)
+
+    from runtime import Runtime, init_log
+    from policies import POLICIES
+
+    runtime = Runtime(POLICIES[name](), headers)
+
+    last = {'tick': None}
+    def report(data):
+        if data['tick'] != last['tick']:
+            last['tick'] = data['tick']
+            reports.put((port, data['tick'], data['position'], data['realized_profit'], data['unrealized_profit']))
+    runtime.subscribe(report)
+
+    def stop(signum, frame):
+        runtime.shutdown = True
+    signal.signal(signal.SIGINT, stop)
+    signal.signal(signal.SIGTERM, stop)
+
+    init_log()
+    runtime.run()
+
+###################################################################################################
+
+## Launches one worker per port, each pinned to its own core (round robin when there are more ports
+## than cores), restarts the ones that crash and keeps one table of every worker's tick, position
+## and PnL. Workers are spawned, not forked, so none of them inherits the supervisor's state.
+class Supervisor:
+
+    def __init__(self, name, ports, keys, max_restarts = MAX_RESTARTS):
+        self.name = name
+        self.ports = ports
+        self.keys = keys
+        self.max_restarts = max_restarts
+        self.context = mp.get_context("spawn")
+        self.reports = self.context.Queue()
+        self.cores = get_cores()
+        self.processes = {}
+        self.restarts = {port: 0 for port in ports}
+        self.status = {port: {'tick': 0, 'position': 0, 'realized': 0, 'unrealized': 0} for port in ports}
+
+    def start_worker(self, port):
+        core = self.cores[self.ports.index(port) % len(self.cores)]
+        process = self.context.Process(
+            target = worker,
+            args = (port, self.name, self.keys[port], core, self.reports),
+            name = f"{self.name}_{port}",
+            daemon = True
+        )
+        process.start()
+        self.processes[port] = process
+
+    def collect(self):
+        while True:
+            try:
+                port, tick, position, realized, unrealized = self.reports.get_nowait()
+            except Empty:
+                return
+            self.status[port].update(tick = tick, position = position, realized = realized, unrealized = unrealized)
+
+    ## A worker that exits with an error before the case is over gets started again
+    def check(self):
+        for port, process in self.processes.items():
+            if process.is_alive() or process.exitcode == 0 or shutdown:
+                continue
+            if self.restarts[port] < self.max_restarts and self.status[port]['tick'] < 299:
+                self.restarts[port] += 1
+                print(f"Worker {port} exited with {process.exitcode}, restart {self.restarts[port]}")
+                self.start_worker(port)
+
+    def state(self, port):
+        process = self.processes[port]
+        if process.is_alive():
+            return "running"
+        if process.exitcode == 0:
+            return "done"
+        return f"failed ({process.exitcode})"
+
+    def view(self):
+        lines = [f"{'port':>6} {'tick':>5} {'position':>9} {'realized':>11} {'unrealized':>11} {'pnl':>11}  state"]
+        total = 0
+        for port in self.ports:
+            s = self.status[port]
+            pnl = s['realized'] + s['unrealized']
+            total += pnl
+            lines.append(f"{port:>6} {s['tick']:>5} {s['position']:>9} {s['realized']:>11.2f} {s['unrealized']:>11.2f} {pnl:>11.2f}  {self.state(port)}")
+        lines.append(f"{'total':>6} {'':>5} {'':>9} {'':>11} {'':>11} {total:>11.2f}")
+        return "\n".join(lines)
+
+    def summary(self):
+        stamp = datetime.now().isoformat()[:-10].replace(":", "_").replace("-", "_")
+        with open(DIR / "logs" / f"{stamp}_supervisor.log", "w") as file:
+            file.write("port,tick,position,realized,unrealized,pnl,restarts\n")
+            for port in self.ports:
+                s = self.status[port]
+                file.write(f"{port},{s['tick']},{s['position']},{s['realized']},{s['unrealized']},{s['realized'] + s['unrealized']},{self.restarts[port]}\n")
+
+    def stop(self):
+        for process in self.processes.values():
+            if process.is_alive():
+                os.kill(process.pid, signal.SIGINT)
+        for process in self.processes.values():
+            process.join(JOIN_TIMEOUT)
+            if process.is_alive():
+                process.terminate()
+
+    def run(self):
+
+        for port in self.ports:
+            self.start_worker(port)
+
+        last_view = 0
+        while True:
+            self.collect()
+            self.check()
+            if shutdown or not any(process.is_alive() for process in self.processes.values()):
+                break
+            if monotonic() - last_view >= REFRESH:
+                print(self.view(), end = "\n\n", flush = True)
+                last_view = monotonic()
+            sleep(0.1)
+
+        self.stop()
+        self.collect()
+        print(self.view())
+        self.summary()
+
+def main():
+
+    name, ports = sys.argv[1], parse_ports(sys.argv[2:])
+    supervisor = Supervisor(name, ports, get_keys(ports))
+    signal.signal(signal.SIGINT, signal_handler)
+    supervisor.run()
+
+if __name__ == '__main__':
+
+    main()
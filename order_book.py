@@ -0,0 +1,171 @@
+import numpy as np
+
+###################################################################################################
+
+BOOK_CAPACITY = 1_000
+MAX_PRICE_SPAN = 100_000
+
+## Order book engine without pandas. `bids` / `asks` are parsed straight into preallocated price and
+## quantity arrays, then aggregated per integer price in cents with a bincount. Both ladders are
+## stored best level first.
+class OrderBook:
+
+    def __init__(self, capacity = BOOK_CAPACITY):
+        self.capacity = capacity
+        self.raw_prices = np.zeros(capacity)
+        self.raw_quantities = np.zeros(capacity)
+        self.bid_prices, self.bid_quantities = np.zeros(0), np.zeros(0)
+        self.ask_prices, self.ask_quantities = np.zeros(0), np.zeros(0)
+        self.bid_volume, self.ask_volume = 0, 0
+        self.bid_vwap, self.ask_vwap = 0, 0
+
+    def grow(self):
+        self.capacity *= 2
+        self.raw_prices = np.resize(self.raw_prices, self.capacity)
+        self.raw_quantities = np.resize(self.raw_quantities, self.capacity)
+
+    ## Element-wise writes into numpy arrays are slow from Python, so collect the open orders in one
+    ## pass and copy them into the buffers with a single slice assignment per column
+    def parse(self, items):
+        rows = [
+            (item['price'], item['quantity'] - item['quantity_filled'])
+            for item in items
+            if item['status'] == "OPEN"
+        ]
+        n = len(rows)
+        while n > self.capacity:
+            self.grow()
+        if n != 0:
+            self.raw_prices[:n], self.raw_quantities[:n] = zip(*rows)
+        return n
+
+    ## Returns the levels as ascending integer cents and their total quantity
+    def aggregate(self, items):
+
+        n = self.parse(items)
+        if n == 0:
+            return np.zeros(0, dtype = np.int64), np.zeros(0)
+
+        cents = np.rint(self.raw_prices[:n] * 100).astype(np.int64)
+        quantities = self.raw_quantities[:n]
+
+        ## Books are a few dozen cents wide, so a dense bincount over the span is the cheap path
+        low = cents.min()
+        span = cents.max() - low + 1
+        if span <= MAX_PRICE_SPAN:
+            totals = np.bincount(cents - low, weights = quantities, minlength = span)
+            levels = np.flatnonzero(totals)
+            return levels + low, totals[levels]
+
+        levels, inverse = np.unique(cents, return_inverse = True)
+        totals = np.bincount(inverse, weights = quantities)
+        keep = np.flatnonzero(totals)
+        return levels[keep], totals[keep]
+
+    def update(self, book):
+        bid_cents, bid_quantities = self.aggregate(book['bids'])
+        ask_cents, ask_quantities = self.aggregate(book['asks'])
+        self.bid_prices, self.bid_quantities = bid_cents[::-1] / 100, bid_quantities[::-1]
+        self.ask_prices, self.ask_quantities = ask_cents / 100, ask_quantities
+        self.bid_volume = self.bid_quantities.sum()
+        self.ask_volume = self.ask_quantities.sum()
+        self.bid_vwap = (self.bid_prices * self.bid_quantities).sum() / self.bid_volume if self.bid_volume else 0
+        self.ask_vwap = (self.ask_prices * self.ask_quantities).sum() / self.ask_volume if self.ask_volume else 0
+        return self
+
+    @property
+    def empty(self):
+        return self.bid_prices.shape[0] == 0 or self.ask_prices.shape[0] == 0
+
+    @property
+    def best_bid(self):
+        return self.bid_prices[0]
+
+    @property
+    def best_ask(self):
+        return self.ask_prices[0]
+
+    @property
+    def mid(self):
+        return (self.best_bid + self.best_ask) / 2
+
+    def imbalance(self):
+        return (self.bid_volume - self.ask_volume) / (self.bid_volume + self.ask_volume)
+
+    def mass_imbalance(self, mid = None):
+        mid = self.mid if mid is None else mid
+        bid_vwap_spread = mid - self.bid_vwap
+        ask_vwap_spread = self.ask_vwap - mid
+        return (ask_vwap_spread - bid_vwap_spread) / (bid_vwap_spread + ask_vwap_spread)
+
+###################################################################################################
+
+ADD = "ADD"
+REMOVE = "REMOVE"
+RESIZE = "RESIZE"
+
+## Persistent book model. Every snapshot is diffed against the previous one per price level and
+## turned into (event, action, price, quantity) tuples, where quantity is the new level size. Side
+## volume and notional are moved by the level deltas only, so unchanged levels cost nothing beyond
+## the aggregation itself.
+class BookTracker(OrderBook):
+
+    def __init__(self, capacity = BOOK_CAPACITY):
+        super().__init__(capacity)
+        self.cents = {"BUY": np.zeros(0, dtype = np.int64), "SELL": np.zeros(0, dtype = np.int64)}
+        self.quantities = {"BUY": np.zeros(0), "SELL": np.zeros(0)}
+        self.volume = {"BUY": 0, "SELL": 0}
+        self.notional = {"BUY": 0, "SELL": 0}
+        self.events = []
+        self.top_changed = False
+
+    def diff(self, action, cents, quantities):
+
+        old_cents, old_quantities = self.cents[action], self.quantities[action]
+        _, old_idx, new_idx = np.intersect1d(old_cents, cents, assume_unique = True, return_indices = True)
+
+        added = np.ones(cents.shape[0], dtype = bool)
+        added[new_idx] = False
+        removed = np.ones(old_cents.shape[0], dtype = bool)
+        removed[old_idx] = False
+        delta = quantities[new_idx] - old_quantities[old_idx]
+        resized = delta != 0
+
+        self.volume[action] += quantities[added].sum() - old_quantities[removed].sum() + delta.sum()
+        self.notional[action] += (
+            (cents[added] * quantities[added]).sum()
+            - (old_cents[removed] * old_quantities[removed]).sum()
+            + (cents[new_idx] * delta).sum()
+        )
+
+        for price, quantity in zip(cents[added].tolist(), quantities[added].tolist()):
+            self.events.append((ADD, action, price / 100, quantity))
+        for price in old_cents[removed].tolist():
+            self.events.append((REMOVE, action, price / 100, 0))
+        for price, quantity in zip(cents[new_idx][resized].tolist(), quantities[new_idx][resized].tolist()):
+            self.events.append((RESIZE, action, price / 100, quantity))
+
+        self.cents[action], self.quantities[action] = cents, quantities
+
+    def top(self):
+        if self.empty:
+            return None
+        return self.best_bid, self.best_ask
+
+    def update(self, book):
+
+        top = self.top()
+        self.events = []
+        self.diff("BUY", *self.aggregate(book['bids']))
+        self.diff("SELL", *self.aggregate(book['asks']))
+        if len(self.events) == 0:
+            self.top_changed = False
+            return self
+
+        self.bid_prices, self.bid_quantities = self.cents["BUY"][::-1] / 100, self.quantities["BUY"][::-1]
+        self.ask_prices, self.ask_quantities = self.cents["SELL"] / 100, self.quantities["SELL"]
+        self.bid_volume, self.ask_volume = self.volume["BUY"], self.volume["SELL"]
+        self.bid_vwap = self.notional["BUY"] / self.bid_volume / 100 if self.bid_volume else 0
+        self.ask_vwap = self.notional["SELL"] / self.ask_volume / 100 if self.ask_volume else 0
+        self.top_changed = self.top() != top
+        return self
@@ -0,0 +1,73 @@
+from concurrent.futures import ThreadPoolExecutor
+from rate_limiter import RISK
+from api import BASE_URL
+import threading
+import requests
+
+###################################################################################################
+
+POOL_SIZE = 4
+
+## Pipelined order submission. A batch is posted concurrently over a small pool of workers, each
+## on its own keep-alive session, so a ladder reaches the book in about one round trip instead of
+## one per order. Every post still takes a token from the shared rate limiter and is retried by it
+## on 429. Batches and RISK submissions skip the limiter's queue, which is what the urgent paths
+## (liquidations, stop-losses) want, anything less urgent or with a `ttl` waits its turn in it.
+class OrderGateway:
+
+    def __init__(self, headers, limiter, pool_size = POOL_SIZE):
+        self.headers = headers
+        self.limiter = limiter
+        self.executor = ThreadPoolExecutor(max_workers = pool_size)
+        self.local = threading.local()
+        self.sessions = []
+        self.lock = threading.Lock()
+
+    def get_session(self):
+        session = getattr(self.local, 'session', None)
+        if session is None:
+            session = requests.Session()
+            session.headers.update(self.headers)
+            self.local.session = session
+            with self.lock:
+                self.sessions.append(session)
+        return session
+
+    def post(self, order):
+        if order['type'] == "MARKET": order['dry_run'] = 0
+        return self.limiter.request(self.get_session(), "POST", f"{BASE_URL}/orders", order)
+
+    ## Same shape as the strategies' queue_order so it can be handed to the reconciler
+    def submit(self, session, order, priority = RISK, ttl = None):
+        if priority != RISK or ttl is not None:
+            if order['type'] == "MARKET": order['dry_run'] = 0
+            return self.limiter.submit("POST", f"{BASE_URL}/orders", params = order, priority = priority, ttl = ttl)
+        return self.executor.submit(self.post, order)
+
+    ## Order ids in the order the batch was given, None where a submission failed
+    def send(self, orders):
+        futures = [self.executor.submit(self.post, order) for order in orders]
+        ids = []
+        for order, future in zip(orders, futures):
+            try:
+                resp = future.result()
+                if not resp.ok:
+                    print("Order rejected", order['action'], order['quantity'], resp.status_code, resp.text)
+                    ids.append(None)
+                    continue
+                ids.append(resp.json()['order_id'])
+            except (requests.RequestException, ValueError, KeyError) as e:
+                print("Order failed", order['action'], order['quantity'], e)
+                ids.append(None)
+        return ids
+
+    def close(self):
+        self.executor.shutdown(wait = True)
+        for session in self.sessions:
+            session.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
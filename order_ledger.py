@@ -0,0 +1,184 @@
+from api import BASE_URL
+
+###################################################################################################
+
+RECONCILE_INTERVAL = 10
+SIGN = {"BUY": 1, "SELL": -1}
+
+## In-process record of our orders, so the strategy never has to pull the full open or transacted
+## lists. Every order we send is recorded with its id, price, size and tick. Fills are inferred
+## from the position moving: the change not explained by our own market orders is handed to the
+## resting orders on that side best price first, then oldest first, skipping prices the tape did
+## not trade through. Every `reconcile_interval` ticks, or as soon as a position change cannot be
+## placed, the open list is fetched and the ledger is corrected from it. An order that dropped off
+## the open list is looked up on its own, it may as well have been cancelled as filled.
+##
+## Open orders are kept per side in dicts keyed by id, with the open quantity per side alongside,
+## so exposure, fills since the last tick, membership and order age are all O(1) reads.
+class OrderLedger:
+
+    def __init__(self, reconcile_interval = RECONCILE_INTERVAL):
+        self.reconcile_interval = reconcile_interval
+        self.reset()
+
+    def reset(self):
+        self.orders = {}
+        self.open = {"BUY": {}, "SELL": {}}
+        self.exposure = {"BUY": 0, "SELL": 0}
+        self.fills = []
+        self.filled = {"BUY": 0, "SELL": 0}
+        self.pending = []
+        self.position = None
+        self.expected = 0
+        self.tick = -1
+        self.last_reconcile = -1
+        self.stale = False
+        self.n_transacted = 0
+
+    ###############################################################################################
+    ## Recording
+
+    def record(self, order, order_id, tick):
+        if not isinstance(order_id, int):
+            return
+        if order['type'] == "MARKET":
+            self.expected += SIGN[order['action']] * order['quantity']
+            return
+        entry = {
+            'order_id': order_id,
+            'action': order['action'],
+            'price': order['price'],
+            'quantity': order['quantity'],
+            'quantity_filled': 0,
+            'tick': tick
+        }
+        self.orders[order_id] = entry
+        self.open[order['action']][order_id] = entry
+        self.exposure[order['action']] += order['quantity']
+
+    ## For orders queued on the rate limiter, recorded once the response is in
+    def track(self, order, future, tick):
+        self.pending.append((order, future, tick))
+
+    def resolve(self):
+        pending, self.pending = self.pending, []
+        for order, future, tick in pending:
+            if not future.done():
+                self.pending.append((order, future, tick))
+            elif not future.cancelled() and future.exception() is None and future.result().ok:
+                self.record(order, future.result().json()['order_id'], tick)
+
+    def close(self, order_id):
+        entry = self.orders.pop(order_id, None)
+        if entry is None:
+            return None
+        del self.open[entry['action']][order_id]
+        self.exposure[entry['action']] -= entry['quantity'] - entry['quantity_filled']
+        return entry
+
+    ## Confirmed cancels, e.g. subscribed to a CancelService
+    def cancelled(self, order_ids):
+        for order_id in order_ids:
+            self.close(order_id)
+
+    def fill(self, entry, quantity):
+        entry['quantity_filled'] += quantity
+        self.exposure[entry['action']] -= quantity
+        self.filled[entry['action']] += quantity
+        self.fills.append((entry['order_id'], entry['action'], entry['price'], quantity))
+        if entry['quantity_filled'] >= entry['quantity']:
+            self.close(entry['order_id'])
+            self.n_transacted += 1
+
+    ###############################################################################################
+    ## Deltas
+
+    def new_tick(self, tick):
+        if tick != self.tick:
+            self.tick = tick
+            self.fills = []
+            self.filled = {"BUY": 0, "SELL": 0}
+
+    def on_position(self, position, low = None, high = None):
+
+        if self.position is None:
+            self.position = position
+            return
+        delta = position - self.position - self.expected
+        self.position = position
+        self.expected = 0
+        if delta == 0:
+            return
+
+        action = "BUY" if delta > 0 else "SELL"
+        if action == "BUY":
+            candidates = [entry for entry in self.open[action].values() if low is None or entry['price'] >= low]
+            candidates.sort(key = lambda entry: (-entry['price'], entry['order_id']))
+        else:
+            candidates = [entry for entry in self.open[action].values() if high is None or entry['price'] <= high]
+            candidates.sort(key = lambda entry: (entry['price'], entry['order_id']))
+
+        quantity = abs(delta)
+        for entry in candidates:
+            if quantity == 0:
+                break
+            size = min(quantity, entry['quantity'] - entry['quantity_filled'])
+            self.fill(entry, size)
+            quantity -= size
+
+        ## Something we do not know about moved the position, the open list will tell
+        if quantity != 0:
+            self.stale = True
+
+    ## `lookup(order_id)` answers with the order as the server has it, or None. Without an answer a
+    ## missing order is closed with only the fills the position already accounted for.
+    def reconcile(self, open_orders, tick, lookup = None):
+
+        server = {order['order_id']: order for order in open_orders}
+        for order_id in list(self.orders):
+            entry = self.orders[order_id]
+            order = server.get(order_id) or (lookup and lookup(order_id))
+            if order and order['quantity_filled'] > entry['quantity_filled']:
+                self.fill(entry, order['quantity_filled'] - entry['quantity_filled'])
+            if order_id not in server and (not order or order['status'] != "OPEN"):
+                self.close(order_id)
+
+        for order_id, order in server.items():
+            if order_id not in self.orders:
+                self.record(order, order_id, tick)
+                self.orders[order_id]['quantity_filled'] = order['quantity_filled']
+                self.exposure[order['action']] -= order['quantity_filled']
+
+        self.last_reconcile = tick
+        self.stale = False
+
+    def get_open_orders(self, session):
+        return session.get(f"{BASE_URL}/orders?status=OPEN")
+
+    def get_order(self, session, order_id):
+        resp = session.get(f"{BASE_URL}/orders/{order_id}")
+        return resp.json() if resp.ok else None
+
+    ## One call per loop pass with the fresh security info, `low` / `high` bound the prints since
+    ## the last pass when a TAS feed is at hand
+    def update(self, session, data, low = None, high = None):
+
+        if data['tick'] < self.tick:
+            self.reset()
+        self.new_tick(data['tick'])
+        self.resolve()
+        self.on_position(data['position'], low, high)
+
+        if self.stale or data['tick'] - self.last_reconcile >= self.reconcile_interval:
+            resp = self.get_open_orders(session)
+            if resp.ok:
+                self.reconcile(resp.json(), data['tick'], lambda order_id: self.get_order(session, order_id))
+
+    ###############################################################################################
+    ## Queries
+
+    def is_open(self, order_id):
+        return order_id in self.orders
+
+    def age(self, order_id, tick):
+        return tick - self.orders[order_id]['tick']
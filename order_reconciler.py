@@ -0,0 +1,100 @@
+from concurrent.futures import Future, wait
+from cancel_service import CancelService
+from rate_limiter import CANCEL, QUOTE
+from api import BASE_URL
+
+###################################################################################################
+
+## Resting orders are matched on ticker, side, type and price in cents
+def order_key(order):
+    return (order['ticker'], order['action'], order['type'], int(round(order['price'] * 100)))
+
+## Replaces cancel-all-and-resend. The desired quote set is compared per price level with what is
+## already resting, oldest order first, so quotes that still fit keep their place in the queue and
+## only the surplus is cancelled and the shortfall submitted. Market orders never rest and are
+## always sent.
+##
+## All the cancels of a pass go out as one bulk cancel call. With a rate limiter, cancels and
+## submissions are queued on it and not waited for. The next pass only waits for those to land
+## before it reads the open orders, so it never sees a stale book. `send_order(session, order,
+## priority, ttl)` is expected to queue on the same limiter. Cancels go out at CANCEL priority, or
+## at the pass priority when that is more urgent (liquidations).
+##
+## With a `max_age`, resting orders more than that many ticks old are never kept, so a quote that
+## has sat too long is cancelled and sent again at the back of the queue.
+class OrderReconciler:
+
+    def __init__(self, limiter = None, max_age = None):
+        self.limiter = limiter
+        self.max_age = max_age
+        self.cancels = CancelService(limiter)
+        self.pending = []
+        self.n_kept = 0
+        self.n_cancelled = 0
+        self.n_submitted = 0
+
+    def expired(self, order, tick):
+        return self.max_age is not None and tick is not None and tick - order['tick'] > self.max_age
+
+    def diff(self, desired, open_orders, tick = None):
+
+        ## Desired size per level and the largest single order asked for there
+        levels = {}
+        submits = []
+        for order in desired:
+            if order['type'] == "MARKET":
+                submits.append(order)
+                continue
+            key = order_key(order)
+            total, size, template = levels.get(key, (0, 0, order))
+            levels[key] = (total + order['quantity'], max(size, order['quantity']), template)
+
+        ## Keep resting orders while they fit in the level, cancel the rest
+        kept = {}
+        cancels = []
+        for order in sorted(open_orders, key = lambda order: order['order_id']):
+            key = order_key(order)
+            remaining = order['quantity'] - order['quantity_filled']
+            if key in levels and not self.expired(order, tick) and kept.get(key, 0) + remaining <= levels[key][0]:
+                kept[key] = kept.get(key, 0) + remaining
+            else:
+                cancels.append(order['order_id'])
+
+        ## Top the levels back up in chunks no larger than the orders asked for
+        for key, (total, size, template) in levels.items():
+            missing = total - kept.get(key, 0)
+            while missing > 0:
+                quantity = min(size, missing)
+                submits.append({**template, 'quantity': quantity})
+                missing -= quantity
+
+        self.n_kept = len(open_orders) - len(cancels)
+        return cancels, submits
+
+    ## Every cancel and submission of the last pass has been answered
+    @property
+    def settled(self):
+        return all(future.done() for future in self.pending)
+
+    def get_open_orders(self, session):
+        return session.get(f"{BASE_URL}/orders?status=OPEN")
+
+    ## Cancels go out before submissions so freed position limit is available to the new quotes
+    def reconcile(self, session, desired, send_order, priority = QUOTE, ttl = None, tick = None):
+
+        wait(self.pending)
+        self.cancels.confirm()
+        resp = self.get_open_orders(session)
+        if not resp.ok:
+            return False
+        cancels, submits = self.diff(desired, resp.json(), tick)
+
+        for order_id in cancels:
+            self.cancels.cancel(order_id)
+        self.pending = self.cancels.submit(session, min(priority, CANCEL))
+        self.pending += [send_order(session, order, priority, ttl) for order in submits]
+        self.pending = [result for result in self.pending if isinstance(result, Future)]
+
+        self.n_cancelled = len(cancels)
+        self.n_submitted = len(submits)
+        return True
@@ -0,0 +1,60 @@
+from sortedcontainers import SortedList
+from collections import deque
+
+###################################################################################################
+
+## Our live orders on one side, indexed three ways: a dict on order id, a deque in submission order
+## for age based expiry (ticks only grow, so it stays sorted and removed orders are skipped lazily
+## when they reach the front), and a SortedList of (price, id) for proximity checks. Adds, discards
+## and proximity lookups are O(log n), and expiry only touches the orders that actually expired.
+class OrderRegistry:
+
+    def __init__(self):
+        self.orders = {}
+        self.ages = deque()
+        self.prices = SortedList()
+
+    def __len__(self):
+        return len(self.orders)
+
+    def __contains__(self, order_id):
+        return order_id in self.orders
+
+    def __iter__(self):
+        return iter(list(self.orders.items()))
+
+    ## Failed submissions come back as an ApiException instead of an id and are not registered
+    def add(self, order_id, price, tick, quantity = None):
+        if not isinstance(order_id, int):
+            return
+        self.orders[order_id] = (price, tick, quantity)
+        self.ages.append((tick, order_id))
+        self.prices.add((price, order_id))
+
+    def discard(self, order_id):
+        entry = self.orders.pop(order_id, None)
+        if entry is None:
+            return
+        self.prices.remove((entry[0], order_id))
+
+    ## Drops everything that is no longer open, `open_orders` should be a set or a dict
+    def retain(self, open_orders):
+        for order_id in [order_id for order_id in self.orders if order_id not in open_orders]:
+            self.discard(order_id)
+
+    ## Orders older than `max_age` ticks, oldest first. They stay registered until discarded.
+    def expired(self, tick, max_age):
+        while len(self.ages) != 0 and self.ages[0][1] not in self.orders:
+            self.ages.popleft()
+        expired = []
+        for order_tick, order_id in self.ages:
+            if tick - order_tick <= max_age:
+                break
+            if order_id in self.orders:
+                expired.append(order_id)
+        return expired
+
+    ## True if any order rests within `distance` of `price`
+    def near(self, price, distance):
+        i = self.prices.bisect_left((price - distance, -1))
+        return i < len(self.prices) and self.prices[i][0] <= price + distance
@@ -0,0 +1,334 @@
+from api import build_order, get_open_order_count, get_resting_orders
+from pricing import vol_spreading, trend_skewing, inventory_skewing, stop_loss
+
+###################################################################################################
+
+## A strategy version reduced to what actually differs between them: its calibrations, when it
+## reprices and the orders it wants resting. Everything else (market data, signals, order traffic,
+## the end of case unwind and the stop-loss unwind) lives in the runtime, once for all of them.
+##
+## `requote` sees every snapshot and keeps whatever state the version needs to decide. `fetchers`
+## are extra `(session, data)` market data calls the version needs on top of the usual ones.
+class Policy:
+
+    name = None
+    fetchers = []
+
+    MAX_VOLUME = 5_000
+    N_ORDERS = 1
+    ROLLING_TREND_LOOKBACK = 50
+
+    VOL_CALIBRATION = 1
+    TIME_FACTOR_SCALED = False              ## Scales the spread by the TAS time factor too
+    TREND_SKEW_CALIBRATION = 1              ## None turns trend skewing off
+    TREND_VOL_SCALED = True
+    INVENTORY_SKEW_CALIBRATION = 1
+    TIGHT_INVENTORY_SKEW_CALIBRATION = None ## Defaults to INVENTORY_SKEW_CALIBRATION
+    STOP_LOSS_CALIBRATION = None            ## None turns the stop-loss off
+    OLD_ORDER_CALIBRATION = None            ## Max age of a resting order in ticks, None keeps them
+    MAX_HOLDING_PERIOD = None               ## None never unwinds a position for being held too long
+    MAX_HOLDING_CALIBRATION = 1             ## Ticks off the holding period per MAX_VOLUME held
+
+    quote_tick = 0
+    holding = 0
+    holding_tick = None
+    holding_position = 0
+
+    def requote(self, data):
+        return True
+
+    ## Spread and trend skew, the part of the quote that does not depend on the position. Takes
+    ## arrays of ticks as well as a snapshot.
+    def spread(self, data):
+        vol_spreading(data, self.VOL_CALIBRATION, self.TIME_FACTOR_SCALED)
+        if self.TREND_SKEW_CALIBRATION is not None:
+            return trend_skewing(data, self.TREND_SKEW_CALIBRATION, self.TREND_VOL_SCALED)
+        return data['mid'] - data['vol_spread'], data['mid'] + data['vol_spread']
+
+    def quote(self, data, spread = None):
+        self.quote_tick = data['tick']
+        bid, ask = self.spread(data) if spread is None else spread
+        return inventory_skewing(
+            data, bid, ask,
+            self.INVENTORY_SKEW_CALIBRATION,
+            self.TIGHT_INVENTORY_SKEW_CALIBRATION,
+            self.MAX_VOLUME
+        )
+
+    ## N_ORDERS on the side adding to the position, the whole position on the side that unwinds it
+    def orders(self, data, bid, ask):
+
+        pos = data['position']
+        n = abs(int(pos // self.MAX_VOLUME))
+        r = abs(int(pos % self.MAX_VOLUME))
+        if pos > 0:
+            buy_orders = [
+                build_order("LIMIT", self.MAX_VOLUME, bid, "BUY")
+                for i in range(self.N_ORDERS)
+            ]
+            sell_orders = [
+                build_order("LIMIT", self.MAX_VOLUME, ask, "SELL")
+                for i in range(n)
+            ]
+            sell_orders.append(build_order("LIMIT", r, ask, "SELL"))
+        elif pos < 0:
+            sell_orders = [
+                build_order("LIMIT", self.MAX_VOLUME, ask, "SELL")
+                for i in range(self.N_ORDERS)
+            ]
+            buy_orders = [
+                build_order("LIMIT", self.MAX_VOLUME, ask, "BUY")
+                for i in range(n)
+            ]
+            buy_orders.append(build_order("LIMIT", r, ask, "BUY"))
+        else:
+            buy_orders = [
+                build_order("LIMIT", self.MAX_VOLUME, bid, "BUY")
+                for i in range(self.N_ORDERS)
+            ]
+            sell_orders = [
+                build_order("LIMIT", self.MAX_VOLUME, ask, "SELL")
+                for i in range(self.N_ORDERS)
+            ]
+
+        buy_orders = [order for order in buy_orders if order['quantity'] != 0][::-1]
+        sell_orders = [order for order in sell_orders if order['quantity'] != 0][::-1]
+        return sell_orders + buy_orders
+
+    def breached(self, data):
+        if self.STOP_LOSS_CALIBRATION is None:
+            return False
+        return stop_loss(data, self.STOP_LOSS_CALIBRATION)
+
+    ## Quotes older than OLD_ORDER_CALIBRATION ticks are priced again, and the reconciler sends them
+    ## again even at the same price
+    def expired(self, data):
+        return self.OLD_ORDER_CALIBRATION is not None and data['tick'] - self.quote_tick > self.OLD_ORDER_CALIBRATION
+
+    ## Whether the position is still the one being held, for the hedger's count
+    def holding_on(self, pos):
+        return abs(pos) >= abs(self.holding_position)
+
+    ## The v3 hedger. True once the position has been held for MAX_HOLDING_PERIOD ticks, a
+    ## MAX_HOLDING_CALIBRATION ticks less for every MAX_VOLUME held. Counts once per tick.
+    def held(self, data):
+        if self.MAX_HOLDING_PERIOD is None:
+            return False
+        pos = data['position']
+        if data['tick'] != self.holding_tick:
+            self.holding = self.holding + 1 if self.holding_on(pos) else 0
+            self.holding_tick = data['tick']
+            self.holding_position = pos
+        F = abs(pos // self.MAX_VOLUME) * self.MAX_HOLDING_CALIBRATION
+        return pos != 0 and self.holding > self.MAX_HOLDING_PERIOD + 1 - F
+
+## Stacks quotes instead of replacing them. Every tick adds a MAX_VOLUME pair at the new prices
+## unless resting quotes are already within ORDER_PROXIMITY_CALIBRATION spreads of them, and quotes
+## rest until they fill or turn OLD_ORDER_CALIBRATION ticks old. The position's odd lot is quoted on
+## its own on the side that unwinds it. What is resting comes from the open orders.
+class Ladder(Policy):
+
+    fetchers = [get_resting_orders]
+
+    ORDER_PROXIMITY_CALIBRATION = 0
+    BOTH_SIDES_FREE = True      ## A new pair needs both prices free of quotes, else either
+    ODD_LOT_TYPE = "LIMIT"
+
+    def __init__(self):
+        self.tick = 0
+
+    def requote(self, data):
+        requote = data['tick'] != self.tick
+        self.tick = data['tick']
+        return requote
+
+    def near(self, orders, action, price, distance):
+        return any(
+            order['action'] == action and abs(order['price'] - price) <= distance + 1e-9
+            for order in orders
+        )
+
+    def orders(self, data, bid, ask):
+
+        resting = [
+            order
+            for order in data['open_orders']
+            if order['type'] == "LIMIT" and order['quantity'] == self.MAX_VOLUME
+            and data['tick'] - order['tick'] <= self.OLD_ORDER_CALIBRATION
+        ]
+        orders = [
+            build_order("LIMIT", order['quantity'] - order['quantity_filled'], order['price'], order['action'])
+            for order in resting
+        ]
+
+        distance = data['vol_spread'] * self.ORDER_PROXIMITY_CALIBRATION
+        free = [not self.near(resting, "BUY", bid, distance), not self.near(resting, "SELL", ask, distance)]
+        if all(free) if self.BOTH_SIDES_FREE else any(free):
+            orders.append(build_order("LIMIT", self.MAX_VOLUME, bid, "BUY"))
+            orders.append(build_order("LIMIT", self.MAX_VOLUME, ask, "SELL"))
+
+        pos = data['position']
+        r = abs(int(pos)) % self.MAX_VOLUME
+        if pos > 0 and r != 0:
+            orders.append(build_order(self.ODD_LOT_TYPE, r, ask, "SELL"))
+        elif pos < 0 and r != 0:
+            orders.append(build_order(self.ODD_LOT_TYPE, r, bid, "BUY"))
+        return orders
+
+###################################################################################################
+
+## Reprices on every fill. The original counts transacted orders off the ledger, a position change
+## is what a fill looks like from the snapshot.
+class Day2(Policy):
+
+    name = "day2"
+
+    VOL_CALIBRATION = 1.5
+    TREND_SKEW_CALIBRATION = None
+    INVENTORY_SKEW_CALIBRATION = 1
+
+    def __init__(self):
+        self.position = None
+
+    def requote(self, data):
+        if data['position'] != self.position:
+            self.position = data['position']
+            return True
+        return False
+
+## Day2 with the spread scaled by the time factor, one quote a side and a steeper inventory skew
+class Day1(Day2):
+
+    name = "day1"
+
+    VOL_CALIBRATION = 2
+    TIME_FACTOR_SCALED = True
+    INVENTORY_SKEW_CALIBRATION = 2
+
+    def orders(self, data, bid, ask):
+        return [build_order("LIMIT", self.MAX_VOLUME, bid, "BUY"), build_order("LIMIT", self.MAX_VOLUME, ask, "SELL")]
+
+## Reprices once per tick, only while flat
+class V2(Policy):
+
+    name = "v2"
+
+    VOL_CALIBRATION = 0.3
+    TREND_SKEW_CALIBRATION = 1
+    INVENTORY_SKEW_CALIBRATION = 2
+    STOP_LOSS_CALIBRATION = 1
+
+    def __init__(self):
+        self.tick = 0
+
+    def requote(self, data):
+        requote = data['tick'] != self.tick and data['position'] == 0
+        self.tick = data['tick']
+        return requote
+
+## Reprices every five ticks
+class V3(Policy):
+
+    name = "v3"
+
+    REQUOTE_TICKS = 5
+    VOL_CALIBRATION = 1
+    TREND_SKEW_CALIBRATION = 1
+    INVENTORY_SKEW_CALIBRATION = 3
+
+    def __init__(self):
+        self.tick = 0
+
+    def requote(self, data):
+        if data['tick'] - self.tick > self.REQUOTE_TICKS:
+            self.tick = data['tick']
+            return True
+        return False
+
+## Ladders a pair a tick unless one rests within half a spread on either side, skews on the raw
+## trend, and hedges any position it has held too long, twice as fast per MAX_VOLUME held
+class V3p2(Ladder):
+
+    name = "v3p2"
+
+    ROLLING_TREND_LOOKBACK = 10
+    VOL_CALIBRATION = 1
+    TREND_SKEW_CALIBRATION = 3
+    TREND_VOL_SCALED = False
+    INVENTORY_SKEW_CALIBRATION = 2
+    TIGHT_INVENTORY_SKEW_CALIBRATION = 0.5
+    ORDER_PROXIMITY_CALIBRATION = 0.5
+    BOTH_SIDES_FREE = False
+    OLD_ORDER_CALIBRATION = 7
+    MAX_HOLDING_PERIOD = 20
+    MAX_HOLDING_CALIBRATION = 2
+
+    ## Any position counts as held until it goes flat or flips
+    def holding_on(self, pos):
+        return pos != 0 and pos * self.holding_position >= 0
+
+## Ladders a pair a tick unless both prices are already quoted, and works the odd lot off at market
+class V3p3(Ladder):
+
+    name = "v3p3"
+
+    ROLLING_TREND_LOOKBACK = 10
+    VOL_CALIBRATION = 0.3
+    TREND_SKEW_CALIBRATION = 1
+    INVENTORY_SKEW_CALIBRATION = 3
+    ODD_LOT_TYPE = "MARKET"
+    OLD_ORDER_CALIBRATION = 7
+    MAX_HOLDING_PERIOD = 20
+
+## Reprices every tick, but leaves resting quotes alone for N_TICKS_TO_RESET ticks after a reprice.
+## Only skews against the inventory on the side that adds to it.
+class V4(Policy):
+
+    name = "v4"
+    fetchers = [get_open_order_count]
+
+    N_TICKS_TO_RESET = 3
+    VOL_CALIBRATION = 1
+    TREND_SKEW_CALIBRATION = 1
+    INVENTORY_SKEW_CALIBRATION = 1
+    TIGHT_INVENTORY_SKEW_CALIBRATION = 0
+
+    def __init__(self):
+        self.tick = 0
+        self.last_reset_tick = 0
+
+    def requote(self, data):
+        if data['tick'] == self.tick:
+            return False
+        self.tick = data['tick']
+        if data['tick'] - self.last_reset_tick < self.N_TICKS_TO_RESET and data['n_open_orders'] != 0:
+            return False
+        self.last_reset_tick = data['tick']
+        return True
+
+## Reprices when the position goes flat or a round trip closes while flat
+class Skeleton(Policy):
+
+    name = "skeleton"
+
+    VOL_CALIBRATION = 0.5
+    TREND_SKEW_CALIBRATION = 1
+    INVENTORY_SKEW_CALIBRATION = 1
+    STOP_LOSS_CALIBRATION = 1
+
+    def __init__(self):
+        self.position = 0
+        self.realized = 0
+        self.init = True
+
+    def requote(self, data):
+        if (data['position'] == 0 and self.position != 0) or self.init:
+            self.position = data['position']
+            self.realized = data['realized_profit']
+            self.init = False
+            return True
+        if data['position'] == self.position and data['position'] == 0 and data['realized_profit'] != self.realized:
+            self.init = True
+        return False
+
+POLICIES = {policy.name: policy for policy in [Day1, Day2, V2, V3, V3p2, V3p3, V4, Skeleton]}
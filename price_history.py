@@ -0,0 +1,99 @@
+from api import BASE_URL
+import pandas as pd
+import numpy as np
+
+###################################################################################################
+
+HISTCOLS = ['tick', 'open', 'high', 'low', 'close']
+HISTORY_SIZE = 300
+
+## Incremental OHLC feed. Bars live in a preallocated ring buffer keyed by tick (tick % size), so
+## a poll only has to pull the newest bars with `limit` and patch the in-progress bar in place.
+class PriceHistory:
+
+    def __init__(self, ticker = "ALGO", size = HISTORY_SIZE):
+        self.ticker = ticker
+        self.size = size
+        self.bars = np.zeros((size, len(HISTCOLS)))
+        self.bars[:, 0] = -1
+        self.first_tick = -1
+        self.last_tick = -1
+        self.changed = False
+
+    def reset(self):
+        self.bars[:] = 0
+        self.bars[:, 0] = -1
+        self.first_tick = -1
+        self.last_tick = -1
+
+    def get_limit(self, tick):
+        if self.last_tick < 0:
+            return None
+        if tick is None:
+            return 2
+        return min(max(tick - self.last_tick + 1, 2), self.size)
+
+    def fetch(self, session, limit):
+        url = f"{BASE_URL}/securities/history?ticker={self.ticker}"
+        if limit is not None:
+            url += f"&limit={limit}"
+        return session.get(url)
+
+    def update(self, session, tick = None):
+
+        ## A tick behind our newest bar means a new case started
+        if tick is not None and tick < self.last_tick:
+            self.reset()
+
+        limit = self.get_limit(tick)
+        resp = self.fetch(session, limit)
+        if not resp.ok:
+            return False
+        bars = resp.json()
+
+        ## The response is newest first. If the oldest bar we got is past our newest one we missed
+        ## bars in between and backfill the whole history once.
+        if limit is not None and len(bars) != 0 and bars[-1]['tick'] > self.last_tick + 1:
+            resp = self.fetch(session, None)
+            if not resp.ok:
+                return False
+            bars = resp.json()
+
+        self.changed = False
+        for bar in reversed(bars):
+            row = self.bars[bar['tick'] % self.size]
+            values = (bar['tick'], bar['open'], bar['high'], bar['low'], bar['close'])
+            if tuple(row) != values:
+                row[:] = values
+                self.changed = True
+            if self.first_tick < 0 or bar['tick'] < self.first_tick:
+                self.first_tick = bar['tick']
+            if bar['tick'] > self.last_tick:
+                self.last_tick = bar['tick']
+
+        return True
+
+    def window(self, n = None):
+        if self.last_tick < 0:
+            return self.bars[:0]
+        start = max(self.first_tick, self.last_tick - self.size + 1)
+        if n is not None:
+            start = max(start, self.last_tick - n + 1)
+        ticks = np.arange(start, self.last_tick + 1)
+        rows = self.bars[ticks % self.size]
+        return rows[rows[:, 0] == ticks]
+
+    @property
+    def close(self):
+        return self.window()[:, 4]
+
+    @property
+    def last_close(self):
+        if self.last_tick < 0:
+            return None
+        return self.bars[self.last_tick % self.size, 4]
+
+    def to_frame(self, n = None):
+        df = pd.DataFrame(self.window(n), columns = HISTCOLS)
+        df['tick'] = df.tick.astype(int)
+        return df
@@ -0,0 +1,80 @@
+import numpy as np
+
+###################################################################################################
+
+## The quoting pipeline every strategy version is built from: a spread off the volatility, a skew
+## with the trend and a skew against the inventory. They only read `data`, the signals in it come
+## from the market data side (vol, gtrend, gtrend_confidence), so they are safe to call on any
+## thread. The spread and the trend skew also take arrays of ticks, which is how the backtester
+## prices a whole session at once.
+
+MAX_VOLUME = 5_000
+TREND_CONFIDENCE = 1.5
+
+## Python's round on scalars, like the versions always did, numpy's on arrays
+def cents(x):
+    return round(x, 2) if np.ndim(x) == 0 else np.round(x, 2)
+
+## `time_scaled` also scales it by the TAS time factor, like day1 did
+def vol_spreading(data, calibration, time_scaled = False):
+    vol = data['time_factor'] * data['vol'] if time_scaled else data['vol']
+    data['vol_spread'] = cents(calibration * vol * data['mid'])
+
+## `vol_scaled` divides the trend by the root of the volatility before it is exponentiated, which
+## every version but v3p2 does
+def trend_skewing(data, calibration, vol_scaled = True):
+    mid = data['mid']
+    ask = mid + data['vol_spread']
+    bid = mid - data['vol_spread']
+
+    ## Never skewed through the mid
+    skewed = data['gtrend_confidence'] > TREND_CONFIDENCE
+    with np.errstate(divide = 'ignore', invalid = 'ignore', over = 'ignore'):
+        trend = data['gtrend']
+        if vol_scaled:
+            trend = trend / np.sqrt(data['vol'])
+        factor = np.exp(calibration * trend)
+        bid = np.where(skewed, np.minimum(factor * bid, mid), bid)
+        ask = np.where(skewed, np.maximum(factor * ask, mid), ask)
+
+    if np.ndim(bid) == 0:
+        bid, ask = float(bid), float(ask)
+    return cents(bid), cents(ask)
+
+## The side that unwinds the inventory is pulled in by `tight`, the side that adds to it is pushed
+## out by `loose`. Most versions use one calibration for both, v4 leaves the unwinding side alone.
+def inventory_skewing(data, bid, ask, loose, tight = None, max_volume = MAX_VOLUME):
+
+    tight = loose if tight is None else tight
+    pos = data['position']
+    F_tight = abs(pos // max_volume) * tight
+    F_loose = abs(pos // max_volume) * loose
+
+    if pos > 0:
+        ask = data['mid'] + (ask - data['mid']) * (1 / (1 + F_tight))
+        bid = data['mid'] - (1 + F_loose) * (data['mid'] - bid)
+    elif pos < 0:
+        ask = data['mid'] + (1 + F_loose) * (ask - data['mid'])
+        bid = data['mid'] - (data['mid'] - bid) * (1 / (1 + F_tight))
+
+    return round(bid, 2), round(ask, 2)
+
+## True once the position lost more than the spread we quoted around it is worth. Leaves `pnl` and
+## `pnl_threshold` in the snapshot for whoever acts on the breach to report.
+def stop_loss(data, calibration):
+
+    pos = data['position']
+    if pos == 0: return False
+
+    pnl, pnl_threshold = 0, 0
+    if pos > 0:
+        pnl_threshold = round((data['position_vwap'] - data['current_ask']) * calibration, 3)
+        pnl = round(data['mid'] - data['position_vwap'], 3)
+    if pos < 0:
+        pnl_threshold = round((data['current_bid'] - data['position_vwap']) * calibration, 3)
+        pnl = round(data['position_vwap'] - data['mid'], 3)
+
+    data['pnl'] = pnl
+    data['pnl_threshold'] = pnl_threshold
+
+    return pnl < pnl_threshold
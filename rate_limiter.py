@@ -0,0 +1,202 @@
+from concurrent.futures import Future
+from time import monotonic, sleep
+from threading import Thread, Lock, Condition
+from queue import PriorityQueue
+from itertools import count
+from urllib3.exceptions import NewConnectionError
+import requests
+
+###################################################################################################
+
+DEFAULT_RATE = 10
+DEFAULT_BURST = 10
+MIN_RATE = 1
+MAX_RATE = 100
+RATE_INCREASE = 0.05
+RATE_DECREASE = 0.5
+MAX_RETRIES = 10
+MAX_TRANSPORT_RETRIES = 3
+RETRY_BACKOFF = 0.05
+
+## Token bucket in requests per second. Reservations can push the bucket below zero, which is how
+## queued callers are handed increasing delays in arrival order. The rate is learned AIMD style:
+## every accepted request nudges it up and every 429 halves it and empties the bucket for the
+## `wait` the server asked for.
+class TokenBucket:
+
+    def __init__(self, rate = DEFAULT_RATE, burst = DEFAULT_BURST):
+        self.rate = rate
+        self.burst = burst
+        self.tokens = burst
+        self.stamp = monotonic()
+        self.lock = Lock()
+
+    def refill(self, now):
+        self.tokens = min(self.burst, self.tokens + (now - self.stamp) * self.rate)
+        self.stamp = now
+
+    ## Takes a token and returns how long to hold off before using it
+    def reserve(self):
+        with self.lock:
+            self.refill(monotonic())
+            self.tokens -= 1
+            return 0 if self.tokens >= 0 else -self.tokens / self.rate
+
+    def acquire(self):
+        delay = self.reserve()
+        if delay > 0:
+            sleep(delay)
+
+    def throttle(self, wait):
+        with self.lock:
+            self.refill(monotonic())
+            self.rate = max(MIN_RATE, self.rate * RATE_DECREASE)
+            self.tokens = min(self.tokens, -wait * self.rate)
+
+    def reward(self):
+        with self.lock:
+            self.rate = min(MAX_RATE, self.rate + RATE_INCREASE)
+
+## Priority classes, most urgent first. Within a class requests keep their arrival order.
+RISK = 0
+CANCEL = 1
+QUOTE = 2
+MARKET_DATA = 3
+SHUTDOWN = 4
+
+## Shared gate for every order and cancel call. Requests are queued and sent by a worker thread on
+## its own session as the bucket allows, so the strategy loop never sleeps on a 429 and a throttled
+## request is retried rather than dropped. `submit` returns a future for the response, `call`
+## waits for it.
+##
+## The queue is ordered by priority class, so a stop-loss or a cancel jumps ahead of any quotes
+## still waiting. Requests given a `ttl` are dropped (their future cancelled) if they could not go
+## out in time, and market data does not spend order tokens. `drain` lets other traffic, like the
+## market data fan-out, hold off while urgent requests are in flight, and `turn` queues it behind
+## everything more urgent already waiting.
+class RateLimiter:
+
+    def __init__(self, headers, bucket = None):
+        self.headers = headers
+        self.bucket = TokenBucket() if bucket is None else bucket
+        self.queue = PriorityQueue()
+        self.sequence = count()
+        self.pending = [0] * SHUTDOWN
+        self.idle = Condition()
+        self.thread = None
+        self.n_throttled = 0
+        self.n_expired = 0
+        self.n_transport_errors = 0
+
+    def start(self):
+        if self.thread is None:
+            self.thread = Thread(target = self.run, daemon = True)
+            self.thread.start()
+
+    ## Failures that can be sent again, backing off a little longer each time: any connection error
+    ## on a GET, only a connection that was never made on anything else. A POST whose connection
+    ## dropped or timed out later may already have been executed, its future fails and the open
+    ## list tells the reconciler and the ledger what happened to it.
+    def retryable(self, method, e):
+        if method == "GET":
+            return isinstance(e, requests.ConnectionError)
+        if isinstance(e, requests.ConnectTimeout):
+            return True
+        reason = getattr(e.args[0], 'reason', e.args[0]) if e.args else None
+        return isinstance(e, requests.ConnectionError) and isinstance(reason, NewConnectionError)
+
+    def send(self, session, method, url, params = None):
+        for i in range(MAX_TRANSPORT_RETRIES):
+            try:
+                return session.request(method, url, params = params)
+            except requests.RequestException as e:
+                if i == MAX_TRANSPORT_RETRIES - 1 or not self.retryable(method, e):
+                    raise
+                self.n_transport_errors += 1
+                sleep(RETRY_BACKOFF * 2 ** i)
+
+    ## Paced send with retries, also usable directly from other threads with their own session
+    def request(self, session, method, url, params = None, paced = True):
+        for i in range(MAX_RETRIES):
+            if paced:
+                self.bucket.acquire()
+            resp = self.send(session, method, url, params)
+            if resp.status_code != 429:
+                if paced:
+                    self.bucket.reward()
+                return resp
+            self.n_throttled += 1
+            self.bucket.throttle(resp.json()['wait'] / 1_000)
+        return resp
+
+    def done(self, priority):
+        with self.idle:
+            self.pending[priority] -= 1
+            self.idle.notify_all()
+
+    def run(self):
+        with requests.Session() as session:
+            session.headers.update(self.headers)
+            while True:
+                priority, _, item = self.queue.get()
+                if priority == SHUTDOWN:
+                    break
+                future, method, url, params, expiry = item
+                if expiry is not None and monotonic() > expiry:
+                    self.n_expired += 1
+                    ## Only a notified cancel counts as done for `wait`
+                    future.cancel()
+                    future.set_running_or_notify_cancel()
+                elif method is None:
+                    future.set_result(None)
+                elif future.set_running_or_notify_cancel():
+                    try:
+                        future.set_result(self.request(session, method, url, params, priority != MARKET_DATA))
+                    except Exception as e:
+                        future.set_exception(e)
+                self.done(priority)
+
+    def submit(self, method, url, params = None, priority = QUOTE, ttl = None):
+        self.start()
+        future = Future()
+        expiry = None if ttl is None else monotonic() + ttl
+        with self.idle:
+            self.pending[priority] += 1
+        self.queue.put((priority, next(self.sequence), (future, method, url, params, expiry)))
+        return future
+
+    def call(self, method, url, params = None, priority = QUOTE):
+        return self.submit(method, url, params, priority).result()
+
+    ## Waits for a place in the queue at `priority` without sending anything through the worker, the
+    ## caller sends its own request once it is its turn. Market data goes out this way so a fan-out
+    ## still runs concurrently, just never ahead of orders and cancels already queued.
+    def turn(self, priority = MARKET_DATA):
+        self.submit(None, None, priority = priority).result()
+
+    ## Blocks until nothing at `priority` or more urgent is queued or in flight
+    def drain(self, priority = CANCEL):
+        with self.idle:
+            self.idle.wait_for(lambda: sum(self.pending[:priority + 1]) == 0)
+
+    def close(self):
+        if self.thread is not None:
+            self.queue.put((SHUTDOWN, next(self.sequence), None))
+            self.thread.join()
+            self.thread = None
+
+## A requests session whose GETs wait for their `turn` on the limiter first, for the usual
+## `(session, data)` market data functions
+class ScheduledSession:
+
+    def __init__(self, session, limiter, priority = MARKET_DATA):
+        self.session = session
+        self.limiter = limiter
+        self.priority = priority
+
+    def get(self, url, **kwargs):
+        self.limiter.turn(self.priority)
+        return self.session.get(url, **kwargs)
+
+    def __getattr__(self, name):
+        return getattr(self.session, name)
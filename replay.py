@@ -0,0 +1,101 @@
+from mock_server import MockServer, Exchange, VirtualClock, WallClock, TICK_PERIOD
+from matching import MATCHERS
+from orchestrator import Supervisor, get_keys
+from tape import Tape, sessions
+from time import sleep
+import multiprocessing as mp
+import orchestrator
+import requests
+import signal
+import socket
+import sys, os
+
+###################################################################################################
+
+## python replay.py <version> [<session> ...]
+##
+## Pushes recorded sessions (every one in data/ when none are given) through the real runtime. Each
+## session is served by its own mock server process on the port it was captured from, on the
+## virtual clock unless RIT_SPEED asks for an N times faster wall clock, and the orchestrator runs
+## one worker per port against them. On the virtual clock the workers step the case themselves, one
+## tick per decision. RIT_MATCHER picks the mock's fill model (cross or queue, see matching.py). PnL
+## comes out in the supervisor's table and summary.
+##
+## python replay.py check <version> <session> replays the session twice on the virtual clock and
+## compares what filled.
+
+SERVER_TIMEOUT = 10
+
+def serve(session, speed, matcher = "cross"):
+    signal.signal(signal.SIGINT, signal.SIG_IGN)
+    tape = Tape.load(session)
+    clock = VirtualClock() if speed == "virtual" else WallClock(TICK_PERIOD / float(speed))
+    MockServer(("localhost", int(session)), Exchange(tape, clock, matcher = MATCHERS[matcher](tape))).serve_forever()
+
+def wait_for(port):
+    for i in range(SERVER_TIMEOUT * 10):
+        try:
+            socket.create_connection(("localhost", port), timeout = 0.1).close()
+            return
+        except OSError:
+            sleep(0.1)
+    raise RuntimeError(f"Mock server on {port} did not come up")
+
+## Every fill of the case as (tick, action, type, price, quantity, vwap), leaving out the order ids
+## since orders sent concurrently within a tick are numbered in whatever order they arrived
+def get_fills(port):
+    resp = requests.get(f"http://localhost:{port}/v1/securities")
+    fills = [tuple(resp.json()[0][key] for key in ('position', 'realized', 'volume'))]
+    for status in ["TRANSACTED", "CANCELLED"]:
+        orders = requests.get(f"http://localhost:{port}/v1/orders", params = {'status': status}).json()
+        fills += sorted(
+            (order['tick'], order['action'], order['type'], order['price'], order['quantity_filled'], order['vwap'])
+            for order in orders if order['quantity_filled'] > 0
+        )
+    return fills
+
+def replay(name, replayed, speed, matcher, on_done = None):
+
+    if speed == "virtual":
+        os.environ["RIT_STEP"] = "1"
+    ports = [int(session) for session in replayed]
+    context = mp.get_context("spawn")
+    servers = [context.Process(target = serve, args = (session, speed, matcher), daemon = True) for session in replayed]
+    for server in servers:
+        server.start()
+    try:
+        for port in ports:
+            wait_for(port)
+        supervisor = Supervisor(name, ports, get_keys(ports))
+        signal.signal(signal.SIGINT, orchestrator.signal_handler)
+        supervisor.run()
+        return on_done(ports) if on_done else None
+    finally:
+        for server in servers:
+            server.terminate()
+            server.join()
+
+def check(name, session, matcher):
+    runs = [replay(name, [session], "virtual", matcher, lambda ports: get_fills(ports[0])) for i in range(2)]
+    if runs[0] == runs[1]:
+        print(f"{session}: both runs filled the same, {len(runs[0]) - 1} orders")
+        return True
+    print(f"{session}: the runs filled differently")
+    for first, second in zip(runs[0], runs[1]):
+        if first != second:
+            print(" ", first, "!=", second)
+    return False
+
+def main():
+
+    matcher = os.environ.get("RIT_MATCHER", "cross")
+    if sys.argv[1] == "check":
+        sys.exit(0 if check(sys.argv[2], sys.argv[3], matcher) else 1)
+
+    name = sys.argv[1]
+    replayed = sys.argv[2:] or sessions()
+    replay(name, replayed, os.environ.get("RIT_SPEED", "virtual"), matcher)
+
+if __name__ == '__main__':
+
+    main()
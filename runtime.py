@@ -0,0 +1,285 @@
+from engine import Engine, SEND
+from market_data import MarketData
+from tick_clock import TickClock
+from price_history import PriceHistory
+from time_and_sales import TimeAndSales
+from signal_cache import SignalCache
+from rate_limiter import RateLimiter, RISK, QUOTE
+from order_gateway import OrderGateway
+from order_reconciler import OrderReconciler
+from liquidation import LiquidationScheduler
+from policies import POLICIES
+from api import BASE_URL, ApiException, get_tick, get_security_info
+from logger import logger
+from config import API_KEY
+from time import sleep
+import signal
+import sys, os
+
+###################################################################################################
+
+START_TICK = 10
+END_TICK = 290
+LAST_TICK = 299
+STOP_LOSS_TICKS = 3
+HEDGE_TICKS = 3
+
+## Against the mock's virtual clock, RIT_STEP=1 moves the case on one tick per decision. Without it
+## the feed's own /case polls would move it, far faster than the strategy thread decides.
+STEP = os.environ.get("RIT_STEP") == "1"
+STEP_INTERVAL = 0.001
+
+DATA = {
+    ## Case Info
+    'tick': 0,
+    'status': "ACTIVE",
+
+    ## Security Info
+    'position': 0,
+    'position_vwap': 0,
+    'last': 0,
+    'bid': 0,
+    'mid': 0,
+    'ask': 0,
+    'realized_profit': 0,
+    'unrealized_profit': 0,
+    'n_open_orders': 0,
+    'open_orders': [],
+
+    ## Calculated Metrics
+    'gtrend': 0,
+    'trend': 0,
+    'gtrend_confidence': 0,
+    'trend_confidence': 0,
+    'vol': 0,
+    'vol_spread': 0,
+    'time_factor': 0,
+    'current_bid': 0,
+    'current_ask': 0,
+    'pnl': 0,
+    'pnl_threshold': 0
+}
+
+## Hosts one policy on the engine with the one data and order layer every version shares. The
+## feed thread owns `data`, the history and the signals, the strategy thread owns the policy and
+## the unwind schedulers, the gateway thread owns the reconciler.
+##
+## With `step` the case is the mock's virtual clock and the feed moves it on itself, once the
+## tick's decision has been executed and answered. Every tick then gets exactly one snapshot and
+## one decision, so a replay fills the same way every run.
+class Runtime:
+
+    def __init__(self, policy, headers, step = STEP):
+        self.policy = policy
+        self.headers = headers
+        self.data = dict(DATA)
+        self.shutdown = False
+        self.step = step
+        self.published = None
+
+        self.clock = TickClock()
+        self.history = PriceHistory()
+        self.signals = SignalCache(self.history)
+        self.time_and_sales = TimeAndSales()
+
+        self.limiter = RateLimiter(headers)
+        self.gateway = OrderGateway(headers, self.limiter)
+        self.reconciler = OrderReconciler(self.limiter, policy.OLD_ORDER_CALIBRATION)
+        self.liquidation = LiquidationScheduler(policy.MAX_VOLUME)
+        self.unwind = LiquidationScheduler(policy.MAX_VOLUME)
+
+        self.current_bid, self.current_ask = 0, 0
+        self.stop_loss_active = False
+        self.decided = None
+        self.engine = None
+        self.listeners = []
+
+    ## Listeners get every snapshot once the strategy thread is done with it
+    def subscribe(self, listener):
+        self.listeners.append(listener)
+
+    ###############################################################################################
+    ## Feed Thread
+
+    def get_price_history(self, session, data):
+        if self.history.update(session, data['tick']):
+            if self.history.changed:
+                self.signals.refresh()
+            return data
+        return ApiException("Auth Error. Check API Key")
+
+    def get_time_and_sales(self, session, data):
+        if self.time_and_sales.update(session, data['tick']):
+            data['time_factor'] = self.time_and_sales.time_factor
+            return data
+        return ApiException("Auth Error. Check API Key")
+
+    def fetchers(self):
+        return [get_tick, get_security_info, self.get_price_history, self.get_time_and_sales] + self.policy.fetchers
+
+    def compute_signals(self, data):
+        data['vol'] = self.signals.vol()
+        data['gtrend'], data['gtrend_confidence'] = self.signals.trend()
+        data['trend'], data['trend_confidence'] = self.signals.trend(self.policy.ROLLING_TREND_LOOKBACK)
+        return data
+
+    def snapshot(self):
+        self.data.update(self.market_data.snapshot(self.data))
+        return dict(self.compute_signals(self.data))
+
+    def step_case(self, session):
+        resp = session.post(f"{BASE_URL}/step")
+        if not resp.ok:
+            raise ApiException("The case does not step, replay it on the virtual clock")
+        case = resp.json()
+        self.data['tick'], self.data['status'] = case['tick'], case['status']
+
+    def feed(self, session):
+
+        if self.step:
+            return self.feed_stepped(session)
+
+        ## Dont trade for first n ticks
+        if self.data['tick'] < START_TICK:
+            self.data['tick'] = self.clock.wait(session)
+            return None
+
+        return self.snapshot()
+
+    def feed_stepped(self, session):
+        tick = self.data['tick']
+        if tick >= START_TICK and self.published != tick:
+            self.published = tick
+            return self.snapshot()
+        if tick >= START_TICK and not self.passed():
+            sleep(STEP_INTERVAL)
+            return None
+        self.step_case(session)
+        return None
+
+    ###############################################################################################
+    ## Strategy Thread
+
+    def decide(self, data):
+
+        data['current_bid'] = self.current_bid
+        data['current_ask'] = self.current_ask
+
+        ## Unwind over the last ticks instead of quoting. Market slices go out once per tick, so
+        ## they are sent rather than left in the target slot for the next pass to overwrite.
+        if data['tick'] > END_TICK:
+            self.liquidation.start(data['tick'], LAST_TICK)
+            orders = self.liquidation.orders(data)
+            if any(order['type'] == "MARKET" for order in orders):
+                self.engine.send(orders)
+            else:
+                self.engine.target(orders, RISK)
+
+        elif self.policy.requote(data) or self.policy.expired(data):
+
+            bid, ask = self.policy.quote(data)
+            data['current_bid'] = self.current_bid = bid
+            data['current_ask'] = self.current_ask = ask
+            self.engine.target(self.policy.orders(data, bid, ask), QUOTE)
+            self.stop_loss_active = True
+
+            print("------------")
+            print("Tick", data['tick'])
+            print("Position", data['position'])
+            print(f"({bid}, {data['mid']}, {ask})")
+            print("Volatility", round(data['vol'] * 100, 4))
+            print("Vol-Spread", data['vol_spread'])
+
+        ## Monitor and Kill Positions, a breached or stale position is unwound one market slice per
+        ## tick. The end of case unwind has the position to itself.
+        if data['tick'] > END_TICK:
+            self.unwind.stop()
+        else:
+            if self.stop_loss_active and self.policy.breached(data):
+                print("Threshold Breached.", data['pnl_threshold'], data['pnl'])
+                self.unwind.start(data['tick'], data['tick'] + STOP_LOSS_TICKS - 1, isMarket = True)
+                self.stop_loss_active = False
+            if self.policy.held(data):
+                self.unwind.start(data['tick'], data['tick'] + HEDGE_TICKS - 1, isMarket = True)
+        if self.unwind.active:
+            self.engine.send(self.unwind.orders(data))
+
+        log(data)
+        for listener in self.listeners:
+            listener(data)
+        self.decided = data['tick']
+
+    ###############################################################################################
+    ## Gateway Thread
+
+    ## Subject to rate limits. Queued on the shared limiter, which paces it and retries it on 429
+    def queue_order(self, session, order, priority = QUOTE, ttl = None):
+        if order['type'] == "MARKET": order['dry_run'] = 0
+        return self.limiter.submit("POST", f"{BASE_URL}/orders", params = order, priority = priority, ttl = ttl)
+
+    def execute(self, session, intent):
+        kind, orders, priority = intent
+        reconciler = self.reconciler
+        tick = self.data['tick']
+        if kind == SEND:
+            self.gateway.send(orders)
+        elif priority == RISK:
+            reconciler.reconcile(session, orders, self.gateway.submit, RISK, tick = tick)
+        else:
+            reconciler.reconcile(session, orders, self.queue_order, QUOTE, self.clock.period, tick)
+            print("Kept", reconciler.n_kept, "Cancelled", reconciler.n_cancelled, "Submitted", reconciler.n_submitted)
+
+    ###############################################################################################
+
+    ## The current tick's decision has been made, sent and answered
+    def passed(self):
+        return self.decided == self.data['tick'] and self.engine.idle and self.reconciler.settled
+
+    ## Done once the last tick's decision, the final market slice, has been sent and answered, or
+    ## once the case is over whatever is still in flight
+    def finished(self):
+        if self.shutdown or self.data['status'] == "STOPPED":
+            return True
+        return self.data['tick'] == LAST_TICK and self.passed()
+
+    def run(self):
+        with MarketData(self.headers, self.fetchers(), scheduler = self.limiter) as market_data:
+            self.market_data = market_data
+            self.engine = Engine(self.headers, self.feed, self.decide, self.execute)
+            try:
+                self.engine.run(until = self.finished)
+            finally:
+                self.gateway.close()
+                self.limiter.close()
+        if self.liquidation.active and not self.liquidation.complete:
+            print("Liquidation incomplete, shortfall", self.liquidation.shortfall)
+
+    ## Runs the case in the foreground until it ends or the first Ctrl-C
+    def serve(self):
+
+        def signal_handler(signum, frame):
+            signal.signal(signal.SIGINT, signal.SIG_DFL)
+            self.shutdown = True
+
+        signal.signal(signal.SIGINT, signal_handler)
+        print("Running", self.policy.name, "against", BASE_URL)
+        init_log()
+        self.run()
+
+def init_log():
+    logger.info("tick,last,bid,mid,ask,current_bid,mid,current_ask,position,position_vwap,pnl,pnl_threshold,realized")
+
+def log(data):
+    logger.info(f"{data['tick']},{data['last']},{data['bid']},{data['mid']},{data['ask']},{data['current_bid']},{data['mid']},{data['current_ask']},{data['position']},{data['position_vwap']},{data['pnl']},{data['pnl_threshold']},{data['realized_profit']}")
+
+###################################################################################################
+
+## python runtime.py <version>, e.g. `python runtime.py v4`
+def main():
+
+    name = sys.argv[1] if len(sys.argv) > 1 else "skeleton"
+    Runtime(POLICIES[name](), API_KEY).serve()
+
+if __name__ == '__main__':
+
+    main()
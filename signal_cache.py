@@ -0,0 +1,75 @@
+from volatility_estimators import *
+
+###################################################################################################
+
+## Per-tick memo for the signals derived from the price history. Values are keyed on the estimator
+## parameters and only live while (tick, last close) stays the same, so a loop pass that finds no
+## new bar reuses them instead of redoing the math. Signals are computed lazily on first read.
+##
+## Underneath, a ReturnIndex of prefix sums is fed only the bars it has not seen and revises the
+## in-progress bar in place, so a refresh costs O(1) whatever the tick and any lookback, or a whole
+## term structure of them, is answered from the same index.
+class SignalCache:
+
+    def __init__(self, history):
+        self.history = history
+        self.key = None
+        self.values = {}
+        self.indexes = {}
+
+    def invalidate(self):
+        self.values = {}
+
+    ## Call when the history moved. Drops every cached value if a bar landed or the last close moved
+    def refresh(self):
+        key = (self.history.last_tick, self.history.last_close)
+        if key != self.key:
+            self.key = key
+            self.invalidate()
+
+    def get(self, key, compute):
+        if key not in self.values:
+            self.values[key] = compute()
+        return self.values[key]
+
+    def index(self, time_step = 1):
+
+        index, last_tick = self.indexes.get(time_step, (None, -1))
+        history = self.history
+
+        ## Bars between our last one and the newest, starting with the one we last saw in progress
+        bars = history.window(history.last_tick - last_tick + 1)
+        if index is None or last_tick > history.last_tick or bars.shape[0] == 0 or bars[0, 0] != last_tick:
+            index = ReturnIndex(capacity = history.size, time_step = time_step)
+            index.extend(history.close)
+        else:
+            index.revise(bars[0, 4])
+            for close in bars[1:, 4]:
+                index.update(close)
+
+        self.indexes[time_step] = (index, history.last_tick)
+        return index
+
+    ## None means the full history window
+    def lookback(self, lookback):
+        return self.history.size if lookback is None else lookback
+
+    def vol(self, time_step = 1):
+        return self.get(
+            ('vol', time_step),
+            lambda: self.index(time_step).c2c_vol(self.lookback(None))
+        )
+
+    ## Full sample trend when lookback is None, trailing `lookback` bars otherwise
+    def trend(self, lookback = None, time_step = 1):
+        return self.get(
+            ('trend', lookback, time_step),
+            lambda: self.index(time_step).z_score(self.lookback(lookback))
+        )
+
+    ## (mu, |z|) arrays for several lookbacks in one vectorised pass
+    def term_structure(self, lookbacks, time_step = 1):
+        return self.get(
+            ('term_structure', tuple(lookbacks), time_step),
+            lambda: self.index(time_step).z_score(np.array([self.lookback(l) for l in lookbacks]))
+        )
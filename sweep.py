@@ -0,0 +1,137 @@
+from datetime import datetime
+from itertools import product
+from pathlib import Path
+from time import monotonic
+from orchestrator import get_cores
+from backtest import Backtest
+from matching import MATCHERS
+from policies import POLICIES
+from tape import Tape, sessions
+import multiprocessing as mp
+import pandas as pd
+import numpy as np
+import sys, os
+
+###################################################################################################
+
+## python sweep.py <version> [<PARAMETER>=<value>,<value>,... ...] [<session> ...], e.g.
+##
+##     python sweep.py v4 VOL_CALIBRATION=0.5,1,1.5 MAX_HOLDING_PERIOD=None,20 10001 10002
+##
+## Backtests every point of the grid on every session (all of data/ when none are given) on a pool
+## of one process per core and writes the results, ranked by total PnL then drawdown, to
+## logs/<stamp>_sweep_<version>.csv. Parameters on the command line replace their row of GRID, any
+## Policy attribute can be swept that way. RIT_MATCHER picks the fill model like for backtest.py.
+
+DIR = Path(os.path.dirname(os.path.realpath(__file__)))
+
+## ROLLING_TREND_LOOKBACK only feeds the rolling trend, which no policy quotes off yet, so it is
+## left out here and only worth sweeping from the command line
+GRID = {
+    'VOL_CALIBRATION': [0.3, 0.5, 1, 1.5],
+    'TREND_SKEW_CALIBRATION': [None, 0.5, 1, 2],
+    'INVENTORY_SKEW_CALIBRATION': [1, 2, 3],
+    'STOP_LOSS_CALIBRATION': [None, 1, 2],
+    'OLD_ORDER_CALIBRATION': [None, 7],
+    'MAX_HOLDING_PERIOD': [None, 10, 20],
+}
+
+## Loaded once in the parent. Workers are forked, so they all read the parent's arrays in place
+## instead of each loading and holding their own copy.
+TAPES = {}
+
+def parse_value(text):
+    if text == "None":
+        return None
+    try:
+        return int(text)
+    except ValueError:
+        return float(text)
+
+def parse_args(args):
+    grid, replayed = dict(GRID), []
+    for arg in args:
+        if "=" in arg:
+            key, values = arg.split("=")
+            grid[key] = [parse_value(value) for value in values.split(",")]
+        else:
+            replayed.append(arg)
+    return grid, replayed or sessions()
+
+def points(grid):
+    return [dict(zip(grid, values)) for values in product(*grid.values())]
+
+###################################################################################################
+
+def init(replayed):
+    for session in replayed:
+        if session not in TAPES:
+            TAPES[session] = Tape.load(session)
+
+## One grid point on every session. A fresh policy per session, they keep state between ticks.
+def evaluate(task):
+    i, name, params, matcher = task
+    policy = type(POLICIES[name].__name__, (POLICIES[name],), params)
+    results = []
+    for session, tape in TAPES.items():
+        backtest = Backtest(policy(), tape, MATCHERS[matcher](tape)).run()
+        results.append((session, backtest.account.realized, backtest.drawdown(), backtest.account.commission))
+    return i, results
+
+def rank(grid, tasks, results):
+    rows = []
+    for i, name, params, matcher in tasks:
+        row = {key: "None" if value is None else value for key, value in params.items()}
+        pnl = np.array([r[1] for r in results[i]])
+        row['pnl'] = pnl.sum()
+        row['worst'] = pnl.min()
+        row['drawdown'] = max(r[2] for r in results[i])
+        row['commission'] = sum(r[3] for r in results[i])
+        for session, session_pnl, drawdown, commission in results[i]:
+            row[f"pnl_{session}"] = session_pnl
+        rows.append(row)
+
+    table = pd.DataFrame(rows)
+    table['pnl_rank'] = table.pnl.rank(ascending = False, method = 'min').astype(int)
+    table['drawdown_rank'] = table.drawdown.rank(method = 'min').astype(int)
+    return table.sort_values(['pnl', 'drawdown'], ascending = [False, True]).reset_index(drop = True)
+
+def sweep(name, grid, replayed, matcher = "cross", processes = None):
+
+    TAPES.clear()
+    for session in replayed:
+        TAPES[session] = Tape.load(session)
+    tasks = [(i, name, params, matcher) for i, params in enumerate(points(grid))]
+    processes = processes or len(get_cores())
+
+    start = monotonic()
+    results = {}
+    context = mp.get_context("fork" if "fork" in mp.get_all_start_methods() else "spawn")
+    with context.Pool(processes, initializer = init, initargs = (replayed,)) as pool:
+        chunksize = max(1, len(tasks) // (processes * 8))
+        for i, result in pool.imap_unordered(evaluate, tasks, chunksize):
+            results[i] = result
+            if len(results) % max(1, len(tasks) // 20) == 0:
+                print(f"{len(results)}/{len(tasks)} points, {monotonic() - start:.1f}s", flush = True)
+
+    print(f"{len(tasks)} points x {len(replayed)} sessions on {processes} processes in {monotonic() - start:.1f}s")
+    return rank(grid, tasks, results)
+
+def main():
+
+    name = sys.argv[1]
+    grid, replayed = parse_args(sys.argv[2:])
+    matcher = os.environ.get("RIT_MATCHER", "cross")
+    table = sweep(name, grid, replayed, matcher)
+
+    stamp = datetime.now().isoformat()[:-10].replace(":", "_").replace("-", "_")
+    path = DIR / "logs" / f"{stamp}_sweep_{name}.csv"
+    table.to_csv(path, index = False)
+
+    with pd.option_context('display.width', 200, 'display.max_columns', 20):
+        print(table[list(grid) + ['pnl', 'worst', 'drawdown', 'commission', 'pnl_rank', 'drawdown_rank']].head(20).to_string())
+    print("Results in", path)
+
+if __name__ == '__main__':
+
+    main()
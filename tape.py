@@ -0,0 +1,59 @@
+from pathlib import Path
+import pandas as pd
+import numpy as np
+import os
+
+###################################################################################################
+
+DIR = Path(os.path.dirname(os.path.realpath(__file__)))
+
+HISTCOLS = ['tick', 'open', 'high', 'low', 'close']
+TASCOLS = ['id', 'period', 'tick', 'price', 'quantity']
+
+## One recorded case session, `data/ohlc_<session>.csv` and `data/tas_<session>.csv`, as plain
+## arrays. `bars` is indexed by tick (row t is tick t, ticks before the first bar repeat its open)
+## and prints are in tick order with `tas_end[t]` the number of prints up to and including tick t,
+## so everything the server knew at tick t is a slice. The captures were paged newest first, so
+## prints are renumbered 1..n in tick order to give ids that grow with time like the live ones.
+class Tape:
+
+    def __init__(self, session, ohlc, tas):
+        self.session = session
+        self.first_tick = int(ohlc.tick.min())
+        self.last_tick = int(ohlc.tick.max())
+
+        self.bars = np.zeros((self.last_tick + 1, len(HISTCOLS)))
+        self.bars[:, 0] = np.arange(self.last_tick + 1)
+        self.bars[:self.first_tick, 1:] = ohlc.open.iloc[0]
+        self.bars[ohlc.tick.values, 1:] = ohlc[HISTCOLS[1:]].values
+
+        tas = tas.sort_values(['tick', 'id'], kind = 'stable')
+        self.tas_id = np.arange(1, tas.shape[0] + 1, dtype = np.int64)
+        self.tas_tick = np.minimum(tas.tick.values.astype(np.int64), self.last_tick)
+        self.tas_price = tas.price.values.astype(float)
+        self.tas_quantity = tas.quantity.values.astype(float)
+        self.tas_end = np.searchsorted(self.tas_tick, np.arange(self.last_tick + 1), side = 'right')
+
+    @classmethod
+    def load(cls, session):
+        ohlc = pd.read_csv(DIR / "data" / f"ohlc_{session}.csv")
+        tas = pd.read_csv(DIR / "data" / f"tas_{session}.csv")
+        return cls(session, ohlc, tas)
+
+    @property
+    def close(self):
+        return self.bars[:, 4]
+
+    ## Prints of tick t, as (id, price, quantity) arrays
+    def prints(self, tick):
+        start = self.tas_end[tick - 1] if tick > 0 else 0
+        end = self.tas_end[tick]
+        return self.tas_id[start:end], self.tas_price[start:end], self.tas_quantity[start:end]
+
+## Every session with both captures in data/
+def sessions():
+    return sorted(
+        path.stem[len("ohlc_"):]
+        for path in (DIR / "data").glob("ohlc_*.csv")
+        if (DIR / "data" / f"tas_{path.stem[len('ohlc_'):]}.csv").exists()
+    )
@@ -0,0 +1,86 @@
+from time import monotonic, sleep
+from api import BASE_URL, ApiException
+
+###################################################################################################
+
+DEFAULT_PERIOD = 1
+MIN_GUARD = 0.02
+DENSE_INTERVAL = 0.005
+IDLE_INTERVAL = 0.05
+PERIOD_SMOOTHING = 0.2
+
+## Tick clock for /v1/case. Learns how long a tick lasts from when we see it roll, sleeps until just
+## before the next expected boundary and only polls densely around it. Listeners get called with
+## the new tick every time it changes. A rejected API key raises, any other failed poll is polled
+## again, so `wait` always comes back with a tick.
+class TickClock:
+
+    def __init__(self, guard = MIN_GUARD, dense_interval = DENSE_INTERVAL, idle_interval = IDLE_INTERVAL):
+        self.guard = guard
+        self.dense_interval = dense_interval
+        self.idle_interval = idle_interval
+        self.tick = None
+        self.period = None
+        self.rtt = 0
+        self.changed_at = None
+        self.listeners = []
+
+    def subscribe(self, listener):
+        self.listeners.append(listener)
+
+    def poll(self, session):
+        sent = monotonic()
+        resp = session.get(f"{BASE_URL}/case")
+        received = monotonic()
+        if resp.status_code == 401:
+            raise ApiException("Auth Error. Check API Key")
+        if not resp.ok:
+            return False
+
+        self.rtt = (1 - PERIOD_SMOOTHING) * self.rtt + PERIOD_SMOOTHING * (received - sent)
+        tick = resp.json()['tick']
+        if tick == self.tick:
+            return False
+
+        ## The roll happened somewhere inside the request, call it the midpoint
+        now = (sent + received) / 2
+        if self.tick is not None and self.changed_at is not None and tick > self.tick:
+            period = (now - self.changed_at) / (tick - self.tick)
+            if self.period is None:
+                self.period = period
+            else:
+                self.period = (1 - PERIOD_SMOOTHING) * self.period + PERIOD_SMOOTHING * period
+
+        self.changed_at = now if self.tick is not None else None
+        self.tick = tick
+        for listener in self.listeners:
+            listener(tick)
+        return True
+
+    def next_boundary(self):
+        if self.period is None or self.changed_at is None:
+            return None
+        return self.changed_at + self.period
+
+    def wait(self, session):
+
+        if self.tick is None:
+            while not self.poll(session):
+                sleep(self.idle_interval)
+            return self.tick
+
+        ## Sleep through the quiet part of the tick, keep a margin for jitter and the round trip
+        boundary = self.next_boundary()
+        if boundary is not None:
+            delay = boundary - monotonic() - max(self.guard, 2 * self.rtt)
+            if delay > 0:
+                sleep(delay)
+
+        ## Poll densely around the boundary, backing off if the case is paused
+        interval = self.dense_interval if boundary is not None else self.idle_interval
+        while not self.poll(session):
+            sleep(interval)
+            if boundary is not None and monotonic() > boundary + (self.period or DEFAULT_PERIOD):
+                interval = min(interval * 2, self.idle_interval)
+
+        return self.tick
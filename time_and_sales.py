@@ -0,0 +1,90 @@
+from api import BASE_URL
+import pandas as pd
+import numpy as np
+
+###################################################################################################
+
+TAS_SIZE = 300
+
+## Incremental Time & Sales aggregator. Remembers the last trade id it saw and only asks for newer
+## prints with `after`, folding them into per-tick count / volume arrays. The time factor is kept
+## as a running sum of per-tick terms so reading it does not touch the history either. `low` and
+## `high` are the price range of the prints the last update brought in (None if there were none).
+class TimeAndSales:
+
+    def __init__(self, ticker = "ALGO", size = TAS_SIZE):
+        self.ticker = ticker
+        self.size = size
+        self.count = np.zeros(size)
+        self.total_volume = np.zeros(size)
+        self.factor_terms = np.zeros(size)
+        self.factor_sum = 0
+        self.n_ticks = 0
+        self.last_id = -1
+        self.last_tick = -1
+        self.low, self.high = None, None
+
+    def reset(self):
+        self.count[:] = 0
+        self.total_volume[:] = 0
+        self.factor_terms[:] = 0
+        self.factor_sum = 0
+        self.n_ticks = 0
+        self.last_id = -1
+        self.last_tick = -1
+
+    def update(self, session, tick = None):
+
+        ## A tick behind our newest print means a new case started
+        if tick is not None and tick < self.last_tick:
+            self.reset()
+
+        url = f"{BASE_URL}/securities/tas?ticker={self.ticker}"
+        if self.last_id >= 0:
+            url += f"&after={self.last_id}"
+        resp = session.get(url)
+        if not resp.ok:
+            return False
+
+        touched = set()
+        last_id = self.last_id
+        self.low, self.high = None, None
+        for trade in resp.json():
+            if trade['id'] <= self.last_id:
+                continue
+            if trade['id'] > last_id:
+                last_id = trade['id']
+            slot = trade['tick'] % self.size
+            self.count[slot] += 1
+            self.total_volume[slot] += trade['quantity']
+            touched.add(slot)
+            if self.low is None or trade['price'] < self.low:
+                self.low = trade['price']
+            if self.high is None or trade['price'] > self.high:
+                self.high = trade['price']
+            if trade['tick'] > self.last_tick:
+                self.last_tick = trade['tick']
+
+        for slot in touched:
+            if self.factor_terms[slot] == 0:
+                self.n_ticks += 1
+            term = (self.total_volume[slot] / self.count[slot] / (self.total_volume[slot] + 1)) ** 2
+            self.factor_sum += term - self.factor_terms[slot]
+            self.factor_terms[slot] = term
+        self.last_id = last_id
+
+        return True
+
+    @property
+    def time_factor(self):
+        if self.n_ticks == 0:
+            return 0
+        return self.factor_sum / self.n_ticks
+
+    def to_frame(self):
+        slots = np.flatnonzero(self.count)
+        return pd.DataFrame({
+            'tick': slots,
+            'avg_trade_volume': self.total_volume[slots] / self.count[slots],
+            'total_volume': self.total_volume[slots]
+        })
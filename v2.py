@@ -1,4 +1,13 @@
 from volatility_estimators import *
+from order_book import OrderBook
+from tick_clock import TickClock
+from rate_limiter import RateLimiter, RISK, CANCEL, QUOTE
+from order_gateway import OrderGateway
+from liquidation import LiquidationScheduler
+from time_and_sales import TimeAndSales
+from price_history import PriceHistory
+from signal_cache import SignalCache
+from order_reconciler import OrderReconciler
 from logger import DIR, logger
 from config import API_KEY
 from time import sleep
@@ -27,6 +36,7 @@ VOL_CALIBRATION = 0.3
 TREND_SKEW_CALIBRATION = 1
 INVENTORY_SKEW_CALIBRATION = 2
 STOP_LOSS_CALIBRATION = 1
+STOP_LOSS_TICKS = 3
 
 START_TICK = 10
 END_TICK = 290
@@ -45,19 +55,11 @@ data = {
     'realized_profit': 0,
 
     ## Order Book Info
-    'bid_ladder': pd.DataFrame(),
-    'ask_ladder': pd.DataFrame(),
     'bid_vwap': 0,
     'ask_vwap': 0,
     'LOB_imbalance': 0,
     'LOB_mass_imbalance': 0,
 
-    ## Price History
-    'ohlc': pd.DataFrame(),
-
-    ## Time & Sales
-    'tas': pd.DataFrame(),
-    
     ## Calculated Metrics
     'gtrend': 0,
     'trend': 0,
@@ -90,6 +92,8 @@ def get_tick(session, data):
         return data
     return ApiException("Auth Error. Check API Key")
 
+clock = TickClock()
+
 def get_security_info(session, data):
     resp = session.get("http://localhost:9999/v1/securities?ticker=ALGO")
     if resp.ok:
@@ -104,70 +108,36 @@ def get_security_info(session, data):
         return data
     return ApiException("Auth Error. Check API Key")
 
-OBKEYS = ['price', 'quantity', 'quantity_filled']
-def aggregate_order_book(items, ascending):
-    df = pd.DataFrame(
-        [
-            {
-                key: bid[key]
-                for key in OBKEYS
-            }
-            for bid in items
-            if bid['status'] == "OPEN"
-        ],
-        columns = OBKEYS
-    )
-    df['quantity'] = df.quantity - df.quantity_filled
-    df = df[df.quantity != 0].drop('quantity_filled', axis=1)
-    df = df.groupby('price').sum().sort_index(ascending = ascending).reset_index()
-    vwap = (df.price * (df.quantity / df.quantity.sum())).sum()
-    return df, vwap
-
+book = OrderBook()
 def get_order_book(session, data):
     resp = session.get(f"http://localhost:9999/v1/securities/book?ticker=ALGO&limit={BOOK_LIMIT}")
     if resp.ok:
-        resp = resp.json()
-        data['bid_ladder'], data['bid_vwap'] = aggregate_order_book(resp['bids'], False)
-        data['ask_ladder'], data['ask_vwap'] = aggregate_order_book(resp['asks'], False)
-        if data['bid_ladder'].shape[0] == 0 or data['ask_ladder'].shape[0] == 0:
+        book.update(resp.json())
+        data['bid_vwap'], data['ask_vwap'] = book.bid_vwap, book.ask_vwap
+        if book.empty:
             return data
-                
-        bid_volume = data['bid_ladder'].quantity.sum()
-        ask_volume = data['ask_ladder'].quantity.sum()
-        data['LOB_imbalance'] = (bid_volume - ask_volume) / (bid_volume + ask_volume)
 
-        bid_vwap_spread = data['mid'] - data['bid_vwap']
-        ask_vwap_spread = data['ask_vwap'] - data['mid']
-        data['LOB_mass_imbalance'] =  (ask_vwap_spread - bid_vwap_spread) / (bid_vwap_spread + ask_vwap_spread)
+        data['LOB_imbalance'] = book.imbalance()
+        data['LOB_mass_imbalance'] = book.mass_imbalance(data['mid'])
 
         return data
 
     return ApiException("Auth Error. Check API Key")
 
-HISTCOLS = ['tick', 'open', 'high', 'low', 'close']
+history = PriceHistory()
+signals = SignalCache(history)
 def get_price_history(session, data):
-    resp = session.get(f"http://localhost:9999/v1/securities/history?ticker=ALGO")
-    if resp.ok:
-        
-        data['ohlc'] = pd.DataFrame(resp.json(), columns = HISTCOLS).sort_values('tick', ascending = True)
-        
-        data['vol'] = c2c_vol(data['ohlc'], time_step=1)
-        data['gtrend'], data['gtrend_confidence'] = z_score_trend_indicator(data['ohlc'].close)
-
-        df = data['ohlc'].iloc[-ROLLING_TREND_LOOKBACK:].copy()
-        data['trend'], data['trend_confidence'] = z_score_trend_indicator(df.close)
-
+    if history.update(session, data['tick']):
+        if history.changed:
+            signals.refresh()
         return data
     return ApiException("Auth Error. Check API Key")
 
-TASCOLS = ['id', 'period', 'tick', 'price', 'quantity']
+time_and_sales = TimeAndSales()
 def get_time_and_sales(session, data):
-    resp = session.get(f"http://localhost:9999/v1/securities/tas?ticker=ALGO")
-    if resp.ok:
-        df = pd.DataFrame(resp.json(), columns = TASCOLS).sort_values('tick', ascending = True)
-        df = df.groupby('tick').agg({'quantity': ['mean', 'sum']}).reset_index()
-        df.columns = ['tick', 'avg_trade_volume', 'total_volume']
-        data['tas'] = df
+    if time_and_sales.update(session, data['tick']):
+        data['time_factor'] = time_and_sales.time_factor
+        return data
     return ApiException("Auth Error. Check API Key")
 
 def get_open_orders(session):
@@ -260,32 +230,39 @@ def get_liquidating_orders(data, isMarket = False):
     orders.append(build_order("MARKET" if isMarket else "LIMIT", r, price, action))
     return [order for order in orders if order['quantity'] != 0]
 
-## Subject to rate limits
-def send_order(session, order):
+liquidation = LiquidationScheduler(MAX_VOLUME)
+unwind = LiquidationScheduler(MAX_VOLUME)
+
+limiter = RateLimiter(API_KEY)
+gateway = OrderGateway(API_KEY, limiter)
+
+## Subject to rate limits. Queued on the shared limiter, which paces it and retries it on 429
+def queue_order(session, order, priority = QUOTE, ttl = None):
     if order['type'] == "MARKET": order['dry_run'] = 0
-    resp = session.post("http://localhost:9999/v1/orders", params = order)
-    if resp.status_code == 429:
-        sleep(resp.json()['wait'] / 1_000)
-        resp = session.post("http://localhost:9999/v1/orders", params = order)
+    return limiter.submit("POST", "http://localhost:9999/v1/orders", params = order, priority = priority, ttl = ttl)
+
+def send_order(session, order, priority = QUOTE):
+    resp = queue_order(session, order, priority).result()
     if resp.ok:
         return resp.json()['order_id']
     return ApiException("Auth Error. Check API Key")
 
-def cancel_all_orders(session):
-    resp = session.post(f"http://localhost:9999/v1/commands/cancel?all=1")
+def cancel_all_orders(session, priority = CANCEL):
+    resp = limiter.call("POST", f"http://localhost:9999/v1/commands/cancel?all=1", priority = priority)
     if resp.ok:
         print("Cacelled All Orders")
     return ApiException("Auth Error. Check API Key")
 
+reconciler = OrderReconciler(limiter)
+
 def vol_spreading(data, calibration):
-    ohlc = data['ohlc']
-    tas = data['tas']
-    data['time_factor'] = ((tas['avg_trade_volume'] / (tas['total_volume'] + 1)) ** 2).values.mean()
+    data['vol'] = signals.vol()
     data['vol_spread'] = round(calibration * data['vol'] * data['mid'], 2)
 
     # data['vol_spread'] = round(calibration * data['time_factor'] * data['vol'] * data['mid'], 2)
 
 def trend_skewing(data):
+    data['gtrend'], data['gtrend_confidence'] = signals.trend()
     ask = data['mid'] + data['vol_spread']
     bid = data['mid'] - data['vol_spread']
 
@@ -336,20 +313,18 @@ def stop_loss(data):
 
     if pnl < pnl_threshold:
         print("Threshold Breached.", pnl_threshold, pnl)
-        return get_liquidating_orders(data, isMarket = True)
+        unwind.start(data['tick'], data['tick'] + STOP_LOSS_TICKS - 1, isMarket = True)
+        return unwind.orders(data)
     else:
         return [] 
 
-def init_log():
-    logger.info("tick,last,bid,mid,ask,bid_vwap,ask_vwap,LOB_imbalance,LOB_mass_imbalance,vol,time_factor,vol_spread,trend,trend_confidence,gtrend,gtrend_confidence,position,current_bid,position_vwap,current_ask")
-
 def init_log():
     logger.info("tick,last,bid,mid,ask,current_bid,mid,current_ask,position,position_vwap,pnl,pnl_threshold,realized")
 
 def log(data):
-    logger.info(f"{data['tick']},{data['last']},{data['bid']},{data['mid']},{data['ask']},{data['bid_vwap']},{data['ask_vwap']},{data['LOB_imbalance']},{data['LOB_mass_imbalance']},{data['vol']},{data['time_factor']},{data['vol_spread']},{data['trend']},{data['trend_confidence']},{data['gtrend']},{data['gtrend_confidence']},{data['position']},{data['current_bid']},{data['position_vwap']},{data['current_ask']}")
-
-def log(data):
+    data['vol'] = signals.vol()
+    data['gtrend'], data['gtrend_confidence'] = signals.trend()
+    data['trend'], data['trend_confidence'] = signals.trend(ROLLING_TREND_LOOKBACK)
     logger.info(f"{data['tick']},{data['last']},{data['bid']},{data['mid']},{data['ask']},{data['current_bid']},{data['mid']},{data['current_ask']},{data['position']},{data['position_vwap']},{data['pnl']},{data['pnl_threshold']},{data['realized_profit']}")
 
 ###################################################################################################
@@ -372,15 +347,15 @@ def main():
             ## Dont trade for first 5 ticks
             get_tick(session, data)
             if data['tick'] < START_TICK:
+                clock.wait(session)
                 continue
 
             ## Liquidate everything with 10 ticks remaining
             if data['tick'] > END_TICK:
                 # get_order_book(session, data)
-                cancel_all_orders(session)
-                orders = get_liquidating_orders(data)
-                for order in orders:
-                    send_order(session, order)
+                ## Spread over the ticks left instead of dumping the whole position on every pass
+                liquidation.start(data['tick'], 299)
+                reconciler.reconcile(session, liquidation.orders(data), gateway.submit, RISK)
 
             get_security_info(session, data)
             get_price_history(session, data)
@@ -388,8 +363,6 @@ def main():
             # get_order_book(session, data)        
 
             if data['tick'] != tick and data['position'] == 0:
-
-                cancel_all_orders(session)    
                 
                 vol_spreading(data, VOL_CALIBRATION)
                 bid, ask = trend_skewing(data)
@@ -398,19 +371,21 @@ def main():
                 data['current_ask'] = ask
 
                 buy_orders, sell_orders = get_orders(data, bid, ask)
-                for order in sell_orders:
-                    send_order(session, order)
-                for order in buy_orders:
-                    send_order(session, order)
+                reconciler.reconcile(session, sell_orders + buy_orders, queue_order, QUOTE, clock.period)
 
                 stop_loss_active = True
 
             if stop_loss_active:
                 ## Monitor and Kill Positions
-                for order in stop_loss(data):
-                    send_order(session, order)
+                orders = stop_loss(data)
+                if len(orders) != 0:
+                    gateway.send(orders)
                     stop_loss_active = False
 
+            ## A breached position is unwound one market slice per tick
+            elif unwind.active:
+                gateway.send(unwind.orders(data))
+
             tick = data['tick']
             log(data)
 
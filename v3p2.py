@@ -1,4 +1,10 @@
 from volatility_estimators import *
+from tick_clock import TickClock
+from rate_limiter import RateLimiter, RISK, CANCEL, QUOTE
+from order_gateway import OrderGateway
+from cancel_service import CancelService
+from order_registry import OrderRegistry
+from time_and_sales import TimeAndSales
 from logger import DIR, logger
 from config import API_KEY
 from time import sleep
@@ -58,8 +64,9 @@ data = {
 	'current_ask': 0,
 
 	## Order Stuff
-	'bid_orders': [],
-	'ask_orders': []
+	'bid_orders': OrderRegistry(),
+	'ask_orders': OrderRegistry(),
+	'odd_lot_orders': OrderRegistry()
 }
 
 ###################################################################################################
@@ -79,6 +86,8 @@ def get_tick(session, data):
 		return data
 	return ApiException("Auth Error. Check API Key")
 
+clock = TickClock()
+
 def get_security_info(session, data):
 	resp = session.get("http://localhost:9999/v1/securities?ticker=ALGO")
 	if resp.ok:
@@ -124,14 +133,11 @@ def get_order_details(session, _id):
 	if resp.ok: return resp.json()
 	return ApiException("Auth Error. Check API Key")
 
-TASCOLS = ['id', 'period', 'tick', 'price', 'quantity']
+time_and_sales = TimeAndSales()
 def get_time_and_sales(session, data):
-    resp = session.get(f"http://localhost:9999/v1/securities/tas?ticker=ALGO")
-    if resp.ok:
-        df = pd.DataFrame(resp.json(), columns = TASCOLS).sort_values('tick', ascending = True)
-        df = df.groupby('tick').agg({'quantity': ['mean', 'sum']}).reset_index()
-        df.columns = ['tick', 'avg_trade_volume', 'total_volume']
-        data['time_factor'] = ((df['avg_trade_volume'] / (df['total_volume'] + 1)) ** 2).values.mean()
+    if time_and_sales.update(session, data['tick']):
+        data['time_factor'] = time_and_sales.time_factor
+        return data
     return ApiException("Auth Error. Check API Key")
 
 def build_order(_type, quantity, price, action):
@@ -185,32 +191,35 @@ def execute_orders(session, data, bid, ask, open_bids, open_asks):
 
 	bid_order = build_order("LIMIT", MAX_VOLUME, bid, "BUY")
 	bid_oid = send_order(session, bid_order)
-	data['bid_orders'].append((bid_oid, bid, data['tick'], MAX_VOLUME))
+	data['bid_orders'].add(bid_oid, bid, data['tick'], MAX_VOLUME)
 
 	ask_order = build_order("LIMIT", MAX_VOLUME, ask, "SELL")
 	ask_oid = send_order(session, ask_order)
-	data['ask_orders'].append((ask_oid, ask, data['tick'], MAX_VOLUME))
+	data['ask_orders'].add(ask_oid, ask, data['tick'], MAX_VOLUME)
 
 	r = abs(data['position']) % MAX_VOLUME
 	if r == 0:
 		orders = open_bids if data['position'] > 0 else open_asks
 		for order in orders:
 			if order['quantity'] % MAX_VOLUME == 0: continue
-			cancel_order(session, order['order_id'])
+			cancels.cancel(order['order_id'])
+		flush_cancels(session, data)
 		return
 
-	action, price, key = ("SELL", ask, "ask_orders") if data['position'] > 0 else ("BUY", bid, "bid_orders")
-	order = build_order("LIMIT", r, price, key)
+	## Odd lots are registered apart so they never count for the proximity check
+	action, price = ("SELL", ask) if data['position'] > 0 else ("BUY", bid)
+	order = build_order("LIMIT", r, price, action)
 	
 	oid = send_order(session, order)
-	data[key].append((oid, price, data['tick'], r))
+	data['odd_lot_orders'].add(oid, price, data['tick'], r)
+
+limiter = RateLimiter(API_KEY)
+gateway = OrderGateway(API_KEY, limiter)
 
-def send_order(session, order):
+## Subject to rate limits. Paced by the shared limiter, which retries on 429
+def send_order(session, order, priority = QUOTE):
 	if order['type'] == "MARKET": order['dry_run'] = 0
-	resp = session.post("http://localhost:9999/v1/orders", params = order)
-	if resp.status_code == 429:
-		sleep(resp.json()['wait'] / 1_000)
-		resp = session.post("http://localhost:9999/v1/orders", params = order)
+	resp = limiter.call("POST", "http://localhost:9999/v1/orders", params = order, priority = priority)
 	if resp.ok:
 		return resp.json()['order_id']
 	return ApiException("Auth Error. Check API Key")
@@ -231,32 +240,37 @@ def get_liquidating_orders(data, isMarket = False):
 	return [order for order in orders if order['quantity'] != 0]
 
 def liquidate_position(session, data, isMarket = False):
-	cancel_all_orders(session)
-	orders = get_liquidating_orders(data, isMarket)
-	for order in orders:
-		send_order(session, order)
+	cancel_all_orders(session, RISK)
+	gateway.send(get_liquidating_orders(data, isMarket))
 
 def cancel_order(session, order_id):
-	resp = session.delete(f"http://localhost:9999/v1/orders/{order_id}")
+	resp = limiter.call("DELETE", f"http://localhost:9999/v1/orders/{order_id}", priority = CANCEL)
 	if resp.ok:
 		print(f"Order {order_id} Canceled")
 	return ApiException("Auth Error. Check API Key")
 
-def cancel_all_orders(session):
-	resp = session.post(f"http://localhost:9999/v1/commands/cancel?all=1")
+def cancel_all_orders(session, priority = CANCEL):
+	resp = limiter.call("POST", f"http://localhost:9999/v1/commands/cancel?all=1", priority = priority)
 	if resp.ok:
 		print("Cacelled All Orders")
 	return ApiException("Auth Error. Check API Key")
 
+cancels = CancelService(limiter)
+
+## Stale orders are only queued here and stay registered until main gets the bulk cancel confirmed
 def cancel_old_orders(session, data, orders, open_orders):
-	new_oids = []
-	for (oid, price, _tick, qty) in orders:
-		if oid not in open_orders: continue
-		elif data['tick'] - _tick > OLD_ORDER_CALIBRATION:
-			cancel_order(session, oid)
-		else:
-			new_oids.append((oid, price, _tick, qty))
-	return new_oids
+	orders.retain(open_orders)
+	for oid in orders.expired(data['tick'], OLD_ORDER_CALIBRATION):
+		cancels.cancel(oid)
+	return orders
+
+def flush_cancels(session, data):
+	cancelled = cancels.flush(session)
+	for oid in cancelled:
+		data['bid_orders'].discard(oid)
+		data['ask_orders'].discard(oid)
+		data['odd_lot_orders'].discard(oid)
+	return cancelled
 
 ## Bid / Ask Functions
 def vol_spreading(data, calibration):
@@ -338,6 +352,7 @@ def main():
 			## Dont trade for first n ticks
 			get_tick(session, data)
 			if data['tick'] < START_TICK:
+				clock.wait(session)
 				continue
 
 			## Liquidate everything with 10 ticks remaining
@@ -363,13 +378,15 @@ def main():
 
 				open_orders = get_open_orders(session)
 				open_bids = [order for order in open_orders if order['action'] == "BUY"]
-				open_bid_oids = [order['order_id'] for order in open_bids]
+				open_bid_oids = set(order['order_id'] for order in open_bids)
 
 				open_asks = [order for order in open_orders if order['action'] == "SELL"]
-				open_ask_oids = [order['order_id'] for order in open_asks]
+				open_ask_oids = set(order['order_id'] for order in open_asks)
 
 				data['bid_orders'] = cancel_old_orders(session, data, data['bid_orders'], open_bid_oids)
 				data['ask_orders'] = cancel_old_orders(session, data, data['ask_orders'], open_ask_oids)
+				data['odd_lot_orders'] = cancel_old_orders(session, data, data['odd_lot_orders'], open_bid_oids | open_ask_oids)
+				flush_cancels(session, data)
 
 				###################################################################################
 				## Bid / Ask Skewing
@@ -401,16 +418,8 @@ def main():
 				###################################################################################
 				## Order Placement
 
-				noSimilarBid = all(
-					abs(bid - order[1]) > data['vol_spread'] * ORDER_PROXIMITY_CALIBRATION
-					for order in data['bid_orders']
-					if (order[-1] % MAX_VOLUME) == 0
-				)
-				noSimilarAsk = all(
-					abs(ask - order[1]) > data['vol_spread'] * ORDER_PROXIMITY_CALIBRATION
-					for order in data['ask_orders']
-					if (order[-1] % MAX_VOLUME) == 0
-				)
+				noSimilarBid = not data['bid_orders'].near(bid, data['vol_spread'] * ORDER_PROXIMITY_CALIBRATION)
+				noSimilarAsk = not data['ask_orders'].near(ask, data['vol_spread'] * ORDER_PROXIMITY_CALIBRATION)
 				if (noSimilarBid or noSimilarAsk):
 					execute_orders(session, data, bid, ask, open_bids, open_asks)
 
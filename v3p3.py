@@ -1,4 +1,13 @@
 from volatility_estimators import *
+from tick_clock import TickClock
+from rate_limiter import RateLimiter, RISK, CANCEL, QUOTE
+from order_gateway import OrderGateway
+from liquidation import LiquidationScheduler
+from cancel_service import CancelService
+from order_registry import OrderRegistry
+from order_ledger import OrderLedger
+from price_history import PriceHistory
+from signal_cache import SignalCache
 from logger import DIR, logger
 from config import API_KEY
 from time import sleep
@@ -30,6 +39,7 @@ MAX_HOLDING_PERIOD = 20
 
 START_TICK = 10
 END_TICK = 290
+HEDGE_TICKS = 3
 
 data = {
 	## Case Info
@@ -56,8 +66,8 @@ data = {
 	'current_ask': 0,
 
 	## Order Stuff
-	'bid_orders': [],
-	'ask_orders': []
+	'bid_orders': OrderRegistry(),
+	'ask_orders': OrderRegistry()
 }
 
 ###################################################################################################
@@ -77,6 +87,8 @@ def get_tick(session, data):
 		return data
 	return ApiException("Auth Error. Check API Key")
 
+clock = TickClock()
+
 def get_security_info(session, data):
 	resp = session.get("http://localhost:9999/v1/securities?ticker=ALGO")
 	if resp.ok:
@@ -91,19 +103,12 @@ def get_security_info(session, data):
 		return data
 	return ApiException("Auth Error. Check API Key")
 
-HISTCOLS = ['tick', 'open', 'high', 'low', 'close']
+history = PriceHistory()
+signals = SignalCache(history)
 def get_price_history(session, data):
-	resp = session.get(f"http://localhost:9999/v1/securities/history?ticker=ALGO")
-	if resp.ok:
-		
-		ohlc = pd.DataFrame(resp.json(), columns = HISTCOLS).sort_values('tick', ascending = True)
-		
-		data['vol'] = c2c_vol(ohlc, time_step=1)
-		data['gtrend'], data['gtrend_confidence'] = z_score_trend_indicator(ohlc.close)
-
-		df = ohlc.iloc[-ROLLING_TREND_LOOKBACK:].copy()
-		data['trend'], data['trend_confidence'] = z_score_trend_indicator(df.close)
-
+	if history.update(session, data['tick']):
+		if history.changed:
+			signals.refresh()
 		return data
 	return ApiException("Auth Error. Check API Key")
 
@@ -172,14 +177,18 @@ def get_orders(data, bid, ask):
 	return buy_orders, sell_orders
 
 
-def send_order(session, order):
+limiter = RateLimiter(API_KEY)
+gateway = OrderGateway(API_KEY, limiter)
+ledger = OrderLedger()
+
+## Subject to rate limits. Paced by the shared limiter, which retries on 429
+def send_order(session, order, priority = QUOTE):
 	if order['type'] == "MARKET": order['dry_run'] = 0
-	resp = session.post("http://localhost:9999/v1/orders", params = order)
-	if resp.status_code == 429:
-		sleep(resp.json()['wait'] / 1_000)
-		resp = session.post("http://localhost:9999/v1/orders", params = order)
+	resp = limiter.call("POST", "http://localhost:9999/v1/orders", params = order, priority = priority)
 	if resp.ok:
-		return resp.json()['order_id']
+		order_id = resp.json()['order_id']
+		ledger.record(order, order_id, data['tick'])
+		return order_id
 	return ApiException("Auth Error. Check API Key")
 
 def get_liquidating_orders(data, isMarket = False):
@@ -197,39 +206,56 @@ def get_liquidating_orders(data, isMarket = False):
 	orders.append(build_order("MARKET" if isMarket else "LIMIT", r, price, action))
 	return [order for order in orders if order['quantity'] != 0]
 
-def liquidate_position(session, data, isMarket = False):
-	cancel_all_orders(session)
-	orders = get_liquidating_orders(data, isMarket)
-	for order in orders:
-		send_order(session, order)
+liquidation = LiquidationScheduler(MAX_VOLUME)
+hedger = LiquidationScheduler(MAX_VOLUME)
+
+## One slice of the unwind per tick. Limit slices are repriced by pulling everything first, a market
+## unwind only pulls our quotes when it starts
+def liquidate_position(session, data, scheduler, end_tick, isMarket = False):
+	if not (scheduler.active and isMarket):
+		cancel_all_orders(session, RISK)
+	scheduler.start(data['tick'], end_tick, isMarket)
+	orders = scheduler.orders(data)
+	for order, order_id in zip(orders, gateway.send(orders)):
+		ledger.record(order, order_id, data['tick'])
 
 def cancel_order(session, order_id):
-	resp = session.delete(f"http://localhost:9999/v1/orders/{order_id}")
+	resp = limiter.call("DELETE", f"http://localhost:9999/v1/orders/{order_id}", priority = CANCEL)
 	if resp.ok:
 		print(f"Order {order_id} Canceled")
 	return ApiException("Auth Error. Check API Key")
 
-def cancel_all_orders(session):
-	resp = session.post(f"http://localhost:9999/v1/commands/cancel?all=1")
+def cancel_all_orders(session, priority = CANCEL):
+	resp = limiter.call("POST", f"http://localhost:9999/v1/commands/cancel?all=1", priority = priority)
 	if resp.ok:
+		ledger.cancelled(list(ledger.orders))
 		print("Cacelled All Orders")
 	return ApiException("Auth Error. Check API Key")
 
+cancels = CancelService(limiter)
+cancels.subscribe(ledger.cancelled)
+
+## Stale orders are only queued here and stay registered until main gets the bulk cancel confirmed
 def cancel_old_orders(session, data, orders, open_orders):
-	new_oids = []
-	for (oid, price, _tick) in orders:
-		if oid not in open_orders: continue
-		elif data['tick'] - _tick > OLD_ORDER_CALIBRATION:
-			cancel_order(session, oid)
-		else:
-			new_oids.append((oid, price, _tick))
-	return new_oids
+	orders.retain(open_orders)
+	for oid in orders.expired(data['tick'], OLD_ORDER_CALIBRATION):
+		cancels.cancel(oid)
+	return orders
+
+def flush_cancels(session, data):
+	cancelled = cancels.flush(session)
+	for oid in cancelled:
+		data['bid_orders'].discard(oid)
+		data['ask_orders'].discard(oid)
+	return cancelled
 
 ## Bid / Ask Functions
 def vol_spreading(data, calibration):
+	data['vol'] = signals.vol()
 	data['vol_spread'] = round(calibration * data['vol'] * data['mid'], 2)
 
 def trend_skewing(data):
+	data['gtrend'], data['gtrend_confidence'] = signals.trend()
 	ask = data['mid'] + data['vol_spread']
 	bid = data['mid'] - data['vol_spread']
 
@@ -267,6 +293,7 @@ def inventory_skewing(data, bid, ask):
 
 ## Logging and Displays
 def display(data):
+	data['trend'], data['trend_confidence'] = signals.trend(ROLLING_TREND_LOOKBACK)
 
 	print("------------")
 	print("Tick", data['tick'])
@@ -301,11 +328,16 @@ def main():
 			## Dont trade for first n ticks
 			get_tick(session, data)
 			if data['tick'] < START_TICK:
+				clock.wait(session)
 				continue
 
 			## Liquidate everything with 10 ticks remaining
 			if data['tick'] > END_TICK:
-				liquidate_position(session, data)
+				if data['tick'] != tick:
+					get_security_info(session, data)
+					liquidate_position(session, data, liquidation, 299)
+					tick = data['tick']
+				clock.wait(session)
 				continue
 
 			if (data['position'] == 0 and position != 0) or init or data['tick'] != tick:
@@ -321,13 +353,15 @@ def main():
 				###################################################################################
 				## Order Management
 
-				open_orders = get_open_orders(session)
-				open_bids = [order['order_id'] for order in open_orders if order['action'] == "BUY"]
-				open_asks = [order['order_id'] for order in open_orders if order['action'] == "SELL"]
+				## Open orders come from the ledger, which only pulls the open list now and then
+				ledger.update(session, data)
+				open_bids = ledger.open["BUY"]
+				open_asks = ledger.open["SELL"]
 				print(len(open_bids), len(open_asks))
 
 				data['bid_orders'] = cancel_old_orders(session, data, data['bid_orders'], open_bids)
 				data['ask_orders'] = cancel_old_orders(session, data, data['ask_orders'], open_asks)
+				flush_cancels(session, data)
 
 				###################################################################################
 				## Bid / Ask Skewing
@@ -347,30 +381,27 @@ def main():
 					position_holding = 0
 
 				F = abs(data['position'] // MAX_VOLUME)
-				if data['position'] != 0 and position_holding > MAX_HOLDING_PERIOD + 1 - F:
+				if hedger.active:
+					liquidate_position(session, data, hedger, hedger.end_tick, isMarket = True)
+				elif data['position'] != 0 and position_holding > MAX_HOLDING_PERIOD + 1 - F:
 					print("Liquidating Positions", data['position'], position_holding, MAX_HOLDING_PERIOD + 1 - F)
-					liquidate_position(session, data, isMarket = True)
+					end_tick = min(data['tick'] + HEDGE_TICKS - 1, 299)
+					liquidate_position(session, data, hedger, end_tick, isMarket = True)
 
 				###################################################################################
 				## Order Placement
 
-				noSimilarBid = all(
-					abs(bid - order[1]) > data['vol_spread'] * ORDER_PROXIMITY_CALIBRATION
-					for order in data['bid_orders']
-				)
-				noSimilarAsk = all(
-					abs(ask - order[1]) > data['vol_spread'] * ORDER_PROXIMITY_CALIBRATION
-					for order in data['ask_orders']
-				)
+				noSimilarBid = not data['bid_orders'].near(bid, data['vol_spread'] * ORDER_PROXIMITY_CALIBRATION)
+				noSimilarAsk = not data['ask_orders'].near(ask, data['vol_spread'] * ORDER_PROXIMITY_CALIBRATION)
 				if (noSimilarBid and noSimilarAsk):
 
 					bid_order = build_order("LIMIT", MAX_VOLUME, bid, "BUY")
 					bid_oid = send_order(session, bid_order)
-					data['bid_orders'].append((bid_oid, bid, data['tick']))
+					data['bid_orders'].add(bid_oid, bid, data['tick'])
 
 					ask_order = build_order("LIMIT", MAX_VOLUME, ask, "SELL")
 					ask_oid = send_order(session, ask_order)
-					data['ask_orders'].append((ask_oid, ask, data['tick']))
+					data['ask_orders'].add(ask_oid, ask, data['tick'])
 
 				###################################################################################
 				## Odd Lot Management
@@ -378,7 +409,7 @@ def main():
 				r = data['position'] % MAX_VOLUME
 				if r != 0:
 					order = build_order("MARKET", r, 0, "SELL" if data['position'] > 0 else "BUY")
-					send_order(session, order)
+					send_order(session, order, RISK)
 
 				display(data)
 
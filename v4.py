@@ -1,4 +1,13 @@
 from volatility_estimators import *
+from tick_clock import TickClock
+from rate_limiter import RateLimiter, RISK, CANCEL, QUOTE
+from order_gateway import OrderGateway
+from liquidation import LiquidationScheduler
+from time_and_sales import TimeAndSales
+from price_history import PriceHistory
+from signal_cache import SignalCache
+from market_data import MarketData
+from order_reconciler import OrderReconciler
 from logger import DIR, logger
 from config import API_KEY
 from time import sleep
@@ -53,12 +62,6 @@ data = {
     'LOB_imbalance': 0,
     'LOB_mass_imbalance': 0,
 
-    ## Price History
-    'ohlc': pd.DataFrame(),
-
-    ## Time & Sales
-    'tas': pd.DataFrame(),
-    
     ## Calculated Metrics
     'gtrend': 0,
     'trend': 0,
@@ -91,6 +94,8 @@ def get_tick(session, data):
         return data
     return ApiException("Auth Error. Check API Key")
 
+clock = TickClock()
+
 def get_security_info(session, data):
     resp = session.get("http://localhost:9999/v1/securities?ticker=ALGO")
     if resp.ok:
@@ -105,32 +110,24 @@ def get_security_info(session, data):
         return data
     return ApiException("Auth Error. Check API Key")
 
-HISTCOLS = ['tick', 'open', 'high', 'low', 'close']
+history = PriceHistory()
+signals = SignalCache(history)
 def get_price_history(session, data):
-    resp = session.get(f"http://localhost:9999/v1/securities/history?ticker=ALGO")
-    if resp.ok:
-        
-        data['ohlc'] = pd.DataFrame(resp.json(), columns = HISTCOLS).sort_values('tick', ascending = True)
-        
-        data['vol'] = c2c_vol(data['ohlc'], time_step=1)
-        data['gtrend'], data['gtrend_confidence'] = z_score_trend_indicator(data['ohlc'].close)
-
-        df = data['ohlc'].iloc[-ROLLING_TREND_LOOKBACK:].copy()
-        data['trend'], data['trend_confidence'] = z_score_trend_indicator(df.close)
-
+    if history.update(session, data['tick']):
+        if history.changed:
+            signals.refresh()
         return data
     return ApiException("Auth Error. Check API Key")
 
-TASCOLS = ['id', 'period', 'tick', 'price', 'quantity']
+time_and_sales = TimeAndSales()
 def get_time_and_sales(session, data):
-    resp = session.get(f"http://localhost:9999/v1/securities/tas?ticker=ALGO")
-    if resp.ok:
-        df = pd.DataFrame(resp.json(), columns = TASCOLS).sort_values('tick', ascending = True)
-        df = df.groupby('tick').agg({'quantity': ['mean', 'sum']}).reset_index()
-        df.columns = ['tick', 'avg_trade_volume', 'total_volume']
-        data['tas'] = df
+    if time_and_sales.update(session, data['tick']):
+        data['time_factor'] = time_and_sales.time_factor
+        return data
     return ApiException("Auth Error. Check API Key")
 
+MARKET_DATA = [get_tick, get_security_info, get_price_history, get_time_and_sales]
+
 def get_open_orders(session):
     resp = session.get(f"http://localhost:9999/v1/orders?status=OPEN")
     if resp.ok: return resp.json()
@@ -221,32 +218,38 @@ def get_liquidating_orders(data, isMarket = False):
     orders.append(build_order("MARKET" if isMarket else "LIMIT", r, price, action))
     return [order for order in orders if order['quantity'] != 0]
 
-## Subject to rate limits
-def send_order(session, order):
+liquidation = LiquidationScheduler(MAX_VOLUME)
+
+limiter = RateLimiter(API_KEY)
+gateway = OrderGateway(API_KEY, limiter)
+
+## Subject to rate limits. Queued on the shared limiter, which paces it and retries it on 429
+def queue_order(session, order, priority = QUOTE, ttl = None):
     if order['type'] == "MARKET": order['dry_run'] = 0
-    resp = session.post("http://localhost:9999/v1/orders", params = order)
-    if resp.status_code == 429:
-        sleep(resp.json()['wait'] / 1_000)
-        resp = session.post("http://localhost:9999/v1/orders", params = order)
+    return limiter.submit("POST", "http://localhost:9999/v1/orders", params = order, priority = priority, ttl = ttl)
+
+def send_order(session, order, priority = QUOTE):
+    resp = queue_order(session, order, priority).result()
     if resp.ok:
         return resp.json()['order_id']
     return ApiException("Auth Error. Check API Key")
 
-def cancel_all_orders(session):
-    resp = session.post(f"http://localhost:9999/v1/commands/cancel?all=1")
+def cancel_all_orders(session, priority = CANCEL):
+    resp = limiter.call("POST", f"http://localhost:9999/v1/commands/cancel?all=1", priority = priority)
     if resp.ok:
         print("Cacelled All Orders")
     return ApiException("Auth Error. Check API Key")
 
+reconciler = OrderReconciler(limiter)
+
 def vol_spreading(data, calibration):
-    ohlc = data['ohlc']
-    tas = data['tas']
-    data['time_factor'] = ((tas['avg_trade_volume'] / (tas['total_volume'] + 1)) ** 2).values.mean()
+    data['vol'] = signals.vol()
     data['vol_spread'] = round(calibration * data['vol'] * data['mid'], 2)
 
     # data['vol_spread'] = round(calibration * data['time_factor'] * data['vol'] * data['mid'], 2)
 
 def trend_skewing(data):
+    data['gtrend'], data['gtrend_confidence'] = signals.trend()
     ask = data['mid'] + data['vol_spread']
     bid = data['mid'] - data['vol_spread']
 
@@ -289,34 +292,31 @@ def main():
     tick = 0
     last_reset_tick = 0    
 
-    with requests.Session() as session:
+    with requests.Session() as session, MarketData(API_KEY, MARKET_DATA, scheduler = limiter) as market_data:
         session.headers.update(API_KEY)
 
         while data['tick'] != 299 and not shutdown:
             
             ## Dont trade for first n ticks
-            get_tick(session, data)
             if data['tick'] < START_TICK:
+                data['tick'] = clock.wait(session)
                 continue
 
+            ## Tick, security info, history and tas in one concurrent pass
+            data.update(market_data.snapshot(data))
+
             ## Liquidate everything with 10 ticks remaining
             if data['tick'] > END_TICK:
                 # get_order_book(session, data)
-                cancel_all_orders(session)
-                orders = get_liquidating_orders(data)
-                for order in orders:
-                    send_order(session, order)
-
-            get_security_info(session, data)
-            get_price_history(session, data)
-            get_time_and_sales(session, data)
+                ## Spread over the ticks left instead of dumping the whole position on every pass
+                liquidation.start(data['tick'], 299)
+                reconciler.reconcile(session, liquidation.orders(data), gateway.submit, RISK)
 
             if data['tick'] != tick:
 
                 if data['tick'] - last_reset_tick < N_TICKS_TO_RESET and len(get_open_orders(session)) != 0:
                     pass
                 else:
-                    cancel_all_orders(session)
 
                     ## Price Setting
                     vol_spreading(data, VOL_CALIBRATION)
@@ -326,14 +326,12 @@ def main():
                     data['current_ask'] = ask
 
                     buy_orders, sell_orders = get_orders(data, bid, ask)
-                    for order in sell_orders:
-                        send_order(session, order)
-                    for order in buy_orders:
-                        send_order(session, order)
+                    reconciler.reconcile(session, sell_orders + buy_orders, queue_order, QUOTE, clock.period)
 
                     print("------------")
                     print("Tick", data['tick'])
                     print("Tick Since Last Cancel", data['tick'] - last_reset_tick)
+                    print("Kept", reconciler.n_kept, "Cancelled", reconciler.n_cancelled, "Submitted", reconciler.n_submitted)
                     print("Position", data['position'])
                     print("VWAP", data['position_vwap'])
                     print(f"({bid}, {data['mid']}, {ask})")
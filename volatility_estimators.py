@@ -1,13 +1,279 @@
+from collections import deque
 import pandas as pd
 import numpy as np
 
+###################################################################################################
+## Streaming estimators. Each one takes a single bar per update at a cost that does not depend on
+## the history length, works over an expanding sample (window = None) or the last `window` bars,
+## and can revise the last bar in place while it is still in progress.
+
+## Welford running mean / variance. In window mode the evicted values are kept in a deque.
+class RunningMoments:
+
+    def __init__(self, window = None):
+        self.window = window
+        self.values = deque()
+        self.n = 0
+        self.mean = 0
+        self.m2 = 0
+
+    def add(self, x):
+        if self.window is not None and self.n == self.window:
+            self.remove(self.values.popleft())
+        self.values.append(x)
+        self.n += 1
+        delta = x - self.mean
+        self.mean += delta / self.n
+        self.m2 += delta * (x - self.mean)
+
+    def remove(self, x):
+        if self.n <= 1:
+            self.n, self.mean, self.m2 = 0, 0, 0
+            return
+        mean = self.mean
+        self.mean = (self.n * mean - x) / (self.n - 1)
+        self.m2 -= (x - self.mean) * (x - mean)
+        self.n -= 1
+
+    def revise(self, x):
+        if self.n != 0:
+            self.remove(self.values.pop())
+        self.add(x)
+
+    ## Bulk load from an empty state in one vectorised pass
+    def extend(self, xs):
+        if self.window is not None:
+            xs = xs[-self.window:]
+        if self.n != 0 or len(xs) == 0:
+            for x in xs:
+                self.add(x)
+            return self
+        self.values.extend(xs)
+        self.n = len(xs)
+        self.mean = xs.mean()
+        self.m2 = ((xs - self.mean) ** 2).sum()
+        return self
+
+    def var(self, ddof = 1):
+        if self.n <= ddof:
+            return np.nan
+        return max(self.m2, 0) / (self.n - ddof)
+
+## Close-to-close return moments, drives c2c_vol, return_vol_estimator and the trend z-score.
+## `window` counts prices like the batch functions do, so it spans window - 1 returns.
+class StreamingReturnVol:
+
+    def __init__(self, window = None, time_step = 1):
+        self.window = window
+        self.time_step = time_step
+        self.returns = RunningMoments(None if window is None else window - 1)
+        self.n_prices = 0
+        self.last_log_price = None
+        self.prev_log_price = None
+
+    def update(self, close):
+        log_price = np.log(close)
+        if self.last_log_price is not None:
+            self.returns.add(log_price - self.last_log_price)
+        self.prev_log_price, self.last_log_price = self.last_log_price, log_price
+        if self.window is None or self.n_prices < self.window:
+            self.n_prices += 1
+        return self
+
+    def revise(self, close):
+        if self.last_log_price is None:
+            return self.update(close)
+        log_price = np.log(close)
+        if self.prev_log_price is not None:
+            self.returns.revise(log_price - self.prev_log_price)
+        self.last_log_price = log_price
+        return self
+
+    def extend(self, closes):
+        closes = np.asarray(closes, dtype = float)
+        if self.window is not None:
+            closes = closes[-self.window:]
+        if self.n_prices != 0 or closes.shape[0] < 2:
+            for close in closes:
+                self.update(close)
+            return self
+        log_prices = np.log(closes)
+        self.returns.extend(log_prices[1:] - log_prices[:-1])
+        self.prev_log_price, self.last_log_price = log_prices[-2], log_prices[-1]
+        self.n_prices = closes.shape[0]
+        return self
+
+    def c2c_vol(self):
+        return np.sqrt(self.returns.var(ddof = 1))
+
+    def return_vol(self):
+        xvar = self.returns.var(ddof = 1)
+        mu = self.returns.mean / self.time_step + xvar / (2 * self.time_step)
+        vol = np.sqrt(xvar / self.time_step)
+        return mu, vol
+
+    def errors(self):
+        mu, vol = self.return_vol()
+        return estimator_errors(vol, self.n_prices, self.time_step)
+
+    def z_score(self):
+        mu, vol = self.return_vol()
+        mu_error, vol_error = estimator_errors(vol, self.n_prices, self.time_step)
+        return mu, abs(mu / mu_error)
+
+## Range based per-bar terms for Rogers-Satchell and Garman-Klass, kept as running sums
+class StreamingRangeVol:
+
+    def __init__(self, window = None):
+        self.window = window
+        self.terms = deque()
+        self.rs_sum = 0
+        self.gk_sum = 0
+
+    @staticmethod
+    def bar_terms(op, hi, lo, cl):
+        rs = np.log(hi/cl) * np.log(hi/op) + np.log(lo/cl) * np.log(lo/op)
+        gk = 1/2 * np.log(hi/lo) ** 2 - (2 * np.log(2) - 1) * np.log(cl/op) ** 2
+        return rs, gk
+
+    def update(self, op, hi, lo, cl):
+        if self.window is not None and len(self.terms) == self.window:
+            rs, gk = self.terms.popleft()
+            self.rs_sum -= rs
+            self.gk_sum -= gk
+        rs, gk = self.bar_terms(op, hi, lo, cl)
+        self.terms.append((rs, gk))
+        self.rs_sum += rs
+        self.gk_sum += gk
+        return self
+
+    def revise(self, op, hi, lo, cl):
+        if len(self.terms) == 0:
+            return self.update(op, hi, lo, cl)
+        rs, gk = self.terms.pop()
+        self.rs_sum -= rs
+        self.gk_sum -= gk
+        return self.update(op, hi, lo, cl)
+
+    def extend(self, op, hi, lo, cl):
+        if self.window is not None:
+            op, hi, lo, cl = op[-self.window:], hi[-self.window:], lo[-self.window:], cl[-self.window:]
+        if len(self.terms) != 0:
+            for bar in zip(op, hi, lo, cl):
+                self.update(*bar)
+            return self
+        rs, gk = self.bar_terms(op, hi, lo, cl)
+        self.terms.extend(zip(rs, gk))
+        self.rs_sum = np.sum(rs)
+        self.gk_sum = np.sum(gk)
+        return self
+
+    def rogers_satchell(self):
+        return np.sqrt(1 / len(self.terms) * self.rs_sum)
+
+    def garman_klass(self):
+        return np.sqrt(1 / len(self.terms) * self.gk_sum)
+
+## Prefix sums of log returns and squared log returns, one slot per bar. Any trailing window is two
+## lookups away, so mean, variance, mu, mu_error and the z-score cost O(1) for any lookback and a
+## whole term structure of lookbacks costs one vectorised pass. Lookbacks count prices, like the
+## batch functions, and None means the full sample.
+class ReturnIndex:
+
+    def __init__(self, capacity = 300, time_step = 1):
+        self.time_step = time_step
+        self.cum = np.zeros(capacity)
+        self.cum2 = np.zeros(capacity)
+        self.n_prices = 0
+        self.last_log_price = None
+        self.prev_log_price = None
+
+    def grow(self, size):
+        while size >= self.cum.shape[0]:
+            self.cum = np.resize(self.cum, 2 * self.cum.shape[0])
+            self.cum2 = np.resize(self.cum2, 2 * self.cum2.shape[0])
+
+    def set_return(self, i, r):
+        self.cum[i] = self.cum[i - 1] + r
+        self.cum2[i] = self.cum2[i - 1] + r * r
+
+    def update(self, close):
+        log_price = np.log(close)
+        if self.last_log_price is not None:
+            self.grow(self.n_prices)
+            self.set_return(self.n_prices, log_price - self.last_log_price)
+        self.prev_log_price, self.last_log_price = self.last_log_price, log_price
+        self.n_prices += 1
+        return self
+
+    def revise(self, close):
+        if self.last_log_price is None:
+            return self.update(close)
+        log_price = np.log(close)
+        if self.prev_log_price is not None:
+            self.set_return(self.n_prices - 1, log_price - self.prev_log_price)
+        self.last_log_price = log_price
+        return self
+
+    def extend(self, closes):
+        closes = np.asarray(closes, dtype = float)
+        if self.n_prices != 0 or closes.shape[0] < 2:
+            for close in closes:
+                self.update(close)
+            return self
+        log_prices = np.log(closes)
+        x = log_prices[1:] - log_prices[:-1]
+        self.grow(x.shape[0])
+        self.cum[1:x.shape[0] + 1] = np.cumsum(x)
+        self.cum2[1:x.shape[0] + 1] = np.cumsum(x * x)
+        self.prev_log_price, self.last_log_price = log_prices[-2], log_prices[-1]
+        self.n_prices = closes.shape[0]
+        return self
+
+    ## Works on a scalar or an array of lookbacks. `end` is the index of the last price to use,
+    ## an array of them gives the values as of each of those prices.
+    def moments(self, lookback = None, end = None):
+        end = self.n_prices - 1 if end is None else end
+        n = end + 1 if lookback is None else np.minimum(lookback, end + 1)
+        m = n - 1
+        s1 = self.cum[end] - self.cum[end - m]
+        s2 = self.cum2[end] - self.cum2[end - m]
+        with np.errstate(divide = 'ignore', invalid = 'ignore'):
+            xavg = s1 / m
+            xvar = np.maximum(s2 - s1 * xavg, 0) / (m - 1)
+        return n, xavg, xvar
+
+    def return_vol(self, lookback = None, end = None):
+        n, xavg, xvar = self.moments(lookback, end)
+        mu = xavg / self.time_step + xvar / (2 * self.time_step)
+        vol = np.sqrt(xvar / self.time_step)
+        return mu, vol
+
+    def c2c_vol(self, lookback = None, end = None):
+        n, xavg, xvar = self.moments(lookback, end)
+        return np.sqrt(xvar)
+
+    def errors(self, lookback = None):
+        n, xavg, xvar = self.moments(lookback)
+        return estimator_errors(np.sqrt(xvar / self.time_step), n, self.time_step)
+
+    def z_score(self, lookback = None, end = None):
+        n, xavg, xvar = self.moments(lookback, end)
+        mu = xavg / self.time_step + xvar / (2 * self.time_step)
+        vol = np.sqrt(xvar / self.time_step)
+        mu_error, vol_error = estimator_errors(vol, n, self.time_step)
+        with np.errstate(divide = 'ignore', invalid = 'ignore'):
+            return mu, np.abs(mu / mu_error)
+
+###################################################################################################
+## Batch API, thin wrappers over the streaming estimators
+
 def rogers_satchell_vol(ohlc_data, time_step=1):
     op = ohlc_data['open'].values
     lo = ohlc_data['low'].values
     hi = ohlc_data['high'].values
     cl = ohlc_data['close'].values
-    argument = np.log(hi/cl) * np.log(hi/op) + np.log(lo/cl) * np.log(lo/op)
-    return np.sqrt(1 / op.shape[0] * np.sum(argument))
+    return StreamingRangeVol().extend(op, hi, lo, cl).rogers_satchell()
 
 
 def garman_klass_vol(ohlc_data, time_step=1):
@@ -15,29 +281,24 @@ def garman_klass_vol(ohlc_data, time_step=1):
     lo = ohlc_data['low'].values
     hi = ohlc_data['high'].values
     cl = ohlc_data['close'].values
-    argument = 1/2 * np.log(hi/lo) ** 2 - (2 * np.log(2) - 1) * np.log(cl/op) ** 2 
-    return np.sqrt(1 / op.shape[0] * np.sum(argument))
+    return StreamingRangeVol().extend(op, hi, lo, cl).garman_klass()
 
 def return_vol_estimator(close_data,  time_step=1):
     price = pd.Series(close_data).values
-    x = np.log(price[1:]) - np.log(price[:-1])
-    xavg = x.mean()
-    xvar = x.var(ddof=1)
-    mu = xavg / time_step + xvar / (2 * time_step)
-    vol = np.sqrt(xvar / time_step)
-    return mu, vol
+    return StreamingReturnVol(time_step = time_step).extend(price).return_vol()
 
 def c2c_vol(ohlc, time_step=1):
-    return np.log(1+ohlc.close.pct_change()).std()
+    return StreamingReturnVol().extend(ohlc.close).c2c_vol()
+
+def estimator_errors(vol, n, time_step=1):
+    mu_error = np.sqrt(vol ** 4 / 2 + vol ** 2 / time_step) / np.sqrt(n)
+    vol_error = np.sqrt(vol ** 2 / 2) / np.sqrt(n)
+    return mu_error, vol_error
 
 def return_vol_error(close_data, time_step=1):
     mu, vol = return_vol_estimator(close_data)
-    mu_error = np.sqrt(vol ** 4 / 2 + vol ** 2 / time_step) / np.sqrt(close_data.shape[0])
-    vol_error = np.sqrt(vol ** 2 / 2) / np.sqrt(close_data.shape[0])
-    return mu_error, vol_error
+    return estimator_errors(vol, close_data.shape[0], time_step)
 
 def z_score_trend_indicator(close_data, time_step=1):
-    mu, vol = return_vol_estimator(close_data)
-    mu_error, vol_error = return_vol_error(close_data, time_step=1)
-    zscore = mu / mu_error
-    return mu, abs(zscore)
\ No newline at end of file
+    price = pd.Series(close_data).values
+    return StreamingReturnVol().extend(price).z_score()